@@ -1,52 +1,137 @@
+import heapq
+import itertools
 import random
 from app.models.team import Team
+from app.models import events
 
 class Move:
-    def __init__(self, mage, ally_team, enemy_team):
+    def __init__(self, mage, ally_team, enemy_team, rng=random):
         self.mage = mage
         self.ally_team = ally_team
         self.enemy_team = enemy_team
+        self.rng = rng
         self.rank = self.mage.get_stat('speed')
 
     def execute(self):
-        return self.mage.make_move(self.ally_team, self.enemy_team)
+        return self.mage.make_move(self.ally_team, self.enemy_team, self.rng)
         print("")
 
+# Moves are kept in a heap keyed on speed, ties going to whoever comes
+# first when the two teams are interleaved. Mages that faint during the
+# round stay in the heap and are skipped once they reach the top, so a
+# round costs O(n log n) however many mages drop out of it
 class BattleRound:
-    def __init__(self, team1, team2):
-        self.move_order = []
+    def __init__(self, team1, team2, rng=random):
+        self.queue = []
         for i in range(max(len(team1), len(team2))):
             if i < len(team1) and team1[i].is_conscious():
-                self.move_order.append(Move(team1[i], team1, team2))
+                self.add_move(Move(team1[i], team1, team2, rng))
             if i < len(team2) and team2[i].is_conscious():
-                self.move_order.append(Move(team2[i], team2, team1))
+                self.add_move(Move(team2[i], team2, team1, rng))
 
-        self.move_order.sort(key=lambda move: -move.rank)
+        heapq.heapify(self.queue)
         self.cur_move = 0
 
+    def add_move(self, move):
+        self.queue.append((-move.rank, len(self.queue), move))
+
+    def pop_move(self):
+        return heapq.heappop(self.queue)[-1]
+
+    def is_stale(self, entry):
+        return not entry[-1].mage.is_conscious()
+
     def next_move(self):
-        result = self.move_order[self.cur_move].execute()
+        result = self.pop_move().execute()
         self.cur_move += 1
-        while self.cur_move < len(self.move_order) and not self.move_order[self.cur_move].mage.is_conscious():
-            self.cur_move += 1
+        while len(self.queue) > 0 and self.is_stale(self.queue[0]):
+            heapq.heappop(self.queue)
 
         return result
 
     def round_over(self):
-        return self.cur_move >= len(self.move_order)
+        return len(self.queue) == 0
+
+# Starts out in the same order as BattleRound, but a mage whose speed
+# changes before its turn comes up moves to its new place in the queue.
+# The old entry is only marked as removed and thrown away once it reaches
+# the top, so every change costs O(log n)
+class DynamicBattleRound(BattleRound):
+    def __init__(self, team1, team2, rng=random):
+        # Queue entry of every mage still waiting for its turn, by mage
+        self.entries = {}
+        self.counter = itertools.count()
+        BattleRound.__init__(self, team1, team2, rng)
+
+        for mage in list(team1) + list(team2):
+            mage.speed_listener = self
+
+    # Entries are lists so that they can be marked as removed. The counter
+    # keeps a removed entry from ever being compared on its move
+    def add_move(self, move):
+        entry = [-move.rank, len(self.queue), next(self.counter), move]
+        self.entries[id(move.mage)] = entry
+        self.queue.append(entry)
+
+    def pop_move(self):
+        move = heapq.heappop(self.queue)[-1]
+        del self.entries[id(move.mage)]
+        return move
+
+    def is_stale(self, entry):
+        return entry[-1] == None or BattleRound.is_stale(self, entry)
+
+    # Called by a mage after its speed modifier changed
+    def speed_changed(self, mage):
+        entry = self.entries.get(id(mage))
+        if entry == None:
+            return
+
+        move = entry[-1]
+        rank = mage.get_stat('speed')
+        if rank == move.rank:
+            return
+
+        move.rank = rank
+        entry[-1] = None
+        new_entry = [-rank, entry[1], next(self.counter), move]
+        self.entries[id(mage)] = new_entry
+        heapq.heappush(self.queue, new_entry)
 
 class Battle:
-    def __init__(self, team1, team2):
+    # How the moves in a round are ordered. Static rounds fix the order
+    # when they start, dynamic ones follow speed changes made mid-round
+    schedulers = {
+        "static"  : BattleRound,
+        "dynamic" : DynamicBattleRound
+    }
+
+    def __init__(self, team1, team2, seed=None, scheduler="static"):
+        if scheduler not in Battle.schedulers:
+            raise ValueError("Unknown scheduler: {}".format(scheduler))
+
         self.team1 = team1
         self.team2 = team2
+        self.scheduler = scheduler
+
+        # Every random roll in the battle comes from here, so the same seed
+        # and rosters always play out the same way
+        self.seed = seed
+        self.rng  = random.Random(seed)
 
         self.team1.reinitialize()
         self.team2.reinitialize()
 
+        # Give every mage an id, which AIs can use to pick their targets
+        self.roster = list(self.team1) + list(self.team2)
+        for mage_id, mage in enumerate(self.roster):
+            mage.set_roster(self.roster, mage_id, 1 if mage_id < len(self.team1) else 2)
+
         self.cur_round = None
         self.round_counter = 0
         self.max_round = 10
 
+        events.emit("battle_start", team1=self.team1.get_name(), team2=self.team2.get_name(), seed=self.seed)
         self.start_new_round()
 
     def set_state(self, state):
@@ -61,17 +146,27 @@ class Battle:
             result = self.cur_round.next_move()
             if self.cur_round.round_over():
                 self.start_new_round()
+            if self.is_battle_over():
+                events.emit("battle_over", winner=self.get_winner(), rounds=self.get_rounds_played())
             result["finished"] = False
             return result
         return { "finished" : True }
 
     def start_new_round(self):
-        self.cur_round = BattleRound(self.team1, self.team2)
+        self.cur_round = Battle.schedulers[self.scheduler](self.team1, self.team2, self.rng)
         self.round_counter += 1
+        events.emit("round_start", round=self.round_counter)
 
     def get_round_number(self):
         return self.round_counter
 
+    # A new round is queued up as soon as the last one finishes, so don't
+    # count it if the battle ended before anyone got to move in it
+    def get_rounds_played(self):
+        if self.cur_round.cur_move == 0:
+            return min(self.round_counter - 1, self.max_round)
+        return min(self.round_counter, self.max_round)
+
     def is_battle_over(self):
         return self.team2.is_defeated() or self.team1.is_defeated() or self.round_counter > self.max_round
 
@@ -79,16 +174,20 @@ class Battle:
         if team_no == 2:
             for mage in self.team1:
                 mage.cur_hp = 0
+                mage.snapshot = None
         elif team_no == 1:
             for mage in self.team2:
                 mage.cur_hp = 0
+                mage.snapshot = None
 
-    def get_winner(self):
+    # 1 or 2, whichever team won. Unlike the winner's name this tells the
+    # sides apart when both teams go by the same name
+    def get_winning_side(self):
         if self.team2.is_defeated():
-            return self.team1.get_short_name()
+            return 1
 
         if self.team1.is_defeated():
-            return self.team2.get_short_name()
+            return 2
 
         if self.round_counter > self.max_round:
             dt1 = [tm.get_remaining_health_percentage() for tm in self.team1]
@@ -96,10 +195,16 @@ class Battle:
             dt1 = sum(dt1)
             dt2 = sum(dt2)
 
-            return self.team1.get_short_name() if dt1 > dt2 else self.team2.get_short_name()
+            return 1 if dt1 > dt2 else 2
 
         return None
 
+    def get_winner(self):
+        side = self.get_winning_side()
+        if side == None:
+            return None
+        return self.team1.get_short_name() if side == 1 else self.team2.get_short_name()
+
     def __str__(self):
         text = "Round {}\n".format(self.round_counter) if not self.is_battle_over() else "{} won\n".format(self.get_winner())
         text += str(self.team1)
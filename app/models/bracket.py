@@ -0,0 +1,288 @@
+import os
+import random
+from app.models.battle import Battle
+from app.models import tournament
+from app.models import ratings
+
+##########################################
+#                Brackets                #
+##########################################
+# Knockout tournaments, as an alternative to League. Teams are seeded in
+# the order they are given, with the best seeds kept apart until the late
+# rounds and handed the byes when the number of teams isn't a power of two.
+#
+# Single elimination knocks a team out the first time it loses a series.
+# Double elimination drops it to the losers' bracket instead, where a
+# second loss knocks it out. The winners' bracket champion then meets the
+# losers' bracket champion in the final, which is played again if the
+# champion from the losers' bracket wins it.
+#
+# Every pairing is a best of N series. Each round is a set of series that
+# don't depend on each other, which BracketRunner plays all at once in a
+# pool of worker processes:
+#
+#     bracket = Bracket(teams, "double", best_of=3, seed=1)
+#     BracketRunner(bracket, magic_path, workers=8).run()
+#     champion = bracket.get_winners()[0]
+
+# Seed numbers (from 0) in bracket order, for a bracket of size slots
+def get_bracket_order(size):
+    order = [0]
+    while len(order) < size:
+        n = 2*len(order)
+        order = [seed for top in order for seed in (top, n - 1 - top)]
+    return order
+
+# Plays a best of N series between two teams. Teams swap sides every game.
+# Results know the teams by side (1 for team1, 2 for team2) rather than by
+# name, since names can be shortened to the same thing. Every game lists the
+# side of the series that played as team 1 of the battle first
+def run_series(index, team1, team2, seed=None, best_of=1, scheduler="static"):
+    rng = random.Random(seed)
+    wins = [0, 0]
+    games = []
+    while max(wins) < best_of//2 + 1:
+        sides = (1, 2) if len(games) % 2 == 0 else (2, 1)
+        first, second = (team1, team2) if sides[0] == 1 else (team2, team1)
+        battle = Battle(first, second, rng.getrandbits(32), scheduler)
+        result = battle.play_next_move()
+        while not result['finished']:
+            result = battle.play_next_move()
+
+        winner = sides[battle.get_winning_side() - 1]
+        wins[winner - 1] += 1
+        games.append({
+            "teams"  : (first.get_short_name(), second.get_short_name()),
+            "sides"  : sides,
+            "winner" : winner,
+            "rounds" : battle.get_rounds_played()
+        })
+
+    return {
+        "index"  : index,
+        "teams"  : (team1.get_short_name(), team2.get_short_name()),
+        "wins"   : tuple(wins),
+        "winner" : 1 if wins[0] > wins[1] else 2,
+        "games"  : games
+    }
+
+# Worker process side of run_series, on teams rebuilt from their specs
+def play_series(task):
+    index, spec1, spec2, seed, best_of = task
+    team1 = tournament.get_worker_team(spec1)
+    team2 = tournament.get_worker_team(spec2)
+    return run_series(index, team1, team2, seed, best_of, tournament.worker_options["scheduler"])
+
+class Bracket:
+    eliminations = ["single", "double"]
+
+    def __init__(self, teams, elimination="single", best_of=1, seed=None, scheduler="static", n_winners=1):
+        if elimination not in Bracket.eliminations:
+            raise ValueError("Unknown elimination: {}".format(elimination))
+        if best_of < 1 or best_of % 2 == 0:
+            raise ValueError("Series must be best of an odd number of games")
+
+        self.teams = teams
+        self.elimination = elimination
+        self.best_of = best_of
+        self.scheduler = scheduler
+        self.n_winners = min(n_winners, len(teams))
+        # Hands out a seed to every series
+        self.rng = random.Random(seed)
+
+        # Teams still in the winners' and losers' brackets, in bracket
+        # order. None marks a bye in the first round
+        size = 1
+        while size < len(teams):
+            size *= 2
+        self.upper = [teams[seed] if seed < len(teams) else None for seed in get_bracket_order(size)]
+        self.lower = []
+
+        self.eliminated = []    # Knocked out teams, first to go first
+        self.champion   = None
+        self.finals     = 0     # Finals played so far
+        self.rounds     = []    # Results of every round played
+        self.pending    = []    # (team1, team2, bracket) for every series in this round
+        self.pair_next_round()
+
+    # Pairs neighbours, the way the winners' bracket is laid out. A team
+    # left without an opponent gets a bye
+    def pair_neighbours(self, teams):
+        pairs = []
+        byes = []
+        for i in range(0, len(teams), 2):
+            pair = [team for team in teams[i:i+2] if team != None]
+            if len(pair) == 2:
+                pairs.append(tuple(pair))
+            else:
+                byes += pair
+        return pairs, byes
+
+    # Pairs the first team with the last and so on inwards, so that teams
+    # that survived the losers' bracket meet teams that just dropped to it
+    def pair_outside_in(self, teams):
+        pairs = [(teams[i], teams[len(teams) - 1 - i]) for i in range(len(teams)//2)]
+        byes = [teams[len(teams)//2]] if len(teams) % 2 == 1 else []
+        return pairs, byes
+
+    def pair_next_round(self):
+        self.pending = []
+        self.byes = {"upper" : [], "lower" : []}
+        if self.finished():
+            return
+
+        upper = [team for team in self.upper if team != None]
+        if self.elimination == "double" and len(upper) == 1 and len(self.lower) == 1:
+            self.pending.append((upper[0], self.lower[0], "final"))
+            return
+
+        if len(upper) > 1:
+            pairs, self.byes["upper"] = self.pair_neighbours(self.upper)
+            self.pending += [(team1, team2, "upper") for team1, team2 in pairs]
+        else:
+            self.byes["upper"] = upper
+
+        if len(self.lower) > 1:
+            pairs, self.byes["lower"] = self.pair_outside_in(self.lower)
+            self.pending += [(team1, team2, "lower") for team1, team2 in pairs]
+        else:
+            self.byes["lower"] = list(self.lower)
+
+    def get_pending_matches(self):
+        return [(team1, team2) for team1, team2, bracket in self.pending]
+
+    # Takes the results of every pending series, in the order they were
+    # handed out, and pairs the next round
+    def record_round(self, results):
+        upper = list(self.byes["upper"])
+        lower = list(self.byes["lower"])
+        dropped = []
+        for (team1, team2, bracket), result in zip(self.pending, results):
+            result["bracket"] = bracket
+            self.rate_games(team1, team2, result["games"])
+            winner, loser = (team1, team2) if result["winner"] == 1 else (team2, team1)
+            if bracket == "final":
+                self.record_final(winner, loser)
+            elif bracket == "upper":
+                upper.append(winner)
+                if self.elimination == "double":
+                    dropped.append(loser)
+                else:
+                    self.eliminated.append(loser)
+            else:
+                lower.append(winner)
+                self.eliminated.append(loser)
+
+        # The winners' bracket keeps its layout. The losers' bracket lists
+        # its survivors first and the teams that just dropped to it last
+        if len(self.pending) > 0 and self.pending[0][2] != "final":
+            self.upper = self.keep_bracket_order(upper)
+            self.lower = lower + dropped
+            if self.elimination == "single" and len(self.upper) == 1:
+                self.champion = self.upper[0]
+
+        self.rounds.append(results)
+        self.pair_next_round()
+
+    def rate_games(self, team1, team2, games):
+        if ratings.get_ratings() == None:
+            return
+        for game in games:
+            first, second = (team1, team2) if game["sides"][0] == 1 else (team2, team1)
+            ratings.get_ratings().record_match(first, second, 1 if game["winner"] == game["sides"][0] else 2)
+
+    # Winners' bracket survivors in the order their pairings were in
+    def keep_bracket_order(self, teams):
+        survivors = set(id(team) for team in teams)
+        return [team for team in self.upper if team != None and id(team) in survivors]
+
+    def record_final(self, winner, loser):
+        self.finals += 1
+        # A loss in the final is only the first for the winners' bracket
+        # champion, so it gets to play again
+        if self.finals == 1 and winner is self.lower[0]:
+            self.upper = [winner]
+            self.lower = [loser]
+            return
+        self.eliminated.append(loser)
+        self.champion = winner
+        self.upper = [winner]
+        self.lower = []
+
+    def finished(self):
+        return self.champion != None or len(self.teams) < 2
+
+    def get_rounds(self):
+        return self.rounds
+
+    # Teams from first to last, as far as the bracket can tell them apart
+    def get_ranking(self):
+        if len(self.teams) < 2:
+            return list(self.teams)
+        ranking = [self.champion] if self.champion != None else []
+        return ranking + self.eliminated[::-1]
+
+    def get_winners(self):
+        return self.get_ranking()[:self.n_winners]
+
+##########################################
+#                Executor                #
+##########################################
+# Plays a bracket round by round. Series in the same round are spread over
+# the worker processes, or played in this process when workers is 0
+class BracketRunner:
+    def __init__(self, bracket, magic_path, workers=None, chunk_size=None, verbose=False, compact=False, compiled=False):
+        self.bracket = bracket
+        self.magic_path = magic_path
+        self.workers = workers if workers != None else os.cpu_count()
+        self.chunk_size = chunk_size
+        self.verbose = verbose
+        self.compact = compact
+        self.compiled = compiled
+        self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def get_executor(self):
+        if self.executor == None:
+            self.executor = tournament.create_pool(self.workers, (self.magic_path, self.verbose, self.compact, self.compiled, self.bracket.scheduler))
+        return self.executor
+
+    def shutdown(self):
+        if self.executor != None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def build_tasks(self):
+        tasks = []
+        for team1, team2 in self.bracket.get_pending_matches():
+            spec1 = (team1.get_name(), tuple(team1.modules))
+            spec2 = (team2.get_name(), tuple(team2.modules))
+            tasks.append((len(tasks), spec1, spec2, self.bracket.rng.getrandbits(32), self.bracket.best_of))
+        return tasks
+
+    def play_round(self):
+        tasks = self.build_tasks()
+        if self.workers == 0:
+            return [
+                run_series(index, team1, team2, seed, best_of, self.bracket.scheduler)
+                for (index, spec1, spec2, seed, best_of), (team1, team2) in zip(tasks, self.bracket.get_pending_matches())
+            ]
+
+        chunk_size = self.chunk_size
+        if chunk_size == None:
+            chunk_size = max(1, len(tasks)//(self.workers*4))
+
+        results = list(self.get_executor().map(play_series, tasks, chunksize=chunk_size))
+        results.sort(key=lambda result: result["index"])
+        return results
+
+    # Plays the whole bracket. Returns the results of every round
+    def run(self):
+        while not self.bracket.finished():
+            self.bracket.record_round(self.play_round())
+        return self.bracket.get_rounds()
@@ -0,0 +1,121 @@
+import json
+
+##########################################
+#             Combat Events              #
+##########################################
+# The models report what happens in a battle as structured events rather
+# than printing straight to stdout. Each event is a name plus a dictionary
+# of plain values, handed to whichever sink is currently installed:
+#
+#     events.set_sink(events.NullSink())       # silent batch simulation
+#     events.set_sink(events.ListSink())       # keep events in memory
+#     events.set_sink(events.JsonLinesSink("battle.jsonl"))
+#
+# No formatting happens until a sink asks for it, so the null sink keeps the
+# combat hot path free of string work.
+
+def adverb(fields):
+    return "sharply " if fields["amount"] > 1 else ""
+
+# How PrintSink narrates each event. Events without an entry are not printed
+messages = {
+    "invalid_element"    : "Invalid element choice {element}. Using default {default}",
+    "stat_limit"         : "{mage}'s stats are too high. Reducing",
+    "spell_limit"        : "{mage} has too many spells. Reducing to {limit}",
+    "cannot_act"         : "{mage} has fainted and cannot cast a spell",
+    "planning"           : "{mage} is planning a spell",
+    "does_nothing"       : "{mage} does nothing",
+    "over_budget"        : "{error}",
+    "unknown_spell"      : "{mage} does not know {spell}",
+    "invalid_target"     : "Invalid target\n",
+    "cast_error"         : "{error}",
+    "cannot_restore"     : "{mage} has fainted and cannot have health restored",
+    "health_restored"    : "{mage} regained {amount} HP",
+    "cannot_take_damage" : "{mage} has fainted and cannot take more damage",
+    "damage_taken"       : "{mage} lost {amount} HP",
+    "fainted"            : "{mage} fainted",
+    "not_affected"       : "{mage} has fainted and is not affected",
+    "stat_maxed"         : "{mage}'s {stat} stat can't go any higher",
+    "stat_boosted"       : lambda fields: "{}'s {} {}rose".format(fields["mage"], fields["stat"], adverb(fields)),
+    "stat_minned"        : "{mage}'s {stat} stat can't go any lower",
+    "stat_reduced"       : lambda fields: "{}'s {} {}fell".format(fields["mage"], fields["stat"], adverb(fields)),
+    "critical_hit"       : "Critical hit",
+    "super_effective"    : "It's super effective",
+    "not_very_effective" : "It's not very effective",
+    "evades"             : "{mage} evades the attack.",
+    "rebound"            : "{mage} is hit by the rebound",
+    "leech"              : "{mage} absorbs energy from {target}",
+    "cannot_cast"        : "{mage} can't cast {spell}",
+    "casts"              : "{mage} casts {spell}",
+    "unknown_spell_name" : "{spell} is not a real spell",
+    "unknown_element"    : "{element} is not a real element"
+}
+
+def format_event(event, fields):
+    message = messages.get(event)
+    if message == None:
+        return None
+    if callable(message):
+        return message(fields)
+    return message.format(**fields)
+
+##########################################
+#                 Sinks                  #
+##########################################
+# Throws every event away
+class NullSink:
+    def emit(self, event, fields):
+        return
+
+    def close(self):
+        return
+
+# Narrates events on stdout the way the game always has
+class PrintSink:
+    def emit(self, event, fields):
+        message = format_event(event, fields)
+        if message != None:
+            print(message)
+
+    def close(self):
+        return
+
+# Keeps every event in memory, mostly useful for analysis and debugging
+class ListSink:
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event, fields):
+        fields["event"] = event
+        self.events.append(fields)
+
+    def clear(self):
+        self.events = []
+
+    def close(self):
+        return
+
+# Writes one JSON object per line
+class JsonLinesSink:
+    def __init__(self, path):
+        self.file = open(path, "w")
+
+    def emit(self, event, fields):
+        fields["event"] = event
+        self.file.write(json.dumps(fields))
+        self.file.write("\n")
+
+    def close(self):
+        self.file.close()
+
+sink = PrintSink()
+
+def set_sink(new_sink):
+    global sink
+    sink = new_sink
+
+def get_sink():
+    return sink
+
+def emit(event, **fields):
+    sink.emit(event, fields)
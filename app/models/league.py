@@ -1,8 +1,132 @@
+import math
+import bisect
+import random
 from app.models.battle import Battle
-from collections import defaultdict
+from app.models.replay import BattleReplay
+from app.models import ratings
+
+##########################################
+#                Pairings                #
+##########################################
+# Ring and round robin leagues know all their matches up front. Each
+# takes the teams in the league and returns the list of matches.
+
+def ring_pairings(teams):
+    # Every team battles the team to their right
+    matches = [(teams[i], teams[i+1]) for i in range(len(teams)-1)]
+    if len(teams) > 2:
+        matches.append((teams[-1], teams[0]))
+    return matches
+
+# Circle method: the first team stays put while the others rotate around
+# it, so the matches come out in rounds where no team plays twice
+def round_robin_pairings(teams):
+    rotation = list(teams)
+    if len(rotation) % 2 == 1:
+        rotation.append(None)
+
+    n = len(rotation)
+    matches = []
+    for r in range(n - 1):
+        for i in range(n//2):
+            team1, team2 = rotation[i], rotation[n - 1 - i]
+            if team1 is not None and team2 is not None:
+                # Swap sides every other round so the first team isn't
+                # always team 1
+                matches.append((team1, team2) if r % 2 == 0 else (team2, team1))
+        rotation.insert(1, rotation.pop())
+    return matches
+
+def double_round_robin_pairings(teams):
+    matches = round_robin_pairings(teams)
+    return matches + [(team2, team1) for team1, team2 in matches]
+
+# Swiss leagues are paired one round at a time from the standings. Every
+# team meets the best ranked team below it that it hasn't played yet (or
+# the one right below it, if it has played them all). With an odd number
+# of teams, the lowest ranked team that hasn't had a bye sits the round out.
+# played holds the pairs of team names that already met, byes the names
+# of the teams that already sat out
+def swiss_pairings(ranking, played=(), byes=()):
+    unpaired = list(ranking)
+    if len(unpaired) % 2 == 1:
+        bye = len(unpaired) - 1
+        for i in range(len(unpaired) - 1, -1, -1):
+            if unpaired[i].get_short_name() not in byes:
+                bye = i
+                break
+        unpaired.pop(bye)
+
+    matches = []
+    while len(unpaired) > 1:
+        team1 = unpaired.pop(0)
+        opponent = 0
+        for i, team2 in enumerate(unpaired):
+            if frozenset([team1.get_short_name(), team2.get_short_name()]) not in played:
+                opponent = i
+                break
+        matches.append((team1, unpaired.pop(opponent)))
+    return matches
+
+##########################################
+#               Standings                #
+##########################################
+# Scores of the teams in the current stage of a league. The table is kept
+# sorted as points come in, best score first and ties in the order the
+# teams were listed in, so it never has to be rebuilt
+class Standings:
+    def __init__(self, teams):
+        self.teams    = teams
+        self.position = dict((team.get_short_name(), i) for i, team in enumerate(teams))
+        self.scores   = dict((team.get_short_name(), 0) for team in teams)
+        self.table    = [(0, i) for i in range(len(teams))]
+
+    def add_points(self, team_name, points=1):
+        position = self.position[team_name]
+        score = self.scores[team_name]
+        del self.table[bisect.bisect_left(self.table, (-score, position))]
+        self.scores[team_name] = score + points
+        bisect.insort(self.table, (-score - points, position))
+
+    def get_ranking(self):
+        return [self.teams[position] for score, position in self.table]
+
+    # Lists of teams on the same score, best score first
+    def get_groups(self):
+        groups = []
+        last_score = None
+        for score, position in self.table:
+            if score != last_score:
+                groups.append([])
+                last_score = score
+            groups[-1].append(self.teams[position])
+        return groups
+
 class League:
-    def __init__(self, teams, n_winners=1):
+    # How the teams in a league are paired up
+    pairings = {
+        "ring"               : ring_pairings,
+        "round_robin"        : round_robin_pairings,
+        "double_round_robin" : double_round_robin_pairings,
+        "swiss"              : swiss_pairings
+    }
+
+    # swiss_rounds defaults to enough rounds to separate the teams
+    def __init__(self, teams, n_winners=1, seed=None, scheduler="static", pairing="ring", swiss_rounds=None):
+        if pairing not in League.pairings:
+            raise ValueError("Unknown pairing: {}".format(pairing))
+
+        # Hands out a seed to every battle when the league is seeded
+        self.rng = random.Random(seed) if seed != None else None
+        self.next_seed = None
+        # How every battle orders its moves (see Battle.schedulers)
+        self.scheduler = scheduler
+        self.pairing = pairing
+        self.swiss_rounds = swiss_rounds
         self.winners = []
+        self.replays = {}
+        # Games played for every match (see set_games_per_match)
+        self.games_per_match = 1
         self.n_winners = min(n_winners, len(teams))
         self.initialize_matches(teams)
 
@@ -10,18 +134,56 @@ class League:
         self.teams = teams      # Teams in the league
         self.matches = []       # League match pairings
         self.current_match = 0  # The index of the current match to be played
-        self.scores = {}        # Every team's scores in the league
+        self.matches_over = 0   # Matches whose results are in
+
+        # Every team's scores in the league
+        self.standings = Standings(teams)
+        self.scores = self.standings.scores
 
-        # Every team battles the team to their right
-        for i in range(len(self.teams)-1):
-            self.matches.append( (self.teams[i], self.teams[i+1]) )
+        # Swiss leagues remember who met whom and who had a bye
+        self.swiss_round = 0
+        self.played = set()
+        self.byes = set()
+        self.pending_byes = []
 
-        if len(self.teams) > 2:
-            self.matches.append( (self.teams[-1], self.teams[0]) )
+        if self.pairing == "swiss":
+            self.pair_swiss_round()
+        else:
+            self.matches = League.pairings[self.pairing](self.teams)
 
-        # Initialize scores for every team
-        for team in self.teams:
-            self.scores[team.get_short_name()] = 0
+    def get_swiss_rounds(self):
+        if self.swiss_rounds != None:
+            return self.swiss_rounds
+        return max(1, int(math.ceil(math.log(max(len(self.teams), 2), 2))))
+
+    def pair_swiss_round(self):
+        ranking = self.standings.get_ranking()
+        matches = swiss_pairings(ranking, self.played, self.byes)
+
+        paired = set()
+        for team1, team2 in matches:
+            self.played.add(frozenset([team1.get_short_name(), team2.get_short_name()]))
+            paired.add(team1.get_short_name())
+            paired.add(team2.get_short_name())
+
+        # A bye counts as winning the match, once the round is over
+        for team in ranking:
+            if team.get_short_name() not in paired:
+                self.byes.add(team.get_short_name())
+                self.pending_byes.append(team.get_short_name())
+
+        self.matches += matches
+        self.swiss_round += 1
+        if len(matches) == 0:
+            self.award_byes()
+
+    # Every game of a match is scored on its own, so a bye is worth
+    # winning all of them
+    def award_byes(self):
+        for team_name in self.pending_byes:
+            for i in range(self.games_per_match):
+                self.record_winner(team_name)
+        self.pending_byes = []
 
     def get_matches_list(self):
         return self.matches
@@ -29,28 +191,54 @@ class League:
     def get_current_match(self):
         return self.current_match
 
+    # Matches that can be played right now, in any order or all at once.
+    # In a Swiss league that is the rest of the current round
+    def get_pending_matches(self):
+        return self.matches[self.current_match:]
+
     def get_scores(self):
         return self.scores
 
+    # (team name, score) for every team, best first
+    def get_standings(self):
+        return [(team.get_short_name(), self.scores[team.get_short_name()]) for team in self.standings.get_ranking()]
+
+    # Replayed battles still count towards the league, but were already
+    # rated when they were played live
     def record_result(self, battle):
-        self.scores[battle.get_winner()] += 1
+        self.record_match(battle.team1, battle.team2, battle.get_winning_side(), not isinstance(battle, BattleReplay))
+
+    # winning_side is 1 if team1 won and 2 if team2 did
+    def record_match(self, team1, team2, winning_side, rated=True):
+        self.record_winner((team1 if winning_side == 1 else team2).get_short_name())
+        self.match_over()
+        if rated and ratings.get_ratings() != None:
+            ratings.get_ratings().record_match(team1, team2, winning_side)
+
+    def record_winner(self, team_name):
+        self.standings.add_points(team_name)
+
+    # Runners that play every match more than once record a winner for
+    # every game
+    def set_games_per_match(self, games):
+        self.games_per_match = games
+
+    # Once the last match of a Swiss round is over the next round is paired
+    def match_over(self):
+        self.matches_over += 1
+        if self.pairing == "swiss" and self.matches_over == len(self.matches):
+            self.award_byes()
+            if self.swiss_round < self.get_swiss_rounds():
+                self.pair_swiss_round()
 
     def winners_chosen(self):
-        ranks = defaultdict(list)
-        team_scores = []
-        for team in self.teams:
-            score = self.scores[team.get_short_name()]
-            ranks[score].append(team)
-            team_scores.append(score)
-
-        team_scores = sorted(set(team_scores), key=lambda x: -x)
-        for score in team_scores:
+        for group in self.standings.get_groups():
             if len(self.winners) >= self.n_winners:
                 break
-            if len(ranks[score]) + len(self.winners) <= self.n_winners:                
-                self.winners += ranks[score]
+            if len(group) + len(self.winners) <= self.n_winners:
+                self.winners += group
             else:
-                self.initialize_matches(ranks[score])
+                self.initialize_matches(group)
                 return False
         return True
 
@@ -60,8 +248,37 @@ class League:
     def get_winners(self):
         return self.winners
 
+    # Recorded battle logs keyed by team names. Matches with a log left are
+    # replayed from it instead of being played live
+    def set_replays(self, replays):
+        self.replays = replays
+
+    # Seed the next live battle will be played with. Drawn ahead of time so
+    # that the result can be looked up before setting the battle up
+    def get_next_seed(self):
+        if self.next_seed == None and self.rng != None:
+            self.next_seed = self.rng.getrandbits(32)
+        return self.next_seed
+
+    def has_replay(self, team1, team2):
+        return len(self.replays.get((team1.get_name(), team2.get_name()), [])) > 0
+
     def get_next_battle(self):
         if not self.finished():
-            b = Battle( *self.matches[self.current_match] )
+            team1, team2 = self.matches[self.current_match]
+            if self.has_replay(team1, team2):
+                b = BattleReplay(team1, team2, self.replays[(team1.get_name(), team2.get_name())].pop(0))
+            else:
+                b = Battle(team1, team2, seed=self.get_next_seed(), scheduler=self.scheduler)
+                self.next_seed = None
             self.current_match += 1
             return b
+
+    # Moves past the next match with a result from elsewhere (a result
+    # cache, say) instead of playing it. The result was rated wherever it
+    # came from, so it isn't rated again
+    def skip_next_battle(self, winner):
+        self.next_seed = None
+        self.current_match += 1
+        self.record_winner(winner)
+        self.match_over()
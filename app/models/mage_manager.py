@@ -1,5 +1,9 @@
 from app.models import magic
+from app.models import events
+from app.models import supervisor
+from app.models.snapshot import MageSnapshot, AllySnapshot, get_mage
 import time
+import random
 
 class MageManager:
     modifier_minmax = 6
@@ -7,19 +11,24 @@ class MageManager:
     stat_limit      = 100
     default_element = "Ice"
 
+    # Multiplier for every possible stat modifier. Laid out so that it can
+    # be indexed with the (possibly negative) modifier directly
+    modifier_multipliers = [float(max(2, 2 + m))/max(2, 2 - m) for m in list(range(0, modifier_minmax + 1)) + list(range(-modifier_minmax, 0))]
+
     def __init__(self, mage):
         self.mage = mage
 
         self.name    = mage.name
         self.element = magic.SpellBook.get_element_object(self.mage.element)
         if self.element is None:
-            print("Invalid element choice {}. Using default {}".format(self.mage.element, MageManager.default_element))
+            events.emit("invalid_element", mage=self.name, element=self.mage.element, default=MageManager.default_element)
             self.element = magic.SpellBook.get_element_object(MageManager.default_element)
 
-        self.spellbook = magic.SpellBook()
+        self.spellbook = magic.SpellBook.get_shared()
 
-        # Find out what spells our mage picked
-        self.spells = mage.spells
+        # Find out what spells our mage picked. A copy, so that changing
+        # the Mage's list later doesn't change what it can cast
+        self.spells = list(mage.spells)
 
         # Store our mage's stats
         self.max_hp = int(abs(mage.health))
@@ -45,6 +54,30 @@ class MageManager:
         # Keep track of how our mage is faring healthwise
         self.cur_hp = self.max_hp
 
+        # What team scripts see of our mage, taken again whenever it changes
+        self.snapshot = None
+
+        # Every mage in the current battle, indexed by id, and the side our
+        # mage is on. Set by the battle
+        self.roster  = None
+        self.mage_id = None
+        self.side    = None
+
+        # Told about changes to our speed, when the round order depends on it
+        self.speed_listener = None
+
+    # Puts the mage back the way it started the battle. Everything set up
+    # from the Mage's choices (element, spells, limited stats) stays
+    def reset(self):
+        self.cur_hp = self.max_hp
+        for stat in self.stat_modifiers:
+            self.stat_modifiers[stat] = 0
+        self.snapshot = None
+        self.roster = None
+        self.mage_id = None
+        self.side = None
+        self.speed_listener = None
+
     # Returns requested stat without any stat modifiers being applied
     def get_base_stat(self, stat):
         return self.base_stats[stat]
@@ -53,7 +86,7 @@ class MageManager:
         stat_total = self.max_hp + self.base_stats['attack'] + self.base_stats['defense'] + self.base_stats['speed']
 
         if stat_total > MageManager.stat_limit:
-            print("{}'s stats are too high. Reducing".format(self.name))
+            events.emit("stat_limit", mage=self.name)
 
             # All stats go down by a suitable ratio
             self.max_hp  = int(MageManager.stat_limit * self.max_hp/stat_total)
@@ -63,7 +96,7 @@ class MageManager:
 
     def impose_spell_limit(self):
         if len(self.spells) > MageManager.spell_limit:
-            print("{} has too many spells. Reducing to {}".format(self.get_short_name(), MageManager.spell_limit))
+            events.emit("spell_limit", mage=self.get_short_name(), limit=MageManager.spell_limit)
             self.spells = self.spells[:MageManager.spell_limit]
 
     # Returns requested stat modifier without the base stat
@@ -72,37 +105,37 @@ class MageManager:
 
     # Get the value of a stat with the modifier applied
     def get_stat(self, stat):
-        # Get stat modifier
-        modifier = self.stat_modifiers[stat]
-
-        # Compute modifier effect
-        modifier = float(max(2, 2 + modifier))/max(2, 2 - modifier)
+        # Look up the effect of the stat modifier
+        modifier = MageManager.modifier_multipliers[self.stat_modifiers[stat]]
 
         # Return modified stat (rounded down)
         return int(self.base_stats[stat] * modifier)
 
     # Use Mage attribute to plan and execute a spell
-    def make_move(self, allies, enemies):
+    def make_move(self, allies, enemies, rng=random):
         # Make sure we can make a spell to begin with
         if not self.is_conscious():
-            print("{} has fainted and cannot cast a spell".format(self.name))
+            events.emit("cannot_act", mage=self.name)
             return {"success" : False, "caster" :self, "reason" : "fainted"}
 
-        print("{} is planning a spell".format(self.name))
+        events.emit("planning", mage=self.name)
 
-        # Flatten mage managers for the simple AI functions
-        flattened_allies = [mage.flatten() for mage in allies]
-        flattened_enemies = [mage.flatten() for mage in enemies]
+        # Read-only snapshots of every mage for the simple AI functions
+        flattened_allies = [mage.get_snapshot(True) for mage in allies]
+        flattened_enemies = [mage.get_snapshot() for mage in enemies]
 
         try:
             # Get the AI to make a choice
-            decision = self.mage.make_move(flattened_allies, flattened_enemies)
+            decision = self.decide(flattened_allies, flattened_enemies)
+        except supervisor.OverBudget as e:
+            events.emit("over_budget", mage=self.name, error=str(e))
+            return {"success" : False, "caster" :self, "reason" : "does nothing"}
         except Exception as e:
             return {"success" : False, "caster" :self, "reason" : "does nothing"}
 
         # Test to ensure that the AI returned a tuple (valid choice)
         if type(decision) is not tuple:
-            print("{} does nothing".format(self.name))
+            events.emit("does_nothing", mage=self.name)
             return {"success" : False, "caster" :self, "reason" : "does nothing"}
 
         spell = self.spellbook.get_spell_object(decision[0])
@@ -112,94 +145,135 @@ class MageManager:
 
         # Make sure the AI chose a valid spell
         if decision[0] not in self.spells:
-            print("{} does not know {}".format(self.name, decision[0]))
+            events.emit("unknown_spell", mage=self.name, spell=decision[0])
             return {"success" : False, "caster" :self, "reason" : "unknown spell", "spell" : spell}
 
         # Uplift the target to one of the MageManager objects.
         # Don't want to work with raw Mage object lest cheating happen
-        if decision[1] == flattened_allies:
+        if decision[1] is flattened_allies or decision[1] == flattened_allies:
             # Targeted all/random allies
             target = allies
-        elif decision[1] == flattened_enemies:
+        elif decision[1] is flattened_enemies or decision[1] == flattened_enemies:
             # Targeted all/random enemies
             target = enemies
         else:
             # Last case, targeted specific mage. Find out who
-            # Search allies and enemies for target
-            target = [t for t in allies+enemies if t.mage==decision[1]]
+            target = self.find_target(decision[1], allies, enemies)
 
             # If we find one, great!
-            if len(target) > 0:
-                target = target[0]
-            else:
+            if target == None:
                 # Invalid target! Don't do anything
-                print("Invalid target")
-                print("")
+                events.emit("invalid_target", mage=self.name)
                 return {"success" : False, "caster" :self, "reason" : "invalid target"}
 
         try:
             # Cast the spell!
-            summary = self.cast_spell(decision[0], target)
+            summary = self.cast_spell(decision[0], target, rng)
         except Exception as e:
-            print(e)
+            events.emit("cast_error", mage=self.name, error=str(e))
             return {"success" : False, "caster" :self, "reason" : "does nothing"}
         return summary
 
-    def cast_spell(self, spell, target):
-        return self.spellbook.cast_spell(spell, self, target)
+    # Looks a targeted mage up in the roster when the AI gave its id or a
+    # snapshot of it. A snapshot only counts if the mage holding its id now
+    # is on the same side with the same name, so one kept from another
+    # battle doesn't hit whoever took its place. A Mage object (or an ally
+    # outside any battle) means searching allies and enemies instead
+    def find_target(self, chosen, allies, enemies):
+        if type(chosen) is int:
+            if self.roster != None and 0 <= chosen < len(self.roster):
+                return self.roster[chosen]
+        elif isinstance(chosen, MageSnapshot):
+            if self.roster != None and chosen.id != None and 0 <= chosen.id < len(self.roster):
+                target = self.roster[chosen.id]
+                if target.side == chosen.side and target.name == chosen.name:
+                    return target
+
+        chosen = get_mage(chosen)
+        for target in allies + enemies:
+            if target.mage == chosen:
+                return target
+        return None
+
+    def set_roster(self, roster, mage_id, side=None):
+        self.roster  = roster
+        self.mage_id = mage_id
+        self.side    = side
+        self.snapshot = None
+
+    # Asks the AI for its choice, through the decision supervisor if one is
+    # installed
+    def decide(self, allies, enemies):
+        decision_supervisor = supervisor.get_supervisor()
+        if decision_supervisor != None:
+            return decision_supervisor.decide(self.mage, allies, enemies)
+        return self.mage.make_move(allies, enemies)
+
+    def cast_spell(self, spell, target, rng=random):
+        return self.spellbook.cast_spell(spell, self, target, rng)
 
     def restore_health(self, amount):
         if not self.is_conscious():
-            print("{} has fainted and cannot have health restored".format(self.name))
+            events.emit("cannot_restore", mage=self.name)
             return
 
         delta = min(amount, self.max_hp - self.cur_hp)
         self.cur_hp += delta
+        if delta != 0:
+            self.snapshot = None
 
-        print("{} regained {} HP".format(self.name, delta))
+        events.emit("health_restored", mage=self.name, amount=delta)
 
     def get_remaining_health_percentage(self):
         return float(self.cur_hp)/max(self.max_hp,1)
 
     def take_damage(self, damage):
         if not self.is_conscious():
-            print("{} has fainted and cannot take more damage".format(self.name))
+            events.emit("cannot_take_damage", mage=self.name)
             return 0
 
         delta = min(damage, self.cur_hp)
         self.cur_hp -= delta
+        if delta != 0:
+            self.snapshot = None
 
-        print("{} lost {} HP".format(self.name, delta))
+        events.emit("damage_taken", mage=self.name, amount=delta)
 
         if self.cur_hp == 0:
-            print("{} fainted".format(self.name))
+            events.emit("fainted", mage=self.name)
 
         return delta
 
     def boost_stat(self, stat, amount):
         if not self.is_conscious():
-            print("{} has fainted and is not affected".format(self.name))
+            events.emit("not_affected", mage=self.name)
             return -1
 
         delta = min(amount, MageManager.modifier_minmax - self.stat_modifiers[stat])
         if delta == 0:
-            print("{}'s {} stat can't go any higher".format(self.name, stat))
+            events.emit("stat_maxed", mage=self.name, stat=stat)
         else:
-            print("{}'s {} {}rose".format(self.name, stat, "sharply " if delta > 1 else ""))
+            events.emit("stat_boosted", mage=self.name, stat=stat, amount=delta)
             self.stat_modifiers[stat] += delta
+            self.snapshot = None
+            if stat == 'speed' and self.speed_listener != None:
+                self.speed_listener.speed_changed(self)
         return delta
 
     def reduce_stat(self, stat, amount):
         if not self.is_conscious():
-            print("{} has fainted and is not affected".format(self.name))
+            events.emit("not_affected", mage=self.name)
             return -1
 
         delta = min(amount, self.stat_modifiers[stat] + MageManager.modifier_minmax )
         if delta == 0:
-            print("{}'s {} stat can't go any lower".format(self.name, stat))
+            events.emit("stat_minned", mage=self.name, stat=stat)
         else:
-            print("{}'s {} {}fell".format(self.name, stat, "sharply " if delta > 1 else ""))
+            events.emit("stat_reduced", mage=self.name, stat=stat, amount=delta)
             self.stat_modifiers[stat] -= delta
+            self.snapshot = None
+            if stat == 'speed' and self.speed_listener != None:
+                self.speed_listener.speed_changed(self)
         return delta
 
     def flatten(self):
@@ -209,6 +283,15 @@ class MageManager:
         self.mage.speed   = self.get_stat('speed')
         return self.mage
 
+    # Snapshot of the mage as the other side sees it, or as its own team
+    # does (ally=True). Only taken again after something changed, which is
+    # also when the Mage object's own stats are brought up to date
+    def get_snapshot(self, ally=False):
+        if self.snapshot == None:
+            self.flatten()
+            self.snapshot = (MageSnapshot(self.mage, self.mage_id, self.side), AllySnapshot(self.mage, self.mage_id, self.side))
+        return self.snapshot[1] if ally else self.snapshot[0]
+
     def is_conscious(self):
         return self.cur_hp > 0
 
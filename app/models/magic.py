@@ -1,31 +1,57 @@
 import random
+from types import MappingProxyType
+from collections import namedtuple
 import xml.etree.ElementTree as ET
+from app.models import events
 
 ##########################################
 #      Spell and Character Elements      #
 ##########################################
+# Damage multipliers of one element against another
+SUPER_EFFECTIVE    = 2.0
+EFFECTIVE          = 1.0
+NOT_VERY_EFFECTIVE = 0.5
+
 # Default Element class.
 class Element(object):
     # Initialize a new element object
-    def __init__(self, name, strong, weak, compatible):
+    def __init__(self, name, strong, weak, compatible, id=0):
+        self.id = id
         self.name = name
         self.strong = strong
         self.weak = weak
         self.compatible = compatible
 
+        # Rows of the spell book's element matrices, indexed by element id.
+        # Filled in once every element is loaded
+        self.effectiveness = None
+        self.compatibility = None
+
+    # Damage multiplier of this element's attacks against the input element
+    def get_effectiveness(self, element):
+        if self.effectiveness != None and element.id < len(self.effectiveness):
+            return self.effectiveness[element.id]
+        if element.name in self.strong:
+            return SUPER_EFFECTIVE
+        if element.name in self.weak:
+            return NOT_VERY_EFFECTIVE
+        return EFFECTIVE
+
     # Determine whether or not this element is roughly synonymous
     # With any other element.
     def is_compatible_with(self, element):
+        if self.compatibility != None and element.id < len(self.compatibility):
+            return self.compatibility[element.id]
         return element.name in self.compatible
 
     # Return whether or not we will do extra damage to the input element
     def is_strong_against(self, element):
-        return element.name in self.strong
+        return self.get_effectiveness(element) == SUPER_EFFECTIVE
 
     # Weak against does not mean elements that do extra damage to us
     # It means elements against which we do poor damage. There is a difference!
     def is_weak_against(self, element):
-        return element.name in self.weak
+        return self.get_effectiveness(element) == NOT_VERY_EFFECTIVE
 
 ##########################################
 #             Spell Effects              #
@@ -39,22 +65,104 @@ class Effect(object):
         self.element = element
         self.accuracy = accuracy
 
-    def target_evades(self, caster, target):
-        # Get respective target speeds
-        evasion  = target.get_stat('speed')
-        accuracy = caster.get_stat('speed')
+    def target_evades(self, caster, target, rng=random):
+        return target_evades(self.accuracy, caster, target, rng)
 
-        # Compute accuracy modifier based on difference in speeds
-        modifier = float(accuracy - evasion)/max(1,float(accuracy+evasion))
-        modifier = int(modifier*caster.modifier_minmax)
-        modifier = float(max(2, 2 + modifier))/max(2, 2 - modifier)
+    def apply_effect(self, caster, target, rng=random):
+        raise NotImplementedError
 
-        # Computer overall accuracy and test for hit using random variable
-        accuracy = min(100, self.accuracy * modifier)
-        return random.randint(0, 100) > accuracy
+# The rules below are shared by the effects and their compiled form (see
+# run_compiled_effect), so that both play out the same
+
+# Whether an attack with the given accuracy misses
+def target_evades(accuracy, caster, target, rng):
+    # Get respective target speeds
+    evasion = target.get_stat('speed')
+    speed   = caster.get_stat('speed')
+
+    # Compute accuracy modifier based on difference in speeds, which is
+    # the same as a stat modifier of that many stages
+    modifier = float(speed - evasion)/max(1,float(speed+evasion))
+    modifier = caster.modifier_multipliers[int(modifier*caster.modifier_minmax)]
+
+    # Computer overall accuracy and test for hit using random variable
+    return rng.randint(0, 100) > min(100, accuracy * modifier)
+
+# Damage an attack of the given power does, shared by attack effects and
+# their compiled form. effectiveness is the attacking element's multiplier
+# against the target's element
+def compute_damage(power, caster, target, critical_hit, effectiveness):
+    if critical_hit:
+        events.emit("critical_hit", mage=target.name)
+        # Critical hits ignore positive defense modifiers and negative attack modifiers
+        attack = max(caster.get_stat('attack'), caster.get_base_stat('attack'))
+        defense = min(target.get_stat('defense'), target.get_base_stat('defense'))
+    else:
+        attack = caster.get_stat('attack')
+        defense = target.get_stat('defense')
+
+    damage = 2 * attack * power//max(1,defense)
+    damage = damage//25
+    damage += 2
+
+    if effectiveness == SUPER_EFFECTIVE:
+        events.emit("super_effective", mage=target.name)
+        damage *= 2
+    elif effectiveness == NOT_VERY_EFFECTIVE:
+        events.emit("not_very_effective", mage=target.name)
+        damage //= 2
+
+    if critical_hit:
+        damage *= 2
+
+    return damage
+
+# Plays out an attack ("attack", "rebound" or "leech") and returns its
+# summary. amount is the rebound or leech percentage. effectiveness is the
+# attack's multiplier against the target, and own_effectiveness against the
+# caster, which only rebounds need
+def run_attack(kind, power, accuracy, critical_hit_prob, amount, effectiveness, own_effectiveness, caster, target, rng):
+    summary = {
+        "type"               : kind,
+        "super_effective"    : effectiveness == SUPER_EFFECTIVE,
+        "not_very_effective" : effectiveness == NOT_VERY_EFFECTIVE,
+        "target" : target,
+        "evades" : False
+    }
+    # Test for evasion and report if target dodged
+    if target_evades(accuracy, caster, target, rng):
+        summary["evades"] = True
+        summary["sustained"] = 0
+        events.emit("evades", mage=target.name)
+        return summary
 
-    def apply_effect(self, caster, target):
-        raise NotImplementedError
+    critical = rng.randint(0, 100) < critical_hit_prob
+    summary["critical"] = critical
+    # Apply damage
+    damage = compute_damage(power, caster, target, critical, effectiveness)
+    if kind == "attack":
+        summary["effect"] = damage
+        summary["sustained"] = target.take_damage(damage)
+    elif kind == "rebound":
+        summary["sustained"] = target.take_damage(damage)
+        summary["effect"] = damage
+        events.emit("rebound", mage=caster.name)
+        if summary["sustained"] > 0:
+            rebound = (compute_damage(power, caster, caster, False, own_effectiveness)*amount)//100
+            rebound = max(1, rebound)
+        else:
+            rebound = 0
+        caster.take_damage(rebound)
+        summary["rebound"] = rebound
+    else:
+        summary["sustained"] = target.take_damage(damage)
+        summary["effect"] = damage
+        events.emit("leech", mage=caster.name, target=target.name)
+        if summary["sustained"] > 0:
+            leeched = max(1, (summary["sustained"]*amount)//100)
+            caster.restore_health(leeched)
+            summary["leech"] = leeched
+    return summary
 
 # A spell which reduces the targets health. Damage is a function of
 # attack power, caster power, target defense and some random variables
@@ -66,58 +174,19 @@ class AttackEffect(Effect):
         # Store move accuracy and critical hit probability
         self.critical_hit_prob = critical_hit_prob
 
-    def compute_damage(self, caster, target, critical_hit=False):
-        if critical_hit:
-            print("Critical hit")
-            # Critical hits ignore positive defense modifiers and negative attack modifiers
-            attack = max(caster.get_stat('attack'), caster.get_base_stat('attack'))
-            defense = min(target.get_stat('defense'), target.get_base_stat('defense'))
-        else:
-            attack = caster.get_stat('attack')
-            defense = target.get_stat('defense')
-
-        damage = 2 * attack * self.power//max(1,defense)
-        damage = damage//25
-        damage += 2
-
-        if self.element.is_strong_against(target.element):
-            print("It's super effective")
-            damage *= 2
-        elif self.element.is_weak_against(target.element):
-            print("It's not very effective")
-            damage //= 2
-
-        if critical_hit:
-            damage *= 2
-
-        return damage
+    def compute_damage(self, caster, target, critical_hit=False, effectiveness=None):
+        if effectiveness == None:
+            effectiveness = self.element.get_effectiveness(target.element)
+        return compute_damage(self.power, caster, target, critical_hit, effectiveness)
 
     # Simple computation of critical hit depending on critical_hit_prob of spell
-    def is_critical_hit(self):
-        return random.randint(0, 100) < self.critical_hit_prob
+    def is_critical_hit(self, rng=random):
+        return rng.randint(0, 100) < self.critical_hit_prob
 
     # Override parent apply effect method for our AttackEffect
-    def apply_effect(self, caster, target):
-        summary = {
-            "type"               : "attack",
-            "super_effective"    : self.element.is_strong_against(target.element),
-            "not_very_effective" : self.element.is_weak_against(target.element),
-            "target" : target,
-            "evades" : False
-        }
-        # Test for evasion and report if target dodged
-        if self.target_evades(caster, target):
-            summary["evades"] = True
-            summary["sustained"] = 0
-            print("{} evades the attack.".format(target.name))
-        else:
-            critical = self.is_critical_hit()
-            summary["critical"] = critical
-            # Apply damage
-            damage = self.compute_damage(caster, target, critical)
-            summary["effect"] = damage
-            summary["sustained"] = target.take_damage(damage)
-        return summary
+    def apply_effect(self, caster, target, rng=random):
+        effectiveness = self.element.get_effectiveness(target.element)
+        return run_attack("attack", self.power, self.accuracy, self.critical_hit_prob, 0, effectiveness, None, caster, target, rng)
 
 class ReboundAttackEffect(AttackEffect):
     def __init__(self, element, power, accuracy, critical_hit_prob, rebound):
@@ -128,36 +197,10 @@ class ReboundAttackEffect(AttackEffect):
         self.rebound = rebound
 
     # Override parent apply effect method for our AttackEffect
-    def apply_effect(self, caster, target):
-        summary = {
-            "type"               : "rebound",
-            "super_effective"    : self.element.is_strong_against(target.element),
-            "not_very_effective" : self.element.is_weak_against(target.element),
-            "target" : target,
-            "evades" : False
-        }
-        # Test for evasion and report if target dodged
-        if self.target_evades(caster, target):
-            summary["evades"] = True
-            summary["sustained"] = 0
-            print("{} evades the attack.".format(target.name))
-        else:
-            critical = self.is_critical_hit()
-            summary["critical"] = critical
-            # Apply damage
-            damage = self.compute_damage(caster, target, critical)
-            summary["sustained"]=target.take_damage(damage)
-            summary["effect"] = damage
-            print("{} is hit by the rebound".format(caster.name))
-            if summary["sustained"] > 0:
-                rebound = (self.compute_damage(caster, caster)*self.rebound)//100
-                rebound = max(1, rebound)
-            else:
-                rebound = 0
-            caster.take_damage(rebound)
-            summary["rebound"] = rebound
-
-        return summary
+    def apply_effect(self, caster, target, rng=random):
+        effectiveness = self.element.get_effectiveness(target.element)
+        own_effectiveness = self.element.get_effectiveness(caster.element)
+        return run_attack("rebound", self.power, self.accuracy, self.critical_hit_prob, self.rebound, effectiveness, own_effectiveness, caster, target, rng)
 
 class LeechAttackEffect(AttackEffect):
     def __init__(self, element, power, accuracy, critical_hit_prob, leech):
@@ -168,39 +211,16 @@ class LeechAttackEffect(AttackEffect):
         self.leech = leech
 
     # Override parent apply effect method for our LeechAttackEffect
-    def apply_effect(self, caster, target):
-        summary = {
-            "type"               : "leech",
-            "super_effective"    : self.element.is_strong_against(target.element),
-            "not_very_effective" : self.element.is_weak_against(target.element),
-            "target" : target,
-            "evades" : False
-        }
-        # Test for evasion and report if target dodged
-        if self.target_evades(caster, target):
-            summary["evades"] = True
-            summary["sustained"] = 0
-            print("{} evades the attack.".format(target.name))
-        else:
-            critical = self.is_critical_hit()
-            summary["critical"] = critical
-            # Apply damage
-            damage = self.compute_damage(caster, target, critical)
-            summary["sustained"]=target.take_damage(damage)
-            summary["effect"] = damage
-            print("{} absorbs energy from {}".format(caster.name, target.name))
-            if summary["sustained"] > 0:
-                leeched = max(1, (summary["sustained"]*self.leech)//100)
-                caster.restore_health(leeched)
-                summary["leech"] = leeched
-        return summary
+    def apply_effect(self, caster, target, rng=random):
+        effectiveness = self.element.get_effectiveness(target.element)
+        return run_attack("leech", self.power, self.accuracy, self.critical_hit_prob, self.leech, effectiveness, None, caster, target, rng)
 
 class BoostStatEffect(Effect):
     def __init__(self, element, power, stat):
         super(BoostStatEffect, self).__init__(element, power)
         self.stat = stat
 
-    def apply_effect(self, caster, target):
+    def apply_effect(self, caster, target, rng=random):
         summary = {
             "type"   : "stat_boost",
             "stat"   : self.stat,
@@ -215,7 +235,7 @@ class ReduceStatEffect(Effect):
         super(ReduceStatEffect, self).__init__(element, power, accuracy)
         self.stat = stat
 
-    def apply_effect(self, caster, target):
+    def apply_effect(self, caster, target, rng=random):
         summary = {
             "type"   : "stat_reduce",
             "stat"   : self.stat,
@@ -226,7 +246,7 @@ class ReduceStatEffect(Effect):
         return summary
 
 class HealingEffect(Effect):
-    def apply_effect(self, caster, target):
+    def apply_effect(self, caster, target, rng=random):
         summary = {
             "type"   : "healing",
             "target" : target,
@@ -248,36 +268,37 @@ class Spell(object):
     def is_castable_by(self, caster):
         return self.element.is_compatible_with(caster.element)
 
-    def cast(self, caster, target):
+    def cast(self, caster, target, rng=random):
         if isinstance(target, list):
-            target = target[random.randint(0,len(target)-1)]
+            target = target[rng.randint(0,len(target)-1)]
 
         summary = {
             "caster" : caster,
             "result" : []
         }
         for effect in self.effects:
-            summary["result"].append(effect.apply_effect(caster, target))
+            summary["result"].append(effect.apply_effect(caster, target, rng))
         return summary
 
 class GroupSpell(Spell):
-    def cast(self, caster, targets):
+    def cast(self, caster, targets, rng=random):
         summary = {
             "caster" : caster,
             "result" : []
         }
         for target in targets:
             for effect in self.effects:
-                summary["result"].append(effect.apply_effect(caster, target))
+                summary["result"].append(effect.apply_effect(caster, target, rng))
         return summary
 ##########################################
 #                Commands                #
 ##########################################
 class SpellCommand:
-    def __init__(self, spell, caster, target):
+    def __init__(self, spell, caster, target, rng=random):
         self.spell = spell
         self.caster = caster
         self.target = target
+        self.rng = rng
 
     def execute(self):
         raise NotImplementedError
@@ -285,11 +306,11 @@ class SpellCommand:
 class CastSpell(SpellCommand):
     def execute(self):
         if not self.spell.is_castable_by(self.caster):
-            print("{} can't cast {}".format(self.caster.name, self.spell.name) )
+            events.emit("cannot_cast", mage=self.caster.name, spell=self.spell.name)
             return { "caster": self.caster, "success" : False, "reason" : "cannot cast", "spell" : self.spell}
         else:
-            print("{} casts {}".format(self.caster.name, self.spell.name) )
-            result = self.spell.cast(self.caster, self.target)
+            events.emit("casts", mage=self.caster.name, spell=self.spell.name)
+            result = self.spell.cast(self.caster, self.target, self.rng)
             result['spell'] = self.spell
             result["success"] = True
             return result
@@ -304,39 +325,166 @@ class Magic:
     def execute(self, command):
         return command.execute()
 
+##########################################
+#            Compiled Spells             #
+##########################################
+# Batch simulations can swap the spell objects above for a flat table of
+# immutable records, run by a single interpreter function. A cast then
+# skips the command and invoker objects and the virtual calls through
+# every Effect, but reports the same events, rolls the random numbers in
+# the same order and returns the same summaries as Spell.cast().
+OP_ATTACK, OP_REBOUND, OP_LEECH, OP_STAT_BOOST, OP_STAT_REDUCE, OP_HEAL = range(6)
+
+effect_opcodes = [
+    (ReboundAttackEffect, OP_REBOUND),
+    (LeechAttackEffect,   OP_LEECH),
+    (AttackEffect,        OP_ATTACK),
+    (BoostStatEffect,     OP_STAT_BOOST),
+    (ReduceStatEffect,    OP_STAT_REDUCE),
+    (HealingEffect,       OP_HEAL)
+]
+
+# Summary type of every attack opcode
+attack_kinds = { OP_ATTACK : "attack", OP_REBOUND : "rebound", OP_LEECH : "leech" }
+
+# amount is the rebound or leech percentage of the attacks that have one
+CompiledEffect = namedtuple("CompiledEffect", ["opcode", "power", "accuracy", "critical_hit_prob", "amount", "stat"])
+CompiledSpell  = namedtuple("CompiledSpell", ["name", "spell", "element", "group", "effects"])
+
+def compile_effect(effect):
+    for effect_class, opcode in effect_opcodes:
+        if isinstance(effect, effect_class):
+            return CompiledEffect(
+                opcode,
+                effect.power,
+                effect.accuracy,
+                getattr(effect, "critical_hit_prob", 0),
+                getattr(effect, "rebound", getattr(effect, "leech", 0)),
+                getattr(effect, "stat", None)
+            )
+    raise ValueError("Can't compile effect {}".format(type(effect).__name__))
+
+def compile_spell(spell):
+    return CompiledSpell(
+        spell.name,
+        spell,
+        spell.element.id,
+        isinstance(spell, GroupSpell),
+        tuple(compile_effect(effect) for effect in spell.effects)
+    )
+
+def run_compiled_effect(effect, element, caster, target, rng):
+    opcode = effect.opcode
+
+    if opcode == OP_STAT_BOOST:
+        summary = { "type" : "stat_boost", "stat" : effect.stat, "target" : target, "power" : effect.power }
+        summary["effect"] = target.boost_stat(effect.stat, effect.power)
+        return summary
+    if opcode == OP_STAT_REDUCE:
+        summary = { "type" : "stat_reduce", "stat" : effect.stat, "target" : target, "power" : effect.power }
+        summary["effect"] = target.reduce_stat(effect.stat, effect.power)
+        return summary
+    if opcode == OP_HEAL:
+        summary = { "type" : "healing", "target" : target, "effect" : effect.power }
+        target.restore_health(effect.power)
+        return summary
+
+    row = SpellBook.effectiveness[element]
+    own_effectiveness = row[caster.element.id] if opcode == OP_REBOUND else None
+    return run_attack(attack_kinds[opcode], effect.power, effect.accuracy, effect.critical_hit_prob, effect.amount,
+                      row[target.element.id], own_effectiveness, caster, target, rng)
+
+def run_compiled_spell(spell, caster, target, rng=random):
+    if not SpellBook.compatibility[spell.element][caster.element.id]:
+        events.emit("cannot_cast", mage=caster.name, spell=spell.name)
+        return { "caster": caster, "success" : False, "reason" : "cannot cast", "spell" : spell.spell}
+
+    events.emit("casts", mage=caster.name, spell=spell.name)
+    if spell.group:
+        targets = target
+    else:
+        if isinstance(target, list):
+            target = target[rng.randint(0,len(target)-1)]
+        targets = [target]
+
+    summary = {
+        "caster" : caster,
+        "result" : []
+    }
+    for target in targets:
+        for effect in spell.effects:
+            summary["result"].append(run_compiled_effect(effect, spell.element, caster, target, rng))
+    summary["spell"] = spell.spell
+    summary["success"] = True
+    return summary
+
 ##########################################
 #                 Client                 #
 ##########################################
 class SpellBook:
-    spells   = {}
-    elements = {}
-
-    spell_constructors  = {
+    # Everything loaded is published as read-only views (mappings and
+    # tuples), and only replaced as a whole when the spell book is loaded
+    # again
+    spells   = MappingProxyType({})
+    elements = MappingProxyType({})
+
+    # Elements by id, and matrices indexed by [attacking id][defending id]
+    # giving the damage multiplier and whether spells can be cast
+    element_list  = ()
+    effectiveness = ()
+    compatibility = ()
+
+    # Spell name -> CompiledSpell while compiled mode is on, None otherwise
+    compiled_spells = None
+
+    spell_constructors  = MappingProxyType({
         'group'  : GroupSpell,
         'single' : Spell
-    }
+    })
 
-    effect_constructors = {
+    effect_constructors = MappingProxyType({
         'attack'        : AttackEffect,
         'rebound_attack' : ReboundAttackEffect,
         'leech_attack'   : LeechAttackEffect,
         'stat_boost'    : BoostStatEffect,
         'stat_reduce'   : ReduceStatEffect,
         'heal'          : HealingEffect
-    }
+    })
+
+    # All the spell data lives in the class, so every mage can cast from
+    # the same instance. See get_shared()
+    shared = None
 
     def __init__(self):
         self.magic = Magic()
 
-    def cast_spell(self, spell, caster, target):
+    def __setattr__(self, name, value):
+        if SpellBook.shared is self:
+            raise AttributeError("The shared spell book is read-only")
+        object.__setattr__(self, name, value)
+
+    @staticmethod
+    def get_shared():
+        if SpellBook.shared == None:
+            SpellBook.shared = SpellBook()
+        return SpellBook.shared
+
+    def cast_spell(self, spell, caster, target, rng=random):
+        if SpellBook.compiled_spells != None:
+            if spell in SpellBook.compiled_spells:
+                return run_compiled_spell(SpellBook.compiled_spells[spell], caster, target, rng)
+            events.emit("unknown_spell_name", spell=spell)
+            return { "success" : False }
+
         spell = SpellBook.get_spell_object(spell)
         if spell != None:
-            return self.magic.execute(CastSpell(spell, caster, target))
+            return self.magic.execute(CastSpell(spell, caster, target, rng))
         else:
             return { "success" : False }
 
     @staticmethod
     def __load_elements(xml_tree):
+        loaded = dict(SpellBook.elements)
         elements = xml_tree.find('elements').findall('element')
 
         # Load element types from the XML file
@@ -353,10 +501,40 @@ class SpellBook:
             compatible.append(name)
 
             # Add the element to our spell book
-            SpellBook.elements[name] = Element(name, strong, weak, compatible)
+            # Elements keep their id if the spell book gets reloaded
+            if name in loaded:
+                element_id = loaded[name].id
+            else:
+                element_id = len(loaded)
+
+            loaded[name] = Element(name, strong, weak, compatible, element_id)
+
+        SpellBook.elements = MappingProxyType(loaded)
+
+    @staticmethod
+    def __build_element_matrices():
+        SpellBook.element_list = tuple(sorted(SpellBook.elements.values(), key=lambda element: element.id))
+
+        effectiveness = []
+        compatibility = []
+        for element in SpellBook.element_list:
+            # Ask the element before handing it its rows, so the answers
+            # come from its strong/weak/compatible lists
+            element.effectiveness = None
+            element.compatibility = None
+            effectiveness.append(tuple(element.get_effectiveness(other) for other in SpellBook.element_list))
+            compatibility.append(tuple(element.is_compatible_with(other) for other in SpellBook.element_list))
+
+        SpellBook.effectiveness = tuple(effectiveness)
+        SpellBook.compatibility = tuple(compatibility)
+
+        for element in SpellBook.element_list:
+            element.effectiveness = SpellBook.effectiveness[element.id]
+            element.compatibility = SpellBook.compatibility[element.id]
 
     @staticmethod
     def __load_spells(xml_tree):
+        loaded = dict(SpellBook.spells)
         spells   = xml_tree.find('spells').findall('spell')
 
         # Load spells into our spell book
@@ -400,7 +578,9 @@ class SpellBook:
                 effects.append(SpellBook.effect_constructors[effect_type](element, **effect.attrib))
 
             # Create the spell from all that we've loaded
-            SpellBook.spells[name] = SpellBook.spell_constructors[spell.attrib['type']](name, effects, element)
+            loaded[name] = SpellBook.spell_constructors[spell.attrib['type']](name, effects, element)
+
+        SpellBook.spells = MappingProxyType(loaded)
 
     @staticmethod
     def load_spell_book(spell_book):
@@ -408,20 +588,46 @@ class SpellBook:
         tree = data.getroot()
 
         SpellBook.__load_elements(tree)
+        SpellBook.__build_element_matrices()
         SpellBook.__load_spells(tree)
 
+        if SpellBook.compiled_spells != None:
+            SpellBook.compile()
+
+    # Switches compiled mode on or off. Spells loaded later on get compiled
+    # as well while it is on
+    @staticmethod
+    def set_compiled(compiled):
+        if compiled:
+            SpellBook.compile()
+        else:
+            SpellBook.compiled_spells = None
+
+    @staticmethod
+    def compile():
+        SpellBook.compiled_spells = MappingProxyType(dict((name, compile_spell(spell)) for name, spell in SpellBook.spells.items()))
+
     @staticmethod
     def get_element_object(identifier):
         if identifier not in SpellBook.elements:
-            print("{} is not a real element".format(identifier))
+            events.emit("unknown_element", element=identifier)
             return None
         else:
             return SpellBook.elements[identifier]
 
+    # Damage multiplier of one element's attacks against another, by name.
+    # AI scripts only ever see element names, so this is the easy way for
+    # them to use the matrix
+    @staticmethod
+    def get_effectiveness(attacker, defender):
+        attacker = SpellBook.elements[attacker]
+        defender = SpellBook.elements[defender]
+        return SpellBook.effectiveness[attacker.id][defender.id]
+
     @staticmethod
     def get_spell_object(identifier):
         if identifier not in SpellBook.spells:
-            print("{} is not a real spell".format(identifier))
+            events.emit("unknown_spell_name", spell=identifier)
             return None
         else:
             return SpellBook.spells[identifier]
@@ -0,0 +1,382 @@
+import random
+from app.models import magic
+from app.models import events
+from app.models.battle import Battle
+from app.models.mage_manager import MageManager
+
+# NumPy is only needed for the vectorized engine. Without it every matchup
+# is played out one Battle at a time
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+##########################################
+#          Monte-Carlo Matchups          #
+##########################################
+# Estimates how likely one team is to beat another by playing the same
+# matchup many times over:
+#
+#     estimator = MatchupEstimator(team1, team2)
+#     estimate = estimator.estimate(100000, seed=1)
+#     estimate["win_probability"]       # chance that team1 wins
+#
+# When every mage on both teams always makes the same choice, like the
+# mages in teams/alpha_squad do, thousands of battles are simulated at once
+# on NumPy arrays with exactly the rules of the scalar models: the same
+# move order, evasion, critical hit and damage formulas, and the same way
+# of choosing a winner. Only the random numbers differ, so results agree
+# with Battle statistically but not roll for roll. Any other AI (or a
+# missing NumPy) falls back to playing ordinary Battles.
+
+ATTACK, DEFENSE, SPEED = 0, 1, 2
+stat_index = { 'attack' : ATTACK, 'defense' : DEFENSE, 'speed' : SPEED }
+
+# Targets of a static plan
+ALLIES, ENEMIES = 0, 1
+
+# A mage's AI is only considered static if it gives the same answer in all
+# of these made up situations
+probe_trials = 8
+
+# Works out what a mage's AI always does: None if it does nothing useful,
+# (spell, ALLIES or ENEMIES) if it always casts the same spell at the same
+# side, or raises ValueError if its choice depends on the state of the battle
+def probe_static_plan(manager, allies, enemies, rng):
+    managers = allies + enemies
+    plan = None
+    for trial in range(probe_trials + 1):
+        # The first trial is the start of a battle, the rest are random
+        # states that always leave the planning mage conscious
+        for other in managers:
+            health = other.max_hp
+            if trial > 0 and other is not manager:
+                health = rng.choice([0, rng.randint(0, other.max_hp), other.max_hp])
+            elif trial > 0:
+                health = rng.randint(1, max(1, other.max_hp))
+            other.mage.health  = health
+            other.mage.attack  = other.get_base_stat('attack')
+            other.mage.defense = other.get_base_stat('defense')
+            other.mage.speed   = other.get_base_stat('speed')
+
+        flattened_allies  = [mage.mage for mage in allies]
+        flattened_enemies = [mage.mage for mage in enemies]
+
+        try:
+            decision = manager.mage.make_move(flattened_allies, flattened_enemies)
+        except Exception:
+            decision = None
+
+        if type(decision) is not tuple:
+            choice = None
+        elif len(decision) < 2:
+            raise ValueError("{} makes an invalid choice".format(manager.name))
+        elif decision[1] == flattened_allies:
+            choice = (decision[0], ALLIES)
+        elif decision[1] == flattened_enemies:
+            choice = (decision[0], ENEMIES)
+        else:
+            raise ValueError("{} picks its own targets".format(manager.name))
+
+        if trial > 0 and choice != plan:
+            raise ValueError("{} changes its mind".format(manager.name))
+        plan = choice
+
+    if plan == None:
+        return None
+
+    # Spells the mage can't actually cast make the move do nothing
+    spell = magic.SpellBook.spells.get(plan[0]) if isinstance(plan[0], str) else None
+    if spell == None or plan[0] not in manager.spells or not spell.is_castable_by(manager):
+        return None
+    return (spell, plan[1])
+
+class MatchupEstimator:
+    # Battles simulated together. Bounds the memory used by the arrays
+    chunk_size = 65536
+
+    def __init__(self, team1, team2, max_round=10):
+        self.team1 = team1
+        self.team2 = team2
+        self.max_round = max_round
+
+        self.plans = None
+        self.reason = None
+        if np == None:
+            self.reason = "NumPy is not installed"
+        else:
+            self.plans = self.find_static_plans()
+
+        if self.plans != None:
+            self.build_tables()
+
+    def is_vectorized(self):
+        return self.plans != None
+
+    def find_static_plans(self):
+        sink = events.get_sink()
+        events.set_sink(events.NullSink())
+        try:
+            self.team1.reinitialize()
+            self.team2.reinitialize()
+            rng = random.Random(0)
+            allies1, allies2 = list(self.team1), list(self.team2)
+            plans = []
+            for mage in allies1:
+                plans.append(probe_static_plan(mage, allies1, allies2, rng))
+            for mage in allies2:
+                plans.append(probe_static_plan(mage, allies2, allies1, rng))
+        except ValueError as e:
+            self.reason = str(e)
+            return None
+        finally:
+            # Leave the teams fresh, whatever the AIs did to themselves
+            self.team1.reinitialize()
+            self.team2.reinitialize()
+            events.set_sink(sink)
+        return plans
+
+    # Everything about the rosters that doesn't change during a battle,
+    # laid out as arrays indexed by mage (team1 first, then team2)
+    def build_tables(self):
+        mages = list(self.team1) + list(self.team2)
+        n1 = len(self.team1)
+
+        self.mages = mages
+        self.n1 = n1
+        self.max_hp = np.array([mage.max_hp for mage in mages], dtype=np.int64)
+        self.base = np.array([[mage.get_base_stat(stat) for stat in ['attack', 'defense', 'speed']] for mage in mages], dtype=np.int64).reshape(len(mages), 3)
+        self.multipliers = np.array([MageManager.modifier_multipliers[m] for m in range(-MageManager.modifier_minmax, MageManager.modifier_minmax + 1)])
+
+        # Mages are lined up alternately from each team before being sorted
+        # by speed, which decides who goes first between equally fast mages
+        position = []
+        for mage in range(len(mages)):
+            position.append(2*mage if mage < n1 else 2*(mage - n1) + 1)
+        self.position = np.array(position, dtype=np.int64)
+
+        self.sides = [np.arange(0, n1), np.arange(n1, len(mages))]
+        self.side_of = (np.arange(len(mages)) >= n1).astype(np.int64)
+
+        # Without stat effects every stat keeps its base value all battle
+        self.fixed_stats = not any(
+            isinstance(effect, (magic.BoostStatEffect, magic.ReduceStatEffect))
+            for plan in self.plans if plan != None for effect in plan[0].effects
+        )
+
+        # Damage multiplier of every element against every mage, straight
+        # from the spell book's effectiveness matrix
+        elements = [mage.element.id for mage in mages]
+        self.effectiveness = np.array(magic.SpellBook.effectiveness).reshape(-1, len(magic.SpellBook.element_list))[:, elements]
+
+    def estimate(self, n_battles, seed=None):
+        if self.is_vectorized():
+            wins = self.simulate(n_battles, seed)
+        else:
+            wins = self.play(n_battles, seed)
+        return {
+            "teams"           : (self.team1.get_short_name(), self.team2.get_short_name()),
+            "battles"         : n_battles,
+            "wins"            : (wins, n_battles - wins),
+            "win_probability" : float(wins)/max(n_battles, 1),
+            "vectorized"      : self.is_vectorized()
+        }
+
+    # Scalar fallback: plays the battles one after another
+    def play(self, n_battles, seed=None):
+        rng = random.Random(seed)
+        sink = events.get_sink()
+        events.set_sink(events.NullSink())
+        wins = 0
+        try:
+            for i in range(n_battles):
+                battle = Battle(self.team1, self.team2, rng.getrandbits(32))
+                while not battle.play_next_move()['finished']:
+                    pass
+                if battle.get_winning_side() == 1:
+                    wins += 1
+        finally:
+            events.set_sink(sink)
+        return wins
+
+    def simulate(self, n_battles, seed=None):
+        rng = np.random.default_rng(seed)
+        wins = 0
+        for start in range(0, n_battles, MatchupEstimator.chunk_size):
+            wins += self.simulate_chunk(min(MatchupEstimator.chunk_size, n_battles - start), rng)
+        return wins
+
+    def simulate_chunk(self, n, rng):
+        n_mages = len(self.mages)
+        self.hp = np.tile(self.max_hp, (n, 1))
+        self.modifiers = np.zeros((3, n, n_mages), dtype=np.int64)
+        # Conscious mages left on each team
+        self.alive = np.array([np.full(n, np.count_nonzero(side)) for side in (self.max_hp[:self.n1], self.max_hp[self.n1:])])
+
+        running = ~self.is_over()
+        for round_number in range(self.max_round):
+            live = np.flatnonzero(running)
+            if len(live) == 0:
+                break
+
+            # Move order for the round, fastest first. When stats can't
+            # change it is the same in every battle
+            if self.fixed_stats:
+                order = np.lexsort((self.position, -self.base[:, SPEED]))[None, :]
+            else:
+                speed = self.get_stat(live[:, None], np.arange(n_mages)[None, :], SPEED)
+                order = np.lexsort((np.broadcast_to(self.position, speed.shape), -speed))
+
+            for turn in range(n_mages):
+                for caster, battles in self.get_casters(order[:, turn], live):
+                    plan = self.plans[caster]
+                    if plan == None:
+                        continue
+                    # Mages that fainted earlier in the round miss their turn
+                    battles = battles[self.hp[battles, caster] > 0]
+                    if len(battles) > 0:
+                        self.cast(plan, caster, battles, rng)
+
+                running[live] = ~self.is_over(live)
+                keep = running[live]
+                live = live[keep]
+                if not self.fixed_stats:
+                    order = order[keep]
+
+        return int(np.count_nonzero(self.get_winners()))
+
+    # Splits the battles by which mage moves this turn
+    def get_casters(self, casters, live):
+        if len(casters) == 1:
+            return [(casters[0], live)]
+        counts = np.bincount(casters, minlength=len(self.mages))
+        return [(caster, live if counts[caster] == len(live) else live[casters == caster]) for caster in np.flatnonzero(counts)]
+
+    def is_over(self, battles=slice(None)):
+        return (self.alive[0][battles] == 0) | (self.alive[1][battles] == 0)
+
+    # True wherever team1 won, decided the same way as Battle.get_winner()
+    def get_winners(self):
+        defeated1 = ~self.hp[:, :self.n1].any(axis=1)
+        defeated2 = ~self.hp[:, self.n1:].any(axis=1)
+
+        # Summed one mage at a time, like the scalar sum()
+        health1 = np.zeros(len(self.hp))
+        for mage in range(self.n1):
+            health1 = health1 + self.hp[:, mage]/float(max(self.max_hp[mage], 1))
+        health2 = np.zeros(len(self.hp))
+        for mage in range(self.n1, len(self.mages)):
+            health2 = health2 + self.hp[:, mage]/float(max(self.max_hp[mage], 1))
+
+        return defeated2 | (~defeated1 & (health1 > health2))
+
+    def get_stat(self, battles, mages, stat):
+        if self.fixed_stats:
+            return np.broadcast_to(self.base[mages, stat], np.broadcast(battles, mages).shape)
+        modifiers = self.modifiers[stat][battles, mages] + MageManager.modifier_minmax
+        return (self.base[mages, stat] * self.multipliers[modifiers]).astype(np.int64)
+
+    def cast(self, plan, caster, battles, rng):
+        spell, side = plan
+        if side == ALLIES:
+            targets = self.sides[0 if caster < self.n1 else 1]
+        else:
+            targets = self.sides[1 if caster < self.n1 else 0]
+
+        if isinstance(spell, magic.GroupSpell):
+            for target in targets:
+                for effect in spell.effects:
+                    self.apply_effect(effect, caster, battles, np.full(len(battles), target), rng)
+        elif len(targets) > 0:
+            # Random target, fainted mages included
+            chosen = targets[rng.integers(0, len(targets), len(battles))]
+            for effect in spell.effects:
+                self.apply_effect(effect, caster, battles, chosen, rng)
+
+    def apply_effect(self, effect, caster, battles, targets, rng):
+        if isinstance(effect, magic.AttackEffect):
+            self.apply_attack(effect, caster, battles, targets, rng)
+        elif isinstance(effect, magic.BoostStatEffect):
+            stat = stat_index[effect.stat]
+            modifiers = self.modifiers[stat][battles, targets]
+            delta = np.minimum(effect.power, MageManager.modifier_minmax - modifiers)
+            self.modifiers[stat][battles, targets] = modifiers + np.where(self.hp[battles, targets] > 0, delta, 0)
+        elif isinstance(effect, magic.ReduceStatEffect):
+            stat = stat_index[effect.stat]
+            modifiers = self.modifiers[stat][battles, targets]
+            delta = np.minimum(effect.power, modifiers + MageManager.modifier_minmax)
+            self.modifiers[stat][battles, targets] = modifiers - np.where(self.hp[battles, targets] > 0, delta, 0)
+        elif isinstance(effect, magic.HealingEffect):
+            self.restore_health(battles, targets, effect.power)
+
+    def compute_damage(self, effect, caster, battles, targets, critical):
+        attack  = self.get_stat(battles, caster, ATTACK)
+        defense = self.get_stat(battles, targets, DEFENSE)
+        if critical is not None:
+            # Critical hits ignore positive defense modifiers and negative attack modifiers
+            attack  = np.where(critical, np.maximum(attack, self.base[caster, ATTACK]), attack)
+            defense = np.where(critical, np.minimum(defense, self.base[targets, DEFENSE]), defense)
+
+        damage = 2 * attack * effect.power//np.maximum(1, defense)
+        damage = damage//25
+        damage += 2
+
+        effectiveness = self.effectiveness[effect.element.id, targets]
+        damage = np.where(effectiveness == magic.SUPER_EFFECTIVE, damage*2, np.where(effectiveness == magic.NOT_VERY_EFFECTIVE, damage//2, damage))
+
+        if critical is not None:
+            damage = np.where(critical, damage*2, damage)
+        return damage
+
+    def apply_attack(self, effect, caster, battles, targets, rng):
+        # Evasion depends on the difference in speed, as in Effect.target_evades()
+        evasion  = self.get_stat(battles, targets, SPEED)
+        accuracy = self.get_stat(battles, caster, SPEED)
+        modifier = (accuracy - evasion)/np.maximum(1, accuracy + evasion).astype(float)
+        modifier = np.trunc(modifier*MageManager.modifier_minmax).astype(np.int64)
+        modifier = self.multipliers[modifier + MageManager.modifier_minmax]
+        accuracy = np.minimum(100, effect.accuracy * modifier)
+        hits = rng.integers(0, 101, len(battles)) <= accuracy
+
+        battles, targets = battles[hits], targets[hits]
+        if len(battles) == 0:
+            return
+
+        critical = rng.integers(0, 101, len(battles)) < effect.critical_hit_prob
+        damage = self.compute_damage(effect, caster, battles, targets, critical)
+        sustained = self.take_damage(battles, targets, damage)
+
+        if isinstance(effect, magic.ReboundAttackEffect):
+            caster_hit = np.full(len(battles), caster)
+            rebound = self.compute_damage(effect, caster, battles, caster_hit, None)*effect.rebound//100
+            rebound = np.where(sustained > 0, np.maximum(1, rebound), 0)
+            self.take_damage(battles, caster_hit, rebound)
+        elif isinstance(effect, magic.LeechAttackEffect):
+            leeched = np.maximum(1, (sustained*effect.leech)//100)
+            drained = sustained > 0
+            self.restore_health(battles[drained], np.full(np.count_nonzero(drained), caster), leeched[drained])
+
+    # Fainted mages neither take damage nor regain health
+    def take_damage(self, battles, targets, damage):
+        hp = self.hp[battles, targets]
+        sustained = np.minimum(damage, hp)
+        self.hp[battles, targets] = hp - sustained
+
+        fainted = (sustained > 0) & (sustained == hp)
+        if fainted.any():
+            self.alive[self.side_of[targets[fainted]], battles[fainted]] -= 1
+        return sustained
+
+    def restore_health(self, battles, targets, amount):
+        hp = self.hp[battles, targets]
+        delta = np.where(hp > 0, np.minimum(amount, self.max_hp[targets] - hp), 0)
+        self.hp[battles, targets] = hp + delta
+
+# Estimates for every pairing of the given teams
+def estimate_matchups(teams, n_battles, seed=None):
+    estimates = []
+    for i in range(len(teams)):
+        for j in range(i + 1, len(teams)):
+            estimator = MatchupEstimator(teams[i], teams[j])
+            estimates.append(estimator.estimate(n_battles, None if seed == None else seed + len(estimates)))
+    return estimates
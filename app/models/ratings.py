@@ -0,0 +1,126 @@
+import os
+import json
+
+##########################################
+#                Ratings                 #
+##########################################
+# Elo ratings for every team and every mage script that has played, kept
+# up to date one match at a time:
+#
+#     ratings = Ratings("ratings.jsonl")
+#     ratings.record_match(team1, team2, battle.get_winning_side())
+#
+# Scripts are rated by the results of the teams they played in. Each side
+# is rated as the average of its scripts, and every script on the side
+# gains (or loses) what the side did.
+#
+# With a path, every match appends a single line to the file holding the
+# new ratings of the team and scripts involved. Nothing is ever rewritten.
+# Loading the file reads the lines back in order, the last line a team or
+# script appears on holding its current rating.
+
+class Ratings:
+    def __init__(self, path=None, k_factor=32, initial_rating=1500):
+        self.path = path
+        self.k_factor = k_factor
+        self.initial_rating = initial_rating
+        self.ratings = {}   # (kind, name) -> rating
+        self.games = {}     # (kind, name) -> number of matches rated
+        self.n_matches = 0
+        self.file = None
+
+        if path != None:
+            if os.path.isfile(path):
+                self.load(path)
+            self.file = open(path, "a")
+
+    def load(self, path):
+        with open(path) as f:
+            for line in f:
+                if line.strip() == "":
+                    continue
+                entry = json.loads(line)
+                for kind, name, rating, games in entry["ratings"]:
+                    self.ratings[(kind, name)] = rating
+                    self.games[(kind, name)] = games
+                self.n_matches += 1
+
+    def close(self):
+        if self.file != None:
+            self.file.close()
+            self.file = None
+
+    def get_rating(self, kind, name):
+        return self.ratings.get((kind, name), self.initial_rating)
+
+    def get_team_rating(self, team):
+        return self.get_rating("team", team.get_name())
+
+    # Chance the side rated rating1 beats the side rated rating2
+    def get_expected_score(self, rating1, rating2):
+        return 1.0/(1.0 + 10**((rating2 - rating1)/400.0))
+
+    # Every mage script on a team, once per script
+    def get_modules(self, team):
+        return sorted(set(team.modules))
+
+    def get_side_rating(self, modules):
+        if len(modules) == 0:
+            return self.initial_rating
+        return sum(self.get_rating("module", module) for module in modules)/float(len(modules))
+
+    def update(self, key, delta, changed):
+        self.ratings[key] = self.ratings.get(key, self.initial_rating) + delta
+        self.games[key] = self.games.get(key, 0) + 1
+        changed.append([key[0], key[1], self.ratings[key], self.games[key]])
+
+    # Rates a match between two teams. winning_side is 1 if team1 won and
+    # 2 if team2 did, as Battle.get_winning_side() returns it. Teams are
+    # rated by their full names, which unlike short names are never cut
+    # down to the same thing
+    def record_match(self, team1, team2, winning_side):
+        score = 1.0 if winning_side == 1 else 0.0
+        changed = []
+
+        expected = self.get_expected_score(self.get_team_rating(team1), self.get_team_rating(team2))
+        delta = self.k_factor*(score - expected)
+        self.update(("team", team1.get_name()), delta, changed)
+        self.update(("team", team2.get_name()), -delta, changed)
+
+        modules1 = self.get_modules(team1)
+        modules2 = self.get_modules(team2)
+        expected = self.get_expected_score(self.get_side_rating(modules1), self.get_side_rating(modules2))
+        delta = self.k_factor*(score - expected)
+        for module in modules1:
+            self.update(("module", module), delta, changed)
+        for module in modules2:
+            self.update(("module", module), -delta, changed)
+
+        self.n_matches += 1
+        if self.file != None:
+            self.file.write(json.dumps({
+                "teams"   : [team1.get_name(), team2.get_name()],
+                "winner"  : (team1 if winning_side == 1 else team2).get_name(),
+                "ratings" : changed
+            }))
+            self.file.write("\n")
+            self.file.flush()
+
+    def record_battle(self, battle):
+        self.record_match(battle.team1, battle.team2, battle.get_winning_side())
+
+    # (name, rating, matches) for every team or script, best first
+    def get_table(self, kind="team"):
+        table = [(name, rating, self.games[(k, name)]) for (k, name), rating in self.ratings.items() if k == kind]
+        return sorted(table, key=lambda row: -row[1])
+
+ratings = None
+
+def set_ratings(new_ratings):
+    global ratings
+    if ratings != None and ratings is not new_ratings:
+        ratings.close()
+    ratings = new_ratings
+
+def get_ratings():
+    return ratings
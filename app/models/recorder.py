@@ -0,0 +1,213 @@
+import sys
+import json
+import array
+import struct
+
+##########################################
+#               Battle Log               #
+##########################################
+# A column oriented record of every move played in a battle. Each row is
+# one effect of one move (a group spell produces a row per target), and
+# moves that had no effect at all get a single row of their own. Mages,
+# spells and the various string fields are stored as small integer codes
+# that index into tables kept in the log header.
+#
+# On disk a log is a small JSON header followed by the raw bytes of every
+# column, all little endian:
+#
+#     "AIGL" | version (uint16) | header length (uint32) | header | columns
+#
+class BattleLog:
+    magic   = b"AIGL"
+    version = 1
+    prefix  = struct.Struct("<4sHI")
+
+    columns = [
+        ("move",               "I"),   # index of the move in the battle
+        ("round",              "B"),   # round the move was played in
+        ("caster",             "h"),   # mage index
+        ("spell",              "h"),   # index into the spell table, -1 if none
+        ("reason",             "b"),   # why the move failed, 0 if it didn't
+        ("target",             "h"),   # mage index, -1 if none
+        ("type",               "b"),   # effect type, 0 if no effect
+        ("stat",               "b"),   # stat affected by a stat effect
+        ("effect",             "i"),   # damage dealt, health restored or stat delta
+        ("sustained",          "i"),   # damage actually taken
+        ("rebound",            "i"),
+        ("leech",              "i"),
+        ("critical",           "b"),
+        ("evades",             "b"),
+        ("super_effective",    "b"),
+        ("not_very_effective", "b")
+    ]
+
+    def __init__(self, teams=None):
+        # [(team name, [mage names])]
+        self.teams   = teams if teams != None else []
+        self.tables  = { "spell" : [], "reason" : [""], "type" : [""], "stat" : [""] }
+        self.codes   = dict((name, dict((v, i) for i, v in enumerate(table))) for name, table in self.tables.items())
+        self.data    = dict((name, array.array(typecode)) for name, typecode in BattleLog.columns)
+        self.info    = {}
+        self.n_moves = 0
+
+    def __len__(self):
+        return len(self.data["move"])
+
+    def get_column(self, name):
+        return self.data[name]
+
+    def get_table(self, name):
+        return self.tables[name]
+
+    def encode(self, table, value):
+        codes = self.codes[table]
+        if value not in codes:
+            codes[value] = len(self.tables[table])
+            self.tables[table].append(value)
+        return codes[value]
+
+    def decode(self, table, code):
+        if code < 0:
+            return None
+        return self.tables[table][code]
+
+    def append_row(self, row):
+        for name, typecode in BattleLog.columns:
+            self.data[name].append(row.get(name, 0))
+
+    # Rows belonging to a move, as a slice over the columns
+    def get_move_rows(self, move):
+        moves = self.data["move"]
+        start = self.find_move(move)
+        end = start
+        while end < len(moves) and moves[end] == move:
+            end += 1
+        return range(start, end)
+
+    def find_move(self, move):
+        # Moves are recorded in order, so binary search for the first row
+        moves = self.data["move"]
+        lo, hi = 0, len(moves)
+        while lo < hi:
+            mid = (lo + hi)//2
+            if moves[mid] < move:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def get_row(self, index):
+        return dict((name, self.data[name][index]) for name, typecode in BattleLog.columns)
+
+    def save(self, path):
+        header = json.dumps({
+            "teams"   : self.teams,
+            "tables"  : self.tables,
+            "info"    : self.info,
+            "n_moves" : self.n_moves,
+            "rows"    : len(self),
+            "columns" : [(name, typecode, self.data[name].itemsize) for name, typecode in BattleLog.columns]
+        }).encode("utf-8")
+
+        with open(path, "wb") as f:
+            f.write(BattleLog.prefix.pack(BattleLog.magic, BattleLog.version, len(header)))
+            f.write(header)
+            for name, typecode in BattleLog.columns:
+                column = self.data[name]
+                if sys.byteorder != "little":
+                    column = array.array(typecode, column)
+                    column.byteswap()
+                f.write(column.tobytes())
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as f:
+            magic, version, header_length = BattleLog.prefix.unpack(f.read(BattleLog.prefix.size))
+            if magic != BattleLog.magic or version != BattleLog.version:
+                raise ValueError("{} is not a battle log".format(path))
+
+            header = json.loads(f.read(header_length).decode("utf-8"))
+
+            log = BattleLog([(team, list(mages)) for team, mages in header["teams"]])
+            log.tables  = header["tables"]
+            log.codes   = dict((name, dict((v, i) for i, v in enumerate(table))) for name, table in log.tables.items())
+            log.info    = header["info"]
+            log.n_moves = header["n_moves"]
+
+            for name, typecode, itemsize in header["columns"]:
+                column = array.array(typecode)
+                if column.itemsize != itemsize:
+                    raise ValueError("Column {} was written with a different item size".format(name))
+                column.frombytes(f.read(itemsize*header["rows"]))
+                if sys.byteorder != "little":
+                    column.byteswap()
+                log.data[name] = column
+        return log
+
+##########################################
+#                Recorder                #
+##########################################
+# Plays a battle and records every move into a BattleLog. Use it in place
+# of the battle itself:
+#
+#     recorder = BattleRecorder(battle)
+#     while not recorder.play_next_move()['finished']:
+#         pass
+#     recorder.get_log().save(path)
+#
+class BattleRecorder:
+    def __init__(self, battle):
+        self.battle = battle
+        self.log = BattleLog([
+            (battle.team1.get_name(), [mage.name for mage in battle.team1]),
+            (battle.team2.get_name(), [mage.name for mage in battle.team2])
+        ])
+        self.log.info["seed"] = battle.seed
+        self.mage_ids = dict((mage, i) for i, mage in enumerate(list(battle.team1) + list(battle.team2)))
+
+    def get_log(self):
+        return self.log
+
+    def play_next_move(self):
+        round_number = self.battle.get_round_number()
+        result = self.battle.play_next_move()
+        if not result["finished"]:
+            self.record(result, round_number)
+
+        if self.battle.is_battle_over():
+            self.log.info["rounds"] = self.battle.get_rounds_played()
+            self.log.info["winner"] = self.battle.get_winner()
+        return result
+
+    def record(self, result, round_number):
+        log = self.log
+        spell = result.get("spell")
+        move = {
+            "move"   : log.n_moves,
+            "round"  : round_number,
+            "caster" : self.mage_ids[result["caster"]],
+            "spell"  : log.encode("spell", str(spell.name)) if spell != None else -1,
+            "reason" : log.encode("reason", result.get("reason", "")),
+            "target" : -1
+        }
+        log.n_moves += 1
+
+        effects = result.get("result", [])
+        if len(effects) == 0:
+            log.append_row(move)
+            return
+
+        for effect in effects:
+            row = dict(move)
+            row["target"]             = self.mage_ids.get(effect["target"], -1)
+            row["type"]               = log.encode("type", effect["type"])
+            row["stat"]               = log.encode("stat", effect.get("stat", ""))
+            row["effect"]             = effect.get("effect", 0)
+            row["sustained"]          = effect.get("sustained", 0)
+            row["rebound"]            = effect.get("rebound", 0)
+            row["leech"]              = effect.get("leech", 0)
+            row["critical"]           = effect.get("critical", False)
+            row["evades"]             = effect.get("evades", False)
+            row["super_effective"]    = effect.get("super_effective", False)
+            row["not_very_effective"] = effect.get("not_very_effective", False)
+            log.append_row(row)
@@ -0,0 +1,205 @@
+import os
+from app.models.battle import Battle
+from app.models.magic import SpellBook, Spell
+from app.models.recorder import BattleLog
+from app.models import events
+
+##########################################
+#                 Replay                 #
+##########################################
+# Plays back a recorded BattleLog on a pair of teams. Looks just like a
+# Battle to the views, but no AI code runs: every move is rebuilt from the
+# log and its effects applied to the mages directly. Moves can be skipped
+# forwards and backwards, or played from the start of any round.
+class BattleReplay(Battle):
+    def __init__(self, team1, team2, log):
+        self.team1 = team1
+        self.team2 = team2
+        self.log   = log
+        self.seed  = log.info.get("seed")
+
+        self.team1.reinitialize()
+        self.team2.reinitialize()
+
+        self.mages = list(self.team1) + list(self.team2)
+        recorded = [name for team, mages in log.teams for name in mages]
+        if [mage.name for mage in self.mages] != recorded:
+            raise ValueError("Battle log was recorded with a different roster")
+
+        self.cur_round = None
+        self.max_round = 10
+        self.cur_move  = 0
+        self.round_counter = 0
+
+        events.emit("battle_start", team1=self.team1.get_name(), team2=self.team2.get_name(), seed=self.seed)
+        self.update_round()
+
+    def update_round(self):
+        if self.cur_move < self.log.n_moves:
+            row = self.log.find_move(self.cur_move)
+            round_number = self.log.get_column("round")[row]
+        elif self.team1.is_defeated() or self.team2.is_defeated():
+            round_number = self.round_counter
+        else:
+            # Nobody was knocked out, so the battle ran out of rounds
+            round_number = self.max_round + 1
+
+        if round_number != self.round_counter:
+            self.round_counter = round_number
+            events.emit("round_start", round=self.round_counter)
+
+    def start_new_round(self):
+        return
+
+    def get_move_number(self):
+        return self.cur_move
+
+    def get_rounds_played(self):
+        if self.cur_move == 0:
+            return 0
+        row = self.log.find_move(self.cur_move - 1)
+        return self.log.get_column("round")[row]
+
+    def is_battle_over(self):
+        return self.cur_move >= self.log.n_moves or Battle.is_battle_over(self)
+
+    def play_next_move(self):
+        if not self.is_battle_over():
+            result = self.replay_move(self.cur_move)
+            self.cur_move += 1
+            self.update_round()
+            if self.is_battle_over():
+                events.emit("battle_over", winner=self.get_winner(), rounds=self.get_rounds_played())
+            result["finished"] = False
+            return result
+        return { "finished" : True }
+
+    def get_spell(self, name):
+        if name in SpellBook.spells:
+            return SpellBook.spells[name]
+        return Spell(name, None, None)
+
+    # Rebuilds the move result that Battle.play_next_move() gave when the log
+    # was recorded, applying its effects to the mages along the way
+    def replay_move(self, move):
+        log   = self.log
+        data  = log.data
+        rows  = log.get_move_rows(move)
+        first = rows[0]
+
+        caster = self.mages[data["caster"][first]]
+        spell  = log.decode("spell", data["spell"][first])
+        reason = log.decode("reason", data["reason"][first])
+
+        if reason != "":
+            result = { "success" : False, "caster" : caster, "reason" : reason }
+            if spell != None:
+                result["spell"] = self.get_spell(spell)
+            return result
+
+        result = {
+            "caster"  : caster,
+            "spell"   : self.get_spell(spell),
+            "success" : True,
+            "result"  : []
+        }
+        for row in rows:
+            effect_type = log.decode("type", data["type"][row])
+            if effect_type == "":
+                continue
+
+            target = self.mages[data["target"][row]]
+            if effect_type in ["attack", "rebound", "leech"]:
+                summary = {
+                    "type"               : effect_type,
+                    "super_effective"    : bool(data["super_effective"][row]),
+                    "not_very_effective" : bool(data["not_very_effective"][row]),
+                    "target"             : target,
+                    "evades"             : bool(data["evades"][row])
+                }
+                if summary["evades"]:
+                    summary["sustained"] = 0
+                else:
+                    summary["critical"]  = bool(data["critical"][row])
+                    summary["effect"]    = data["effect"][row]
+                    summary["sustained"] = target.take_damage(data["sustained"][row])
+                    if effect_type == "rebound":
+                        summary["rebound"] = data["rebound"][row]
+                        caster.take_damage(summary["rebound"])
+                    elif effect_type == "leech" and summary["sustained"] > 0:
+                        summary["leech"] = data["leech"][row]
+                        caster.restore_health(summary["leech"])
+            elif effect_type in ["stat_boost", "stat_reduce"]:
+                summary = {
+                    "type"   : effect_type,
+                    "stat"   : log.decode("stat", data["stat"][row]),
+                    "target" : target,
+                    "effect" : data["effect"][row]
+                }
+                # A recorded delta of -1 means the target had fainted, which
+                # it will have done again by now
+                if effect_type == "stat_boost":
+                    target.boost_stat(summary["stat"], max(0, summary["effect"]))
+                else:
+                    target.reduce_stat(summary["stat"], max(0, summary["effect"]))
+            else:
+                summary = {
+                    "type"   : effect_type,
+                    "target" : target,
+                    "effect" : data["effect"][row]
+                }
+                target.restore_health(summary["effect"])
+            result["result"].append(summary)
+        return result
+
+    def reset(self):
+        for mage in self.mages:
+            mage.reset()
+        self.cur_move = 0
+        self.round_counter = 0
+        self.update_round()
+
+    # Jumps to just before the given move. Going backwards replays the log
+    # from the start, which is cheap since no AI code is involved
+    def seek(self, move):
+        move = max(0, min(move, self.log.n_moves))
+
+        sink = events.get_sink()
+        events.set_sink(events.NullSink())
+        try:
+            if move < self.cur_move:
+                self.reset()
+            while self.cur_move < move:
+                self.replay_move(self.cur_move)
+                self.cur_move += 1
+            self.update_round()
+        finally:
+            events.set_sink(sink)
+
+    def fast_forward(self, n_moves):
+        self.seek(self.cur_move + n_moves)
+
+    def rewind(self, n_moves):
+        self.seek(self.cur_move - n_moves)
+
+    def jump_to_round(self, round_number):
+        rounds = self.log.get_column("round")
+        moves  = self.log.get_column("move")
+        for row in range(len(rounds)):
+            if rounds[row] >= round_number:
+                self.seek(moves[row])
+                return
+        self.seek(self.log.n_moves)
+
+# Every log in a directory, keyed by the names of the two teams
+def load_replays(path):
+    replays = {}
+    for file_name in sorted(os.listdir(path)):
+        try:
+            log = BattleLog.load(os.path.join(path, file_name))
+        except Exception as e:
+            print(e)
+            continue
+        key = (log.teams[0][0], log.teams[1][0])
+        replays.setdefault(key, []).append(log)
+    return replays
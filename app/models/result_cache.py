@@ -0,0 +1,137 @@
+import os
+import json
+import hashlib
+import importlib.util
+from collections import OrderedDict
+
+##########################################
+#              Result Cache              #
+##########################################
+# Remembers how seeded battles ended, so that a run which plays the same
+# teams with the same seeds again can skip them:
+#
+#     result_cache.set_cache(result_cache.ResultCache("results.json", magic_path))
+#
+# Teams are known by a fingerprint of their name, the source of every one
+# of their Mage modules and the spell book, so changing a team's scripts
+# (or the spells) only re-runs the matches it plays in. A result is
+# looked up by both teams' fingerprints, the seed, the move scheduler and
+# whatever else the run was played with that changes how battles end
+# (decision budgets, sandboxing and the like), given as settings:
+#
+#     ResultCache("results.json", magic_path, settings={"budget" : 0.5})
+#
+# Modules a Mage module imports itself aren't part of the fingerprint.
+#
+# The cache holds at most max_entries results and forgets the least
+# recently used ones first. It is saved to path when closed, by writing a
+# new file next to it and moving that into place, so an interrupted save
+# leaves the old file as it was.
+
+class ResultCache:
+    def __init__(self, path=None, magic_path=None, max_entries=100000, settings=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.results = OrderedDict()
+        self.fingerprints = {}
+        self.hits = 0
+        self.misses = 0
+
+        # Results are only shared between runs with the same settings
+        settings = json.dumps(settings if settings != None else {}, sort_keys=True)
+        self.settings_hash = hashlib.sha256(settings.encode("utf-8")).hexdigest()
+
+        self.magic_hash = ""
+        if magic_path != None:
+            with open(magic_path, "rb") as f:
+                self.magic_hash = hashlib.sha256(f.read()).hexdigest()
+
+        if path != None and os.path.isfile(path):
+            self.load(path)
+
+    def load(self, path):
+        with open(path) as f:
+            data = json.load(f)
+        # Saved least recently used first
+        for key, summary in data["results"]:
+            self.results[key] = summary
+        self.trim()
+
+    def save(self):
+        if self.path == None:
+            return
+        temp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        try:
+            with open(temp_path, "w") as f:
+                json.dump({"results" : list(self.results.items())}, f)
+            os.replace(temp_path, self.path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def close(self):
+        self.save()
+
+    # Hash of the team's name, scripts and the spell book, or None when a
+    # script's source can't be found
+    def get_fingerprint(self, team):
+        spec = (team.get_name(), tuple(team.modules))
+        if spec not in self.fingerprints:
+            fingerprint = hashlib.sha256()
+            fingerprint.update(self.magic_hash.encode("utf-8"))
+            fingerprint.update(team.get_name().encode("utf-8"))
+            for module in team.modules:
+                try:
+                    with open(importlib.util.find_spec(module).origin, "rb") as f:
+                        source = f.read()
+                except Exception:
+                    fingerprint = None
+                    break
+                fingerprint.update(module.encode("utf-8"))
+                fingerprint.update(hashlib.sha256(source).digest())
+            self.fingerprints[spec] = fingerprint.hexdigest() if fingerprint != None else None
+        return self.fingerprints[spec]
+
+    def get_key(self, team1, team2, seed, scheduler="static"):
+        fingerprint1 = self.get_fingerprint(team1)
+        fingerprint2 = self.get_fingerprint(team2)
+        if seed == None or fingerprint1 == None or fingerprint2 == None:
+            return None
+        return "{}:{}:{}:{}:{}".format(fingerprint1, fingerprint2, seed, scheduler, self.settings_hash)
+
+    # The summary a battle between the teams with this seed ended with, or
+    # None if it hasn't been played yet
+    def get(self, team1, team2, seed, scheduler="static"):
+        key = self.get_key(team1, team2, seed, scheduler)
+        if key == None or key not in self.results:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.results.move_to_end(key)
+        return self.results[key]
+
+    def put(self, team1, team2, seed, scheduler, summary):
+        key = self.get_key(team1, team2, seed, scheduler)
+        if key == None:
+            return
+
+        self.results[key] = summary
+        self.results.move_to_end(key)
+        self.trim()
+
+    # Forgets the least recently used results over max_entries
+    def trim(self):
+        while len(self.results) > self.max_entries:
+            self.results.popitem(last=False)
+
+cache = None
+
+def set_cache(new_cache):
+    global cache
+    if cache != None and cache is not new_cache:
+        cache.close()
+    cache = new_cache
+
+def get_cache():
+    return cache
@@ -0,0 +1,224 @@
+import time
+import importlib
+import multiprocessing
+from app.models import supervisor
+from app.models.snapshot import get_mage
+
+# Memory limits need the resource module, which only exists on Unix
+try:
+    import resource
+except ImportError:
+    resource = None
+
+##########################################
+#              Team Sandbox              #
+##########################################
+# Runs a team's scripts in a long lived process of their own instead of
+# importing them into the game. The team's Mage objects only ever exist in
+# that process. The game gets a RemoteMage stand-in for each of them, which
+# looks like any other Mage to MageManager:
+#
+#     team = build_team(name, modules, sandboxed=True)
+#
+# Every decision sends the public attributes of the mages in the battle
+# over a pipe and gets back the spell and which side or mage was targeted.
+# A script that crashes, eats all the memory or calls exit only takes its
+# own process down. The mage does nothing that turn and the process is
+# started again, with fresh Mage objects, for the next one.
+
+# What a team script gets to see of the other mages in the battle
+shared_attributes = ["id", "side", "name", "element", "health", "max_health", "attack", "defense", "speed", "spells"]
+
+def get_shared_state(mage):
+    return dict((attribute, getattr(mage, attribute, None)) for attribute in shared_attributes)
+
+# Plain stand-in for mages owned by the other process
+class MageView(object):
+    def __init__(self, state):
+        self.__dict__.update(state)
+
+def encode_decision(decision, allies, enemies):
+    if type(decision) is not tuple:
+        return ("nothing", None)
+    if len(decision) < 2:
+        return ("raw", decision)
+    if decision[1] == allies:
+        return ("allies", decision[0])
+    if decision[1] == enemies:
+        return ("enemies", decision[0])
+    if type(decision[1]) is int:
+        return ("id", decision)
+    for i, mage in enumerate(allies + enemies):
+        if mage is decision[1]:
+            return ("mage", (decision[0], i))
+    return ("invalid", decision[0])
+
+def create_mage(modules, slot):
+    return importlib.import_module(modules[slot]).Mage()
+
+def sandbox_worker(connection, modules, memory_limit):
+    if memory_limit != None and resource != None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    # Mage objects by slot, as created for the current battle. The whole
+    # team is created as soon as the process starts, so that after a
+    # restart every ally takes part as itself again, not just the mage
+    # whose turn it is
+    mages = {}
+    for slot in range(len(modules)):
+        try:
+            mages[slot] = create_mage(modules, slot)
+        except Exception:
+            pass
+
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            return
+
+        try:
+            if message[0] == "create":
+                slot = message[1]
+                mages[slot] = create_mage(modules, slot)
+                reply = ("ok", get_shared_state(mages[slot]))
+            else:
+                slot, allies_state, enemies_state = message[1:]
+                if slot not in mages:
+                    mages[slot] = create_mage(modules, slot)
+
+                # Our own mages take part as themselves, with the stats the
+                # game handed over. Everyone else is a stand-in
+                allies = []
+                for state, own_slot in allies_state:
+                    if own_slot != None and own_slot in mages:
+                        mage = mages[own_slot]
+                        for attribute in ["id", "health", "attack", "defense", "speed"]:
+                            setattr(mage, attribute, state[attribute])
+                    else:
+                        mage = MageView(state)
+                    allies.append(mage)
+                enemies = [MageView(state) for state, own_slot in enemies_state]
+
+                start = time.process_time()
+                decision = mages[slot].make_move(allies, enemies)
+                cpu_time = time.process_time() - start
+                reply = ("ok", (encode_decision(decision, allies, enemies), cpu_time))
+        except Exception as e:
+            reply = ("error", str(e))
+
+        try:
+            connection.send(reply)
+        except Exception as e:
+            connection.send(("error", str(e)))
+
+class TeamWorker:
+    def __init__(self, modules, memory_limit=None):
+        self.modules = list(modules)
+        self.memory_limit = memory_limit
+        self.process = None
+        self.connection = None
+
+    def start(self):
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=sandbox_worker, args=(child, self.modules, self.memory_limit))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+
+    def is_running(self):
+        return self.process != None and self.process.is_alive()
+
+    def stop(self):
+        if self.process != None:
+            self.process.terminate()
+            self.process.join()
+            self.connection.close()
+            self.process = None
+            self.connection = None
+
+    # Sends a message and waits up to timeout seconds (forever if None)
+    # for the answer
+    def request(self, message, timeout=None):
+        if not self.is_running():
+            self.start()
+
+        try:
+            self.connection.send(message)
+            if not self.connection.poll(timeout):
+                self.stop()
+                raise supervisor.OverBudget("Team script ran out of time")
+            status, value = self.connection.recv()
+        except (EOFError, OSError):
+            self.stop()
+            raise Exception("Team script crashed")
+
+        if status == "error":
+            raise Exception(value)
+        return value
+
+# Constructor for the mage in one slot of a TeamWorker. Calling it creates
+# a fresh Mage in the worker, just like calling a Mage class would
+class RemoteMageConstructor:
+    def __init__(self, worker, slot):
+        self.worker = worker
+        self.slot = slot
+
+    def __call__(self):
+        return RemoteMage(self.worker, self.slot)
+
+class RemoteMage(object):
+    sandboxed = True
+
+    def __init__(self, worker, slot):
+        self.worker = worker
+        self.slot = slot
+        self.module = worker.modules[slot]
+        self.__dict__.update(worker.request(("create", slot)))
+
+    def get_state(self, mage):
+        # Snapshots of our own team pass on the slot of the RemoteMage
+        own = get_mage(mage)
+        own_slot = own.slot if getattr(own, "worker", None) is self.worker else None
+        return (get_shared_state(mage), own_slot)
+
+    # Same interface as a team script's Mage. deadline and cpu_budget come
+    # from the decision supervisor, when there is one
+    def make_move(self, allies, enemies, deadline=None, cpu_budget=None):
+        try:
+            (kind, value), cpu_time = self.worker.request((
+                "decide",
+                self.slot,
+                [self.get_state(mage) for mage in allies],
+                [self.get_state(mage) for mage in enemies]
+            ), deadline)
+        except supervisor.OverBudget:
+            raise supervisor.OverBudget("{} ran out of time".format(self.name))
+
+        if cpu_budget != None and cpu_time > cpu_budget:
+            raise supervisor.OverBudget("{} used too much processor time".format(self.name))
+
+        if kind == "nothing":
+            return None
+        if kind == "raw" or kind == "id":
+            return value
+        if kind == "allies":
+            return (value, allies)
+        if kind == "enemies":
+            return (value, enemies)
+        if kind == "mage":
+            return (value[0], (allies + enemies)[value[1]])
+        # Targeted something that isn't in the battle
+        return (value, None)
+
+# Every worker started, so that they can all be stopped at the end
+workers = []
+
+def create_worker(modules, memory_limit=None):
+    worker = TeamWorker(modules, memory_limit)
+    workers.append(worker)
+    return worker
+
+def shutdown_workers():
+    for worker in workers:
+        worker.stop()
@@ -0,0 +1,103 @@
+##########################################
+#             Mage Snapshots             #
+##########################################
+# What team scripts get to see of the mages in a battle. A snapshot is a
+# read-only record of one mage's public attributes at the time it was
+# taken. MageManager keeps the current snapshot of its mage and only takes
+# a new one after the mage's health or stats have changed, so most moves
+# reuse the snapshots of every mage they didn't touch.
+#
+# Every snapshot carries the mage's id in the battle and its side (1 for
+# the first team, 2 for the second), which is all it knows about where it
+# came from. Snapshots of the same mage compare equal, and a snapshot
+# handed back as a target is looked up by its id. Scripts can also return
+# the id itself:
+#
+#     return ("Fireball", enemies[0].id)
+#
+# Enemy snapshots hold nothing but those values, so a script can't get at
+# the other team's Mage objects through them. A mage's own team gets
+# AllySnapshots, which also compare equal to the Mage they were taken of
+# (so [ally for ally in allies if ally != self] keeps working) and read
+# any other public attribute from it, like ally.strengths or
+# ally.anticipate(...)
+class MageSnapshot(object):
+    fields = ["id", "side", "name", "element", "health", "max_health", "attack", "defense", "speed", "spells"]
+    __slots__ = fields
+
+    def __init__(self, mage, id=None, side=None):
+        init = object.__setattr__
+        init(self, "id",      id)
+        init(self, "side",    side)
+        init(self, "name",    mage.name)
+        init(self, "element", mage.element)
+        init(self, "health",  mage.health)
+        # Only there for mages whose scripts keep one
+        init(self, "max_health", getattr(mage, "max_health", None))
+        init(self, "attack",  mage.attack)
+        init(self, "defense", mage.defense)
+        init(self, "speed",   mage.speed)
+        init(self, "spells",  tuple(mage.spells))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Mage snapshots are read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError("Mage snapshots are read-only")
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        return isinstance(other, MageSnapshot) and self.id != None and other.id == self.id
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.id)
+
+    # Pickled with the values it was taken with, which may be out of date
+    # by now
+    def __reduce__(self):
+        return (rebuild_snapshot, (type(self), [getattr(self, field) for field in MageSnapshot.fields]))
+
+    def __repr__(self):
+        return "<{} HP: {} ATK: {} DEF: {} SPD: {}>".format(self.name, self.health, self.attack, self.defense, self.speed)
+
+# Snapshot handed to a mage's own team. The snapshot fields are the values
+# at the time it was taken, other attributes are read from the Mage itself.
+# Names starting with an underscore are left alone
+class AllySnapshot(MageSnapshot):
+    __slots__ = ["_mage"]
+
+    def __init__(self, mage, id=None, side=None):
+        MageSnapshot.__init__(self, mage, id, side)
+        object.__setattr__(self, "_mage", mage)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._mage, name)
+
+    def __eq__(self, other):
+        return other is self._mage or MageSnapshot.__eq__(self, other)
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __reduce__(self):
+        return (rebuild_snapshot, (type(self), [getattr(self, field) for field in MageSnapshot.fields], self._mage))
+
+def rebuild_snapshot(snapshot_class, values, mage=None):
+    snapshot = snapshot_class.__new__(snapshot_class)
+    for field, value in zip(MageSnapshot.fields, values):
+        object.__setattr__(snapshot, field, value)
+    if mage != None:
+        object.__setattr__(snapshot, "_mage", mage)
+    return snapshot
+
+# The Mage an ally snapshot was taken of, or whatever else was passed in
+def get_mage(mage):
+    if isinstance(mage, AllySnapshot):
+        return mage._mage
+    return mage
@@ -0,0 +1,226 @@
+import io
+import time
+import pickle
+import multiprocessing
+from app.models.snapshot import get_mage
+
+##########################################
+#          Decision Supervisor           #
+##########################################
+# Keeps slow or stuck team scripts from holding up a battle. While a
+# supervisor is installed every AI decision goes through it:
+#
+#     supervisor.set_supervisor(supervisor.DecisionSupervisor(time_budget=0.5))
+#
+# With a budget, decisions run in a separate worker process. The mages go
+# over as a pickle, the AI makes its choice there, and the choice comes back
+# together with whatever the AI remembered on its own Mage object. A
+# decision that takes longer than time_budget seconds gets the worker killed
+# (and restarted for the next decision). One that took more than cpu_budget
+# seconds of processor time is thrown away. Either way the mage does nothing
+# that turn.
+#
+# Without a budget decisions run in this process as usual, just timed.
+# Mages that can't be pickled also run in this process. Sandboxed mages
+# (see sandbox.py) already live in a process of their own, so they are
+# just given the deadline.
+
+class OverBudget(Exception):
+    pass
+
+class LatencyStats:
+    def __init__(self, name):
+        self.name        = name
+        self.decisions   = 0
+        self.total_time  = 0.0
+        self.max_time    = 0.0
+        self.over_budget = 0
+        self.errors      = 0
+
+    def record(self, elapsed):
+        self.decisions += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+    def get_mean_time(self):
+        return self.total_time/max(1, self.decisions)
+
+    def __str__(self):
+        return "{}: {} decisions | mean {:.3f} ms | max {:.3f} ms | {} over budget | {} errors".format(
+            self.name,
+            self.decisions,
+            1000*self.get_mean_time(),
+            1000*self.max_time,
+            self.over_budget,
+            self.errors
+        )
+
+# Pickles a decision and the deciding mage's attributes. The mages the
+# decision was made about are sent as their position in a list both sides
+# build the same way, so the other side gets its own objects back rather
+# than copies
+class MageReferencePickler(pickle.Pickler):
+    def __init__(self, file, mages):
+        pickle.Pickler.__init__(self, file)
+        self.mage_ids = dict((id(mage), i) for i, mage in enumerate(mages))
+
+    def persistent_id(self, obj):
+        return self.mage_ids.get(id(obj))
+
+class MageReferenceUnpickler(pickle.Unpickler):
+    def __init__(self, file, mages):
+        pickle.Unpickler.__init__(self, file)
+        self.mages = mages
+
+    def persistent_load(self, index):
+        return self.mages[index]
+
+# Everything that goes back as a reference: the snapshots, the Mages the
+# ally snapshots were taken of and the deciding mage
+def get_references(mage, allies, enemies):
+    return allies + enemies + [get_mage(snapshot) for snapshot in allies] + [mage]
+
+def dump_with_references(obj, mages):
+    data = io.BytesIO()
+    MageReferencePickler(data, mages).dump(obj)
+    return data.getvalue()
+
+def load_with_references(data, mages):
+    return MageReferenceUnpickler(io.BytesIO(data), mages).load()
+
+def decision_worker(connection):
+    while True:
+        try:
+            mage, allies, enemies = pickle.loads(connection.recv_bytes())
+        except EOFError:
+            return
+
+        # The mage travels in the same pickle as the snapshots, so it is
+        # still the Mage they were taken of
+        start = time.process_time()
+        try:
+            decision = mage.make_move(allies, enemies)
+            outcome = ("decision", decision)
+        except Exception as e:
+            outcome = ("error", str(e))
+        cpu_time = time.process_time() - start
+
+        try:
+            reply = dump_with_references((outcome, cpu_time, mage.__dict__), get_references(mage, allies, enemies))
+        except Exception as e:
+            reply = dump_with_references((("error", str(e)), cpu_time, None), get_references(mage, allies, enemies))
+        connection.send_bytes(reply)
+
+class DecisionSupervisor:
+    # Decisions are given this many times the CPU budget in wall time
+    # before the worker is killed, when no time budget is set
+    cpu_grace = 4
+
+    def __init__(self, time_budget=None, cpu_budget=None):
+        self.time_budget = time_budget
+        self.cpu_budget  = cpu_budget
+        self.stats       = {}
+        self.process     = None
+        self.connection  = None
+
+    def is_supervised(self):
+        return self.time_budget != None or self.cpu_budget != None
+
+    def get_deadline(self):
+        if self.time_budget != None:
+            return self.time_budget
+        return self.cpu_budget*DecisionSupervisor.cpu_grace
+
+    # Stats are kept per team script, since names can clash between teams
+    def get_stats(self, mage=None):
+        if mage == None:
+            return self.stats
+        key = getattr(mage, "module", type(mage).__module__) + "." + str(mage.name)
+        if key not in self.stats:
+            self.stats[key] = LatencyStats(key)
+        return self.stats[key]
+
+    def start_worker(self):
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=decision_worker, args=(child,))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+
+    def stop_worker(self):
+        if self.process != None:
+            self.process.terminate()
+            self.process.join()
+            self.connection.close()
+            self.process = None
+            self.connection = None
+
+    def shutdown(self):
+        self.stop_worker()
+
+    # Asks mage (a team script's Mage) for its decision.
+    # Raises OverBudget if it took too long, or whatever the AI raised
+    def decide(self, mage, allies, enemies):
+        stats = self.get_stats(mage)
+        start = time.perf_counter()
+        try:
+            if getattr(mage, "sandboxed", False):
+                # Already in a process of its own, which can enforce the budget
+                decision = mage.make_move(allies, enemies, self.get_deadline() if self.is_supervised() else None, self.cpu_budget)
+            elif self.is_supervised():
+                decision = self.decide_in_worker(mage, allies, enemies)
+            else:
+                decision = mage.make_move(allies, enemies)
+        except OverBudget:
+            stats.over_budget += 1
+            raise
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.record(time.perf_counter() - start)
+        return decision
+
+    def decide_in_worker(self, mage, allies, enemies):
+        try:
+            request = pickle.dumps((mage, allies, enemies))
+        except Exception:
+            return mage.make_move(allies, enemies)
+
+        if self.process == None or not self.process.is_alive():
+            self.start_worker()
+
+        try:
+            self.connection.send_bytes(request)
+            ready = self.connection.poll(self.get_deadline())
+            if ready:
+                reply = self.connection.recv_bytes()
+        except (EOFError, OSError):
+            # The script took the worker down with it
+            self.stop_worker()
+            raise OverBudget("{} stopped the decision worker".format(mage.name))
+
+        if not ready:
+            self.stop_worker()
+            raise OverBudget("{} ran out of time".format(mage.name))
+
+        (kind, value), cpu_time, attributes = load_with_references(reply, get_references(mage, allies, enemies))
+        if attributes != None:
+            mage.__dict__.update(attributes)
+
+        if self.cpu_budget != None and cpu_time > self.cpu_budget:
+            raise OverBudget("{} used too much processor time".format(mage.name))
+        if kind == "error":
+            raise Exception(value)
+        return value
+
+supervisor = None
+
+def set_supervisor(new_supervisor):
+    global supervisor
+    if supervisor != None and supervisor is not new_supervisor:
+        supervisor.shutdown()
+    supervisor = new_supervisor
+
+def get_supervisor():
+    return supervisor
@@ -1,28 +1,128 @@
+import copy
 import json
 import importlib
+from collections import OrderedDict
 from app.models.mage_manager import MageManager
+from app.models.team_state import TeamState, CompactMageManager
+from app.models import sandbox
 
+# Values a Mage can start out with and be put back to without copying them
+immutable_types = (type(None), bool, int, float, complex, str, bytes)
+
+def is_immutable(value):
+    if type(value) in (tuple, frozenset):
+        return all(is_immutable(item) for item in value)
+    return type(value) in immutable_types
+
+# How to copy a starting value back for a new battle. Values that can't be
+# changed are shared, lists, dicts and sets of them get a shallow copy and
+# anything else is deep copied
+def get_copier(value):
+    if is_immutable(value):
+        return None
+    if type(value) in (list, set):
+        if all(is_immutable(item) for item in value):
+            return type(value)
+    elif type(value) == dict:
+        if all(is_immutable(key) and is_immutable(item) for key, item in value.items()):
+            return dict
+    return copy.deepcopy
+
+##########################################
+#                  Team                  #
+##########################################
+# A team's mages are only constructed once. Their starting state is saved
+# at that point and every later battle puts it back, instead of running
+# the Mage and MageManager constructors again. AIs that need a brand new
+# Mage object for every battle can ask for one:
+#
+#     class Mage:
+#         fresh_instance = True
+#
+# Sandboxed mages always get a fresh instance, since their state lives in
+# another process.
 class Team(list):
-    def __init__(self, team_name, team_members):
+    def __init__(self, team_name, team_members, modules=None, compact=False):
         self.team_name = team_name
         self.constructors = team_members
+        # Module paths the constructors came from, so that the team can be
+        # rebuilt in another process
+        self.modules = modules if modules != None else []
+        # Compact teams keep their mages' stats in a TeamState
+        self.compact = compact
+        self.state = None
         self.initialize_team_members()
 
     def initialize_team_members(self):
+        if self.compact:
+            self.state = TeamState(len(self.constructors))
+
+        # The constructor and saved starting state of every mage on the team
+        self.member_constructors = []
+        self.initial_states = []
         for mage in self.constructors:
             try:
-                manager = MageManager(mage())
-                self.append(manager)
+                self.append(self.create_member(mage, len(self)))
+                self.member_constructors.append(mage)
+                self.initial_states.append(self.capture(self[-1].mage))
             except Exception as e:
                 print(e)
 
+    def create_member(self, constructor, slot):
+        if self.compact:
+            return CompactMageManager(constructor(), self.state, slot)
+        return MageManager(constructor())
+
+    # Saves the attributes a Mage starts out with, or returns None if it
+    # has to be constructed again every battle. The state is the attributes
+    # that can be shared as they are, and (name, value, copier) for the
+    # ones that have to be copied
+    def capture(self, mage):
+        if getattr(mage, "fresh_instance", False) or getattr(mage, "sandboxed", False):
+            return None
+        if not hasattr(mage, "__dict__"):
+            return None
+
+        shared = {}
+        copied = []
+        try:
+            for name, value in mage.__dict__.items():
+                copier = get_copier(value)
+                if copier == None:
+                    shared[name] = value
+                else:
+                    copied.append((name, copier(value), copier))
+        except Exception:
+            return None
+        return (shared, copied)
+
+    def restore(self, mage, initial_state):
+        shared, copied = initial_state
+        attributes = mage.__dict__
+        attributes.clear()
+        attributes.update(shared)
+        for name, value, copier in copied:
+            attributes[name] = copier(value)
+
+    # Puts every mage back the way it started. Takes O(team size) and only
+    # calls constructors for mages that asked to be constructed again
     def reinitialize(self):
-        self[:] = []
-        self.initialize_team_members()
+        for slot, manager in enumerate(self):
+            initial_state = self.initial_states[slot]
+            if initial_state == None:
+                try:
+                    self[slot] = self.create_member(self.member_constructors[slot], slot)
+                except Exception as e:
+                    print(e)
+                    manager.reset()
+            else:
+                self.restore(manager.mage, initial_state)
+                manager.reset()
 
     def is_defeated(self):
-        teamhp = sum(int(mage.cur_hp) for mage in self)
-        return teamhp == 0
+        if self.state != None:
+            return self.state.is_defeated()
+        return not any(int(mage.cur_hp) for mage in self)
 
     def get_short_name(self):
         if len(self.team_name)> 32:
@@ -41,18 +141,35 @@ class Team(list):
 
         return text
 
-def load_teams(path):
+def load_team_specs(path):
     json_data=open(path).read()
-    json_data = json.loads(json_data)
+    json_data = json.loads(json_data, object_pairs_hook=OrderedDict)
 
-    teams = {}
-    for team in json_data:
-        teams[team] = []
-        for mage in json_data[team]:
-            try:
-                i = importlib.import_module(mage)
-                teams[team].append(i.Mage)
-            except Exception as e:
-                print(e)
+    return [(team, json_data[team]) for team in json_data]
+
+# Teams listing more than max_size mages only field the first max_size
+def build_team(team_name, modules, compact=False, sandboxed=False, memory_limit=None, max_size=None):
+    if max_size != None and len(modules) > max_size:
+        print("{} has {} mages, only the first {} will fight".format(team_name, len(modules), max_size))
+        modules = modules[:max_size]
+
+    # Sandboxed teams run their scripts in a worker process of their own
+    if sandboxed:
+        worker = sandbox.create_worker(modules, memory_limit)
+        constructors = [sandbox.RemoteMageConstructor(worker, slot) for slot in range(len(modules))]
+        return Team(team_name, constructors, list(modules), compact)
+
+    constructors = []
+    loaded = []
+    for mage in modules:
+        try:
+            i = importlib.import_module(mage)
+            constructors.append(i.Mage)
+            loaded.append(mage)
+        except Exception as e:
+            print(e)
+
+    return Team(team_name, constructors, loaded, compact)
 
-    return [Team(team, teams[team]) for team in teams]
+def load_teams(path, compact=False, sandboxed=False, memory_limit=None, max_size=None):
+    return [build_team(team, modules, compact, sandboxed, memory_limit, max_size) for team, modules in load_team_specs(path)]
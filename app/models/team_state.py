@@ -0,0 +1,124 @@
+import array
+from app.models.mage_manager import MageManager
+
+##########################################
+#           Compact Team State           #
+##########################################
+# Keeps the battle state of a whole team in a handful of preallocated
+# arrays, one slot per mage, instead of in per-mage dictionaries:
+#
+#     cur_hp, max_hp           one entry per mage
+#     stats, modifiers         three entries per mage (attack, defense, speed)
+#     elements                 element id per mage
+#
+# CompactMageManager is a thin view over one slot, so the rest of the game
+# can keep treating it like any other MageManager.
+class TeamState:
+    stat_names = ['attack', 'defense', 'speed']
+    stat_index = dict((stat, i) for i, stat in enumerate(stat_names))
+
+    def __init__(self, size):
+        self.size      = size
+        self.cur_hp    = array.array('i', [0]*size)
+        self.max_hp    = array.array('i', [0]*size)
+        self.stats     = array.array('i', [0]*(3*size))
+        self.modifiers = array.array('b', [0]*(3*size))
+        self.elements  = array.array('b', [0]*size)
+
+    def is_defeated(self):
+        return not any(self.cur_hp)
+
+    def get_remaining_health_percentage(self, slot):
+        return float(self.cur_hp[slot])/max(self.max_hp[slot], 1)
+
+    def get_stat(self, slot, stat):
+        i = 3*slot + TeamState.stat_index[stat]
+        return int(self.stats[i] * MageManager.modifier_multipliers[self.modifiers[i]])
+
+# Dictionary-like window onto the three stat entries of one mage in one of
+# the TeamState arrays, standing in for MageManager's stat dictionaries
+class StatView(object):
+    __slots__ = ['values', 'offset']
+
+    def __init__(self, values, offset):
+        self.values = values
+        self.offset = offset
+
+    def __getitem__(self, stat):
+        return self.values[self.offset + TeamState.stat_index[stat]]
+
+    def __setitem__(self, stat, value):
+        self.values[self.offset + TeamState.stat_index[stat]] = value
+
+    def __iter__(self):
+        return iter(TeamState.stat_names)
+
+    def __len__(self):
+        return len(TeamState.stat_names)
+
+    def __contains__(self, stat):
+        return stat in TeamState.stat_index
+
+    def keys(self):
+        return list(TeamState.stat_names)
+
+    def items(self):
+        return [(stat, self[stat]) for stat in TeamState.stat_names]
+
+    def update(self, values):
+        for stat in values:
+            self[stat] = values[stat]
+
+class CompactMageManager(MageManager):
+    def __init__(self, mage, state, slot):
+        self.state  = state
+        self.slot   = slot
+        self.offset = 3*slot
+        MageManager.__init__(self, mage)
+        state.elements[slot] = self.element.id
+
+    # MageManager's attributes, redirected into the team's arrays
+    def get_cur_hp(self):
+        return self.state.cur_hp[self.slot]
+
+    def set_cur_hp(self, value):
+        self.state.cur_hp[self.slot] = value
+
+    def get_max_hp(self):
+        return self.state.max_hp[self.slot]
+
+    def set_max_hp(self, value):
+        self.state.max_hp[self.slot] = value
+
+    def get_base_stats(self):
+        return StatView(self.state.stats, self.offset)
+
+    def set_base_stats(self, stats):
+        StatView(self.state.stats, self.offset).update(stats)
+
+    def get_stat_modifiers(self):
+        return StatView(self.state.modifiers, self.offset)
+
+    def set_stat_modifiers(self, modifiers):
+        StatView(self.state.modifiers, self.offset).update(modifiers)
+
+    cur_hp         = property(get_cur_hp, set_cur_hp)
+    max_hp         = property(get_max_hp, set_max_hp)
+    base_stats     = property(get_base_stats, set_base_stats)
+    stat_modifiers = property(get_stat_modifiers, set_stat_modifiers)
+
+    def get_base_stat(self, stat):
+        return self.state.stats[self.offset + TeamState.stat_index[stat]]
+
+    def get_stat_modifier(self, stat):
+        return self.state.modifiers[self.offset + TeamState.stat_index[stat]]
+
+    def get_stat(self, stat):
+        i = self.offset + TeamState.stat_index[stat]
+        return int(self.state.stats[i] * MageManager.modifier_multipliers[self.state.modifiers[i]])
+
+    def get_remaining_health_percentage(self):
+        return self.state.get_remaining_health_percentage(self.slot)
+
+    def is_conscious(self):
+        return self.state.cur_hp[self.slot] > 0
@@ -0,0 +1,190 @@
+import gc
+import os
+import sys
+import random
+from concurrent.futures import ProcessPoolExecutor
+from app.models.magic import SpellBook
+from app.models.battle import Battle
+from app.models import events
+from app.models import team
+from app.models import ratings
+from app.models import result_cache
+
+##########################################
+#            Worker processes            #
+##########################################
+# Teams rebuilt in this process, keyed by (team name, module paths)
+worker_teams = {}
+worker_options = { "compact" : False, "scheduler" : "static" }
+
+def initialize_worker(magic_path, verbose=False, compact=False, compiled=False, scheduler="static"):
+    worker_options["compact"] = compact
+    worker_options["scheduler"] = scheduler
+
+    # Workers started with spawn don't inherit the spell book
+    if len(SpellBook.spells) == 0:
+        SpellBook.load_spell_book(magic_path)
+    SpellBook.set_compiled(compiled)
+
+    if not verbose:
+        events.set_sink(events.NullSink())
+        sys.stdout = open(os.devnull, "w")
+
+def get_worker_team(spec):
+    if spec not in worker_teams:
+        worker_teams[spec] = team.build_team(spec[0], spec[1], worker_options["compact"])
+    return worker_teams[spec]
+
+def play_match(task):
+    index, spec1, spec2, seed = task
+
+    battle = Battle(get_worker_team(spec1), get_worker_team(spec2), seed, worker_options["scheduler"])
+    result = battle.play_next_move()
+    while not result['finished']:
+        result = battle.play_next_move()
+
+    return {
+        "index"  : index,
+        "seed"   : seed,
+        "teams"  : (spec1[0], spec2[0]),
+        "winner" : battle.get_winner(),
+        "winning_side" : battle.get_winning_side(),
+        "rounds" : battle.get_rounds_played(),
+        "health" : [
+            [(mage.get_short_name(), mage.cur_hp, mage.max_hp) for mage in battle.team1],
+            [(mage.get_short_name(), mage.cur_hp, mage.max_hp) for mage in battle.team2]
+        ]
+    }
+
+##########################################
+#                Executor                #
+##########################################
+# Whatever is loaded when the workers are forked, the spell book above
+# all, is shared with them copy-on-write. Moving it out of the garbage
+# collector's reach keeps collections in the workers from touching, and
+# so copying, every page it lives on. The parent gets it all back as soon
+# as the workers exist, so that teams and leagues made before the pool
+# can still be collected
+def freeze_for_fork():
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+
+def unfreeze_after_fork():
+    if hasattr(gc, "unfreeze"):
+        gc.unfreeze()
+
+# A pool of workers that are all forked straight away, while the objects
+# they share are frozen
+def create_pool(workers, initargs):
+    freeze_for_fork()
+    try:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=initialize_worker, initargs=initargs)
+        # Forked pools start every worker with their first task
+        executor.submit(int).result()
+    finally:
+        unfreeze_after_fork()
+    return executor
+
+class TournamentRunner:
+    def __init__(self, league, magic_path, workers=None, replays=1, seed=None, chunk_size=None, verbose=False, compact=False, compiled=False):
+        self.league = league
+        self.magic_path = magic_path
+        self.workers = workers if workers != None else os.cpu_count()
+        self.replays = max(1, replays)
+        self.rng = random.Random(seed)
+        self.chunk_size = chunk_size
+        self.verbose = verbose
+        self.compact = compact
+        self.compiled = compiled
+        self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def get_executor(self):
+        if self.executor == None:
+            self.executor = create_pool(self.workers, (self.magic_path, self.verbose, self.compact, self.compiled, self.league.scheduler))
+        return self.executor
+
+    def shutdown(self):
+        if self.executor != None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def build_tasks(self):
+        # Seeds are drawn in match order so a given (seed, schedule) always
+        # hands the same seed to the same replay
+        tasks = []
+        for team1, team2 in self.league.get_pending_matches():
+            spec1 = (team1.get_name(), tuple(team1.modules))
+            spec2 = (team2.get_name(), tuple(team2.modules))
+            for i in range(self.replays):
+                tasks.append((len(tasks), spec1, spec2, self.rng.getrandbits(32)))
+        return tasks
+
+    # Plays every remaining match in the league's schedule and merges the
+    # results back into its scores in schedule order. The matches pending
+    # at any one time are played all at once. Swiss leagues only pair their
+    # next round once the last one is over, so they go round by round
+    def run(self):
+        results = []
+        self.league.set_games_per_match(self.replays)
+        while not self.league.finished():
+            matches = self.league.get_pending_matches()
+            n_matches = len(matches)
+            tasks = self.build_tasks()
+
+            # Matches already in the result cache aren't played again. They
+            # were rated when they were played, so they aren't rated again
+            cache = result_cache.get_cache()
+            batch = []
+            if cache != None:
+                to_play = []
+                for task in tasks:
+                    team1, team2 = matches[task[0]//self.replays]
+                    summary = cache.get(team1, team2, task[3], self.league.scheduler)
+                    if summary != None:
+                        batch.append(dict(summary, index=task[0], seed=task[3], cached=True))
+                    else:
+                        to_play.append(task)
+                tasks = to_play
+
+            if len(tasks) > 0:
+                chunk_size = self.chunk_size
+                if chunk_size == None:
+                    chunk_size = max(1, len(tasks)//(self.workers*4))
+
+                played = list(self.get_executor().map(play_match, tasks, chunksize=chunk_size))
+                if cache != None:
+                    for result in played:
+                        team1, team2 = matches[result["index"]//self.replays]
+                        summary = dict((key, value) for key, value in result.items() if key not in ["index", "seed"])
+                        cache.put(team1, team2, result["seed"], self.league.scheduler, summary)
+                batch += played
+            batch.sort(key=lambda result: result["index"])
+
+            self.league.current_match += n_matches
+            for result in batch:
+                self.league.record_winner(result["winner"])
+                if ratings.get_ratings() != None and not result.get("cached", False):
+                    team1, team2 = matches[result["index"]//self.replays]
+                    ratings.get_ratings().record_match(team1, team2, result["winning_side"])
+            for i in range(n_matches):
+                self.league.match_over()
+
+            results += batch
+
+        return results
+
+    # Keeps playing until the league has picked its winners, including any
+    # matches between tied teams
+    def run_league(self, max_tiebreaks=10):
+        results = self.run()
+        tiebreaks = 0
+        while not self.league.winners_chosen() and tiebreaks < max_tiebreaks:
+            results += self.run()
+            tiebreaks += 1
+        return results
@@ -1,34 +1,109 @@
 import pygame
-import os
 from app.resources.directories import IMAGE_DIR
+from app.resources.loader import AssetLoader
 
+# Images are read from disk the first time they are used, or ahead of time
+# on a background thread when a view knows what it is going to need:
+#
+#     ImageManager().prefetch(['battle_stage', 'fire_mage'])
+#
+# Once the display is set up, images are handed out converted to its pixel
+# format, so that blitting them doesn't convert every pixel every frame.
+# The converted copies are made on first use and have to be thrown away
+# with invalidate() whenever the display mode changes.
+#
+# Sprite sheets are cut into tiles the first time a tile is asked for.
+# Tiles are subsurfaces sharing the sheet's pixels, and get_tile hands out
+# the same ones every time, so they must only ever be blitted from.
 class ImageManager:
 
     class __ImageManager:
         def __init__(self):
-            self.images = {}
+            self.images = AssetLoader(IMAGE_DIR, pygame.image.load)
+            self.converted = {}
+            # Image name -> {(x, y) : tile}
+            self.tiles = {}
 
-            image_files = os.listdir(IMAGE_DIR)
-
-            for image_name in image_files:
-                self.images[os.path.splitext(image_name)[0]] = pygame.image.load(os.path.join(IMAGE_DIR, image_name))
+            # Tiles handed out from the cache instead of being cut out
+            # again, in the last frame and so far in this one
+            self.tiles_reused = 0
+            self.tiles_reused_last_frame = 0
 
             self.tile_size = 100
 
+        def prefetch(self, image_names):
+            self.images.prefetch(image_names)
+
+        # Call after every pygame.display.set_mode
+        def invalidate(self):
+            self.converted = {}
+            self.tiles = {}
+
+        # Call once a frame
+        def end_frame(self):
+            self.tiles_reused_last_frame = self.tiles_reused
+            self.tiles_reused = 0
+
+        # Surface allocations get_tile saved in the last frame. Walton shows it
+        # with the show_frame_stats setting
+        def get_allocations_avoided(self):
+            return self.tiles_reused_last_frame
+
+        # The image in the display's pixel format, or as loaded if there is
+        # no display yet
+        def get_surface(self, image_name):
+            if image_name in self.converted:
+                return self.converted[image_name]
+
+            surface = self.images.get(image_name)
+            if pygame.display.get_surface() == None:
+                return surface
+
+            if surface.get_flags() & pygame.SRCALPHA or surface.get_colorkey() != None:
+                surface = surface.convert_alpha()
+            else:
+                surface = surface.convert()
+            self.converted[image_name] = surface
+            return surface
+
         def get_image(self, image_name):
             if image_name not in self.images:
                 s = pygame.Surface((self.tile_size,self.tile_size))
                 s.fill((0,0,0))
                 return s
-            return self.images[image_name]
+            return self.get_surface(image_name)
+
+        def slice_tiles(self, image_name):
+            surface = self.get_surface(image_name)
+            tiles = {}
+            for y in range(surface.get_height()//self.tile_size):
+                for x in range(surface.get_width()//self.tile_size):
+                    tiles[(x, y)] = surface.subsurface((x*self.tile_size, y*self.tile_size, self.tile_size, self.tile_size))
+            self.tiles[image_name] = tiles
+            return tiles
 
+        # The same tile surface is handed out on every call, and tiles inside
+        # the sheet are subsurfaces of the converted sheet itself. Drawing
+        # on one would change the sheet and every sprite using it, so copy
+        # a tile before changing it
         def get_tile(self, image_name, clip_x, clip_y):
             if image_name not in self.images:
                 s = pygame.Surface((self.tile_size,self.tile_size))
                 s.fill((0,0,0))
                 return s
 
-            surface = self.images[image_name]
+            tiles = self.tiles.get(image_name)
+            if tiles == None:
+                tiles = self.slice_tiles(image_name)
+
+            tile = tiles.get((clip_x, clip_y))
+            if tile != None:
+                self.tiles_reused += 1
+                return tile
+
+            # Tiles hanging off the edge of the sheet are padded out with
+            # transparency, and cached as well
+            surface = self.get_surface(image_name)
 
             rect = pygame.Rect(
                 (
@@ -42,6 +117,7 @@ class ImageManager:
             image.fill((0,0,0,0))
 
             image.blit(surface, (0, 0), rect)
+            tiles[(clip_x, clip_y)] = image
             return image
 
     instance = None
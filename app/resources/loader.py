@@ -0,0 +1,68 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Loads the files in a directory on demand, keyed by file name without the
+# extension. An asset is read the first time it is asked for, unless
+# prefetch() already started loading it on one of the background threads,
+# in which case get() waits for that instead of loading it twice.
+class AssetLoader:
+    def __init__(self, directory, load, workers=2):
+        self.paths = dict((os.path.splitext(file_name)[0], os.path.join(directory, file_name)) for file_name in os.listdir(directory))
+        self.load_file = load
+        self.workers = workers
+        self.assets = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def __contains__(self, name):
+        return name in self.paths
+
+    def get_names(self):
+        return list(self.paths)
+
+    def is_loaded(self, name):
+        return name in self.assets
+
+    # The asset, loading it if need be. None if there is no such file
+    def get(self, name):
+        if name in self.assets:
+            return self.assets[name]
+        if name not in self.paths:
+            return None
+
+        with self.lock:
+            future = self.pending.get(name)
+        if future != None:
+            return future.result()
+        return self.load(name)
+
+    def load(self, name):
+        asset = self.load_file(self.paths[name])
+        self.assets[name] = asset
+        return asset
+
+    def load_pending(self, name):
+        try:
+            return self.load(name)
+        finally:
+            with self.lock:
+                del self.pending[name]
+
+    # Starts loading the named assets in the background
+    def prefetch(self, names):
+        with self.lock:
+            for name in names:
+                if name in self.paths and name not in self.assets and name not in self.pending:
+                    if self.executor == None:
+                        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+                    self.pending[name] = self.executor.submit(self.load_pending, name)
+
+    def prefetch_all(self):
+        self.prefetch(list(self.paths))
+
+    def shutdown(self):
+        if self.executor != None:
+            self.executor.shutdown()
+            self.executor = None
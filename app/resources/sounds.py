@@ -1,14 +1,16 @@
 import pygame
-import os
 from app.resources.directories import SOUND_DIR
+from app.resources.loader import AssetLoader
 
+# Sounds are decoded the first time they are played, or ahead of time on a
+# background thread (see prefetch)
 class SoundManager:
 
     class __SoundManager:
         def __init__(self, settings):
-            self.sounds = {}
-
-            sound_files = os.listdir(SOUND_DIR)
+            self.loader = AssetLoader(SOUND_DIR, self.load_sound)
+            # Every sound decoded so far
+            self.sounds = self.loader.assets
 
             if settings == None:
                 self.settings = {
@@ -24,10 +26,6 @@ class SoundManager:
             self.volume  = self.settings['sound']['sound_volume']
             self.enabled = self.settings['sound']['sound_enabled']
 
-            for sound_name in sound_files:
-                self.sounds[os.path.splitext(sound_name)[0]] = pygame.mixer.Sound(os.path.join(SOUND_DIR, sound_name))
-                self.sounds[os.path.splitext(sound_name)[0]].set_volume(self.volume)
-
             self.sound_effects = {
                 'menu_move'       : 'menu_move',
                 'menu_click'      : 'menu_click',
@@ -76,20 +74,28 @@ class SoundManager:
                 'nope'            : 'nope',
             }
 
+        def load_sound(self, path):
+            sound = pygame.mixer.Sound(path)
+            sound.set_volume(self.volume)
+            return sound
+
+        def prefetch(self, sound_names):
+            self.loader.prefetch(sound_names)
+
         def play_sound(self, sound_name):
             if not self.enabled:
                 return
 
-            if sound_name not in self.sounds:
+            if sound_name not in self.loader:
                 print("Failed to load sound \"{}\"".format(sound_name))
                 return
 
-            self.sounds[sound_name].play()
+            self.loader.get(sound_name).play()
 
         def set_volume(self, volume):
             self.volume = volume
-            for sound in self.sounds:
-                self.sounds[sound].set_volume(volume)
+            for sound in list(self.sounds.values()):
+                sound.set_volume(volume)
 
         def set_enabled(self, enabled):
             self.enabled = enabled
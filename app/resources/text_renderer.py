@@ -3,41 +3,57 @@ import os
 from app.resources.directories import FONT_ALEX_BRUSH
 from app.resources import colours
 
-pygame.font.init()
-title_font = pygame.font.Font(FONT_ALEX_BRUSH, 84)
-cursive_small = pygame.font.Font(FONT_ALEX_BRUSH, 48)
-menu_item_font = pygame.font.SysFont('serif', 32)
-huge_font = pygame.font.SysFont('serif', 64)
-large_font = pygame.font.SysFont('serif', 48)
-regular_font = pygame.font.SysFont('serif', 24)
-small_font = pygame.font.SysFont('serif', 18)
-
+# Fonts are opened the first time they are used rather than at import time
+# so that importing this module doesn't drag in pygame's font subsystem
+font_specs = {
+    'title'         : (FONT_ALEX_BRUSH, 84, False),
+    'cursive_small' : (FONT_ALEX_BRUSH, 48, False),
+    'menu_item'     : ('serif', 32, True),
+    'huge'          : ('serif', 64, True),
+    'large'         : ('serif', 48, True),
+    'regular'       : ('serif', 24, True),
+    'small'         : ('serif', 18, True)
+}
+fonts = {}
+
+def get_font(font_name):
+    if font_name not in fonts:
+        if not pygame.font.get_init():
+            pygame.font.init()
+
+        name, size, system_font = font_specs[font_name]
+        if system_font:
+            fonts[font_name] = pygame.font.SysFont(name, size)
+        else:
+            fonts[font_name] = pygame.font.Font(name, size)
+    return fonts[font_name]
 
 def render_title(text, colour = colours.COLOUR_AMLSERVINYOUR):
-    return title_font.render(text, 1, colour)
+    return get_font('title').render(text, 1, colour)
 
 def render_menu_item(text, colour = colours.COLOUR_AMLSERVINYOUR):
-    return menu_item_font.render(text, 1, colour)
+    return get_font('menu_item').render(text, 1, colour)
 
 def render_huge_text(text, colour = colours.COLOUR_AMLSERVINYOUR):
-    return huge_font.render(text, 1, colour)
+    return get_font('huge').render(text, 1, colour)
 
 def render_large_text(text, colour = colours.COLOUR_AMLSERVINYOUR):
-    return large_font.render(text, 1, colour)
+    return get_font('large').render(text, 1, colour)
 
 def render_text(text, colour = colours.COLOUR_AMLSERVINYOUR ):
-    return regular_font.render(text, 1, colour)
+    return get_font('regular').render(text, 1, colour)
 
 def render_small_text(text, colour = colours.COLOUR_AMLSERVINYOUR ):
-    return small_font.render(text, 1, colour)
+    return get_font('small').render(text, 1, colour)
 
 def render_cursive_small(text, colour = colours.COLOUR_AMLSERVINYOUR ):
-    return cursive_small.render(text, 1, colour)
+    return get_font('cursive_small').render(text, 1, colour)
 
 def render_text_wrapped(surface, text, rect, color = colours.COLOUR_AMLSERVINYOUR, aa=True):
     rect = pygame.Rect(rect)
     y = rect.top
     lineSpacing = -2
+    regular_font = get_font('regular')
 
     # get the height of the font
     fontHeight = regular_font.size("Tg")[1]
@@ -0,0 +1,332 @@
+import argparse
+import heapq
+import itertools
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from app.resources import directories
+from app.models.magic import SpellBook
+from app.models import events
+from app.models import supervisor
+from app.models import sandbox
+from app.models import ratings
+from app.models import result_cache
+from app.models.battle import Battle
+from app.models.league import League
+from app.models.replay import BattleReplay
+from app.models.bracket import Bracket, BracketRunner
+from app.models.tournament import TournamentRunner
+from app.models.recorder import BattleRecorder
+from app.models.monte_carlo import estimate_matchups
+from app.models import team
+
+# Headless battle simulator. Runs leagues straight through the models
+# without touching pygame, so it can be used on machines without a display
+# or sound card:
+#
+#     python -m app.sim --repeat 100
+#
+# Matches can be spread over several processes, optionally replaying every
+# pairing many times with different seeds. Runs with the same --seed always
+# produce the same results:
+#
+#     python -m app.sim --workers 8 --replays 1000 --quiet
+#
+# Or skip the leagues and estimate the win probability of every pairing:
+#
+#     python -m app.sim --matchups 100000
+#
+# Or time how a round scales with the size of the teams, using the first
+# two teams' mages over and over to fill the rosters:
+#
+#     python -m app.sim --benchmark 10,100,500
+#
+# Or play knockout brackets instead of leagues:
+#
+#     python -m app.sim --bracket double --best-of 3 --workers 8
+#
+
+def summarize_battle(battle):
+    return {
+        "teams"  : (battle.team1.get_short_name(), battle.team2.get_short_name()),
+        "winner" : battle.get_winner(),
+        "rounds" : battle.get_rounds_played(),
+        "health" : [
+            [(mage.get_short_name(), mage.cur_hp, mage.max_hp) for mage in battle.team1],
+            [(mage.get_short_name(), mage.cur_hp, mage.max_hp) for mage in battle.team2]
+        ]
+    }
+
+def run_battle(battle, recorder=None):
+    player = battle if recorder == None else recorder
+    result = player.play_next_move()
+    while not result['finished']:
+        result = player.play_next_move()
+    return summarize_battle(battle)
+
+# Plays a league the same way the in game view does, including the extra
+# matches between tied teams. Yields a summary for every match played.
+# When given, archive is called with the log of every battle.
+def run_league(league, max_tiebreaks=10, archive=None):
+    tiebreaks = 0
+    while True:
+        while not league.finished():
+            # Seeded matches that were played before come from the result
+            # cache, unless their battle logs are wanted
+            cache = result_cache.get_cache()
+            if cache != None and archive == None:
+                team1, team2 = league.get_matches_list()[league.get_current_match()]
+                summary = None
+                if not league.has_replay(team1, team2):
+                    summary = cache.get(team1, team2, league.get_next_seed(), league.scheduler)
+                if summary != None:
+                    league.skip_next_battle(summary["winner"])
+                    yield summary
+                    continue
+
+            battle = league.get_next_battle()
+            recorder = BattleRecorder(battle) if archive != None else None
+            summary = run_battle(battle, recorder)
+            league.record_result(battle)
+            if recorder != None:
+                archive(recorder.get_log())
+            if cache != None and battle.seed != None and not isinstance(battle, BattleReplay):
+                cache.put(battle.team1, battle.team2, battle.seed, league.scheduler, summary)
+            yield summary
+
+        if league.winners_chosen() or tiebreaks >= max_tiebreaks:
+            return
+        tiebreaks += 1
+
+def format_summary(summary):
+    text = "{} vs {}: {} won after {} round{}\n".format(
+        summary["teams"][0],
+        summary["teams"][1],
+        summary["winner"],
+        summary["rounds"],
+        "" if summary["rounds"] == 1 else "s"
+    )
+    for team_name, health in zip(summary["teams"], summary["health"]):
+        text += "    {}: {}\n".format(
+            team_name,
+            ", ".join("{} {}/{}".format(*mage) for mage in health)
+        )
+    return text
+
+def format_series(series):
+    return "{}: {} vs {}: {} won {}-{}".format(
+        series["bracket"],
+        series["teams"][0],
+        series["teams"][1],
+        series["teams"][series["winner"] - 1],
+        max(series["wins"]),
+        min(series["wins"])
+    )
+
+def format_estimate(estimate):
+    return "{} vs {}: {:.4f} ({} of {} won, {})".format(
+        estimate["teams"][0],
+        estimate["teams"][1],
+        estimate["win_probability"],
+        estimate["wins"][0],
+        estimate["battles"],
+        "vectorized" if estimate["vectorized"] else "scalar"
+    )
+
+# Plays a few rounds between two teams of size mages each. Returns the
+# average seconds per round spent playing it and spent only ordering the
+# moves
+def benchmark_round(team1, team2, size, seed=None, scheduler="static", n_rounds=3):
+    teams = []
+    for base in [team1, team2]:
+        modules = [base.modules[i % len(base.modules)] for i in range(size)]
+        teams.append(team.build_team(base.get_name(), modules))
+    battle = Battle(teams[0], teams[1], seed, scheduler)
+
+    schedule_time = 0.0
+    start = time.perf_counter()
+    rounds = 0
+    while rounds < n_rounds and not battle.is_battle_over():
+        round_number = battle.get_round_number()
+        while battle.get_round_number() == round_number and not battle.is_battle_over():
+            battle.play_next_move()
+        rounds += 1
+    play_time = time.perf_counter() - start
+
+    for i in range(rounds):
+        start = time.perf_counter()
+        battle_round = Battle.schedulers[scheduler](battle.team1, battle.team2, battle.rng)
+        while not battle_round.round_over():
+            heapq.heappop(battle_round.queue)
+        schedule_time += time.perf_counter() - start
+
+    return play_time/max(rounds, 1), schedule_time/max(rounds, 1)
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog="python -m app.sim", description="Run leagues without a display")
+    parser.add_argument("--teams", default=directories.TEAM_PATH, help="teams JSON file")
+    parser.add_argument("--magic", default=directories.MAGIC_PATH, help="spell book XML file")
+    parser.add_argument("--repeat", type=int, default=1, help="number of leagues to play")
+    parser.add_argument("--winners", type=int, default=2, help="number of winners per league")
+    parser.add_argument("--workers", type=int, default=0, help="number of worker processes (0 plays in this process)")
+    parser.add_argument("--replays", type=int, default=1, help="times every pairing is played (with --workers)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducible runs")
+    parser.add_argument("--max-team-size", type=int, help="most mages a team may field")
+    parser.add_argument("--benchmark", help="comma separated team sizes to time rounds with instead of playing leagues")
+    parser.add_argument("--pairing", choices=sorted(League.pairings), default="ring", help="how teams are paired up in a league")
+    parser.add_argument("--swiss-rounds", type=int, help="rounds in a swiss league (enough to separate the teams by default)")
+    parser.add_argument("--bracket", choices=Bracket.eliminations, help="play single or double elimination brackets instead of leagues")
+    parser.add_argument("--best-of", type=int, default=1, help="games in every bracket series")
+    parser.add_argument("--scheduler", choices=sorted(Battle.schedulers), default="static", help="how moves are ordered within a round")
+    parser.add_argument("--compact", action="store_true", help="keep team state in compact arrays")
+    parser.add_argument("--compiled", action="store_true", help="cast spells from the compiled spell table")
+    parser.add_argument("--quiet", action="store_true", help="only print the final statistics")
+    parser.add_argument("--verbose", action="store_true", help="show the combat log")
+    parser.add_argument("--events", help="write combat events to this JSON lines file")
+    parser.add_argument("--matchups", type=int, help="estimate every pairing's win probability from this many battles instead of playing leagues")
+    parser.add_argument("--sandbox", action="store_true", help="run every team's scripts in a process of its own (in-process runs only)")
+    parser.add_argument("--memory-limit", type=int, help="megabytes of memory each sandboxed team may use")
+    parser.add_argument("--budget", type=float, help="seconds each AI decision may take (in-process runs only)")
+    parser.add_argument("--cpu-budget", type=float, help="processor seconds each AI decision may use (in-process runs only)")
+    parser.add_argument("--latency", action="store_true", help="print how long every mage took to decide")
+    parser.add_argument("--cache", help="keep the results of seeded matches in this file and skip them when played again")
+    parser.add_argument("--cache-size", type=int, default=100000, help="most results kept in the cache")
+    parser.add_argument("--ratings", help="keep Elo ratings of every team and mage script in this file")
+    parser.add_argument("--record", help="save a battle log for every match into this directory (in-process runs only)")
+    return parser.parse_args(args)
+
+def main(args=None):
+    options = parse_args(sys.argv[1:] if args is None else args)
+
+    # Only narrate the battles when asked. Anything else printed along the
+    # way (team scripts, load errors) is thrown away too
+    if options.events != None:
+        events.set_sink(events.JsonLinesSink(options.events))
+    elif not options.verbose:
+        events.set_sink(events.NullSink())
+    log = sys.stdout if options.verbose else open(os.devnull, "w")
+
+    with redirect_stdout(log):
+        SpellBook.load_spell_book(options.magic)
+        SpellBook.set_compiled(options.compiled)
+        memory_limit = None if options.memory_limit == None else options.memory_limit*1024*1024
+        teams = team.load_teams(options.teams, options.compact, options.sandbox, memory_limit, options.max_team_size)
+
+    if options.benchmark != None:
+        for size in [int(size) for size in options.benchmark.split(",")]:
+            with redirect_stdout(log):
+                play_time, schedule_time = benchmark_round(teams[0], teams[1], size, options.seed, options.scheduler)
+            print("{} mages a side: {:.3f} ms per round ({:.3f} ms ordering moves)".format(
+                size, 1000*play_time, 1000*schedule_time
+            ))
+        events.get_sink().close()
+        return
+
+    if options.matchups != None:
+        start = time.time()
+        with redirect_stdout(log):
+            estimates = estimate_matchups(teams, options.matchups, options.seed)
+        elapsed = time.time() - start
+        for estimate in estimates:
+            print(format_estimate(estimate))
+        n_battles = options.matchups*len(estimates)
+        print("Simulated {} battles in {:.2f}s ({:.1f} battles/s)".format(
+            n_battles, elapsed, n_battles/max(elapsed, 1e-9)
+        ))
+        sandbox.shutdown_workers()
+        events.get_sink().close()
+        return
+
+    if options.budget != None or options.cpu_budget != None or options.latency:
+        supervisor.set_supervisor(supervisor.DecisionSupervisor(options.budget, options.cpu_budget))
+
+    if options.ratings != None:
+        ratings.set_ratings(ratings.Ratings(options.ratings))
+    if options.cache != None:
+        result_cache.set_cache(result_cache.ResultCache(options.cache, options.magic, options.cache_size, {
+            "budget"        : options.budget,
+            "cpu_budget"    : options.cpu_budget,
+            "max_team_size" : options.max_team_size,
+            "sandbox"       : options.sandbox,
+            "memory_limit"  : options.memory_limit
+        }))
+
+    archive = None
+    if options.record != None:
+        if not os.path.isdir(options.record):
+            os.makedirs(options.record)
+        match_numbers = itertools.count()
+        archive = lambda log: log.save(os.path.join(options.record, "match_{:06d}.aigl".format(next(match_numbers))))
+
+    runner = None
+    n_matches = 0
+    start = time.time()
+    for i in range(options.repeat):
+        if options.bracket != None:
+            bracket = Bracket(teams, options.bracket, options.best_of, None if options.seed == None else options.seed + i, options.scheduler, options.winners)
+            if runner == None:
+                runner = BracketRunner(bracket, options.magic, options.workers, verbose=options.verbose, compact=options.compact, compiled=options.compiled)
+            runner.bracket = bracket
+            with redirect_stdout(log):
+                rounds = runner.run()
+
+            n_matches += sum(len(series["games"]) for results in rounds for series in results)
+            if not options.quiet:
+                for results in rounds:
+                    for series in results:
+                        print(format_series(series))
+                print("Bracket {} winners: {}\n".format(
+                    i + 1, ", ".join(t.get_short_name() for t in bracket.get_winners())
+                ))
+            continue
+
+        league = League(teams, options.winners, None if options.seed == None else options.seed + i, options.scheduler, options.pairing, options.swiss_rounds)
+        if options.workers > 0:
+            if runner == None:
+                runner = TournamentRunner(league, options.magic, options.workers, options.replays, options.seed, verbose=options.verbose, compact=options.compact, compiled=options.compiled)
+            runner.league = league
+            summaries = runner.run_league()
+        else:
+            summaries = []
+            with redirect_stdout(log):
+                for summary in run_league(league, archive=archive):
+                    summaries.append(summary)
+
+        n_matches += len(summaries)
+        if not options.quiet:
+            for summary in summaries:
+                print(format_summary(summary))
+            print("League {} winners: {}\n".format(
+                i + 1, ", ".join(t.get_short_name() for t in league.get_winners())
+            ))
+    elapsed = time.time() - start
+
+    if runner != None:
+        runner.shutdown()
+    sandbox.shutdown_workers()
+    events.get_sink().close()
+
+    decision_supervisor = supervisor.get_supervisor()
+    if decision_supervisor != None:
+        decision_supervisor.shutdown()
+        for stats in sorted(decision_supervisor.get_stats().values(), key=lambda stats: -stats.max_time):
+            print(stats)
+
+    cache = result_cache.get_cache()
+    if cache != None:
+        print("Result cache: {} hits, {} misses".format(cache.hits, cache.misses))
+        result_cache.set_cache(None)
+
+    team_ratings = ratings.get_ratings()
+    if team_ratings != None:
+        for name, rating, games in team_ratings.get_table():
+            print("{}: {:.0f} ({} matches)".format(name, rating, games))
+        ratings.set_ratings(None)
+
+    print("Played {} matches in {:.2f}s ({:.1f} matches/s)".format(
+        n_matches, elapsed, n_matches/max(elapsed, 1e-9)
+    ))
+
+if __name__ == "__main__":
+    main()
@@ -90,7 +90,8 @@ class Delay:
         self.elapsed = self.time
 
 class FrameAnimate:
-    def __init__(self, target, frames):
+    def __init__(self, target, frames, rng=random):
+        self.rng = rng
         self.target = target
         self.elapsed = 0
         self.frames = frames
@@ -99,14 +100,14 @@ class FrameAnimate:
         self.target(self.frame[0])
 
     def compute_trigger_time(self, normal, fuzz):
-        return normal + random.uniform(0, 1)*fuzz - 1*(random.randint(0,1))
+        return normal + self.rng.uniform(0, 1)*fuzz - 1*(self.rng.randint(0,1))
 
     def animate(self, delta_t):
         self.elapsed += delta_t
 
         if self.elapsed > self.trigger:
             r = sum(c[1] for c in self.frame[3])
-            r = random.uniform(0, r)
+            r = self.rng.uniform(0, r)
             upto = 0
             for choice in self.frame[3]:
                 if upto + choice[1] >= r:
@@ -125,7 +126,8 @@ class FrameAnimate:
         self.target(self.frame[0])
 
 class ChooseRandom:
-    def __init__(self, target, options, time=150, fuzz=0):
+    def __init__(self, target, options, time=150, fuzz=0, rng=random):
+        self.rng = rng
         self.time = time
         self.fuzz = fuzz
         self.elapsed = 0
@@ -136,12 +138,12 @@ class ChooseRandom:
         self.options = options
 
     def compute_trigger_time(self, normal, fuzz):
-        return abs(normal + random.uniform(0, 1)*fuzz - 1*(random.randint(0,1)))
+        return abs(normal + self.rng.uniform(0, 1)*fuzz - 1*(self.rng.randint(0,1)))
 
     def animate(self, delta_t):
         self.elapsed += delta_t
         if self.elapsed > self.trigger:
-            r = random.uniform(0, self.range)
+            r = self.rng.uniform(0, self.range)
             upto = 0
             for choice in self.options:
                 if upto + choice[1] >= r:
@@ -4,9 +4,13 @@ import operator
 from collections import namedtuple
 from app.resources.event_handler import SET_GAME_STATE
 from app.models.league import League
+from app.models.bracket import Bracket, BracketRunner
+from app.models import events
+from app.models.replay import BattleReplay, load_replays
 from app.view.animations import Delay, FadeIn, FadeOut, ChooseRandom, FrameAnimate, MovePosition, DelayCallBack, MoveValue, SequenceAnimation, ParallelAnimation
-from app.resources import text_renderer, colours
+from app.resources import text_renderer, colours, directories
 from app.resources.images import ImageManager
+from app.resources.sounds import SoundManager
 from app.resources.music import MusicManager
 from app.resources.event_handler import SOUND_EFFECT
 
@@ -314,6 +318,23 @@ class SpellFactory:
         else:
             return self.assemble(self.spells[spell_id])
 
+# Starts loading the sprite sheets and sounds a battle between the two
+# teams will use, so that they are ready by the time it starts
+def prefetch_battle_assets(team1, team2):
+    blueprints = SpellFactory().spells
+    sound_effects = SoundManager().sound_effects
+    images = ['battle_stage']
+    sounds = ['faint']
+    for mage in list(team1) + list(team2):
+        images.append(mage.element.name.lower() + "_mage")
+        for spell in mage.spells:
+            if spell in blueprints:
+                images.append(blueprints[spell].sprite_sheet)
+                sounds.append(sound_effects.get(blueprints[spell].sprite_sheet, blueprints[spell].sprite_sheet))
+
+    ImageManager().prefetch(images)
+    SoundManager().prefetch(sounds)
+
 class MageSprite:
     def __init__(self, mage, direction, start, combat_zone, depth):
         self.mage = mage
@@ -612,8 +633,9 @@ class BattleWindow:
                         self.sprites.append(self.spells[spell])
             i += 1
 
+        # Fetched every frame, as the image manager hands out a new copy
+        # whenever the display mode changes
         self.image_manager = ImageManager()
-        self.stage = self.image_manager.get_image('battle_stage')
 
     def restore_positions(self):
         for mage in self.battle.team1:
@@ -646,9 +668,10 @@ class BattleWindow:
 
     def render(self):
         surface  = pygame.Surface(self.resolution)
-        surface.blit(self.stage,
-            ((surface.get_width()-self.stage.get_width())/2,
-            (surface.get_height()-200 - self.stage.get_height()))
+        stage = self.image_manager.get_image('battle_stage')
+        surface.blit(stage,
+            ((surface.get_width()-stage.get_width())/2,
+            (surface.get_height()-200 - stage.get_height()))
         )
 
         self.sprites.sort(key=lambda x: x.depth)
@@ -716,9 +739,7 @@ class ScoreTable:
     def render(self):
         surface = pygame.Surface((self.width, self.height))
 
-        scores = self.league.get_scores()
-        scores = [( team, scores[team]) for team in scores]
-        scores = sorted(scores, key=lambda item: -item[1])
+        scores = self.league.get_standings()
 
         #pygame.draw.rect(surface, colours.COLOUR_WHITE, (0,0,self.width, self.cell_height), 1)
         #pygame.draw.rect(surface, colours.COLOUR_WHITE, (0,0,self.width*self.team_name_weight, self.cell_height), 1)
@@ -814,6 +835,130 @@ class MatchTable:
 
         return surface
 
+class BracketTable:
+    cell_height = 64
+
+    # Results of one round of a bracket, as many series as fit in max_rows
+    def __init__(self, results, round_number, max_rows):
+        self.results = results
+
+        finals = [series for series in results if series["bracket"] == "final"]
+        heading = "Final" if len(finals) > 0 else "Round {}".format(round_number)
+        self.round_head = text_renderer.render_large_text(heading, colours.COLOUR_WHITE)
+        self.margin = 10
+
+        self.rows = min(len(results), max(1, max_rows))
+        self.hidden = len(results) - self.rows
+
+        self.width = 600
+        self.height = BracketTable.cell_height * (self.rows + 1 + (1 if self.hidden > 0 else 0))
+
+    def render(self):
+        surface = pygame.Surface((self.width, self.height))
+        cell_height = BracketTable.cell_height
+        r = self.round_head.get_rect()
+        pygame.draw.line(surface, colours.COLOUR_WHITE,
+            ((self.width - self.round_head.get_width())//2, r.y+r.h), ((self.width - self.round_head.get_width())//2+r.w, r.y+r.h)
+        )
+
+        surface.blit(self.round_head, (
+            (self.width - self.round_head.get_width())//2,
+            (cell_height - self.round_head.get_height())//2
+        ))
+
+        counter = 1
+        for series in self.results[:self.rows]:
+            pygame.draw.line(surface, colours.COLOUR_WHITE, (0,cell_height*(counter+1)), (self.width, cell_height*(counter+1)))
+
+            # Losers are greyed out
+            for i, team_name in enumerate(series["teams"]):
+                colour = colours.COLOUR_WHITE if i + 1 == series["winner"] else colours.COLOUR_GREY
+                text = text_renderer.render_menu_item(team_name, colour)
+                surface.blit(text, (
+                    0 if i == 0 else self.width - text.get_width(),
+                    (cell_height - text.get_height())//2 + cell_height*counter
+                ))
+
+            score = text_renderer.render_menu_item("{} - {}".format(*series["wins"]), colours.COLOUR_WHITE)
+            surface.blit(score, (
+                (self.width - score.get_width())//2,
+                (cell_height - score.get_height())//2 + cell_height*counter
+            ))
+            counter = counter+1
+
+        if self.hidden > 0:
+            more = text_renderer.render_menu_item("and {} more".format(self.hidden), colours.COLOUR_WHITE)
+            surface.blit(more, (
+                (self.width - more.get_width())//2,
+                (cell_height - more.get_height())//2 + cell_height*counter
+            ))
+
+        return surface
+
+# Shows the results of a bracket that was played out before the game
+# started, one round at a time, then announces the winners
+class StateBracketView:
+    head_height = 145
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.bracket = self.parent.bracket
+
+        max_rows = (self.parent.resolution[1] - StateBracketView.head_height)//BracketTable.cell_height - 2
+        self.tables = [BracketTable(results, i + 1, max_rows) for i, results in enumerate(self.bracket.get_rounds())]
+
+        self.animations = SequenceAnimation()
+        for i in range(len(self.tables)):
+            show_table = SequenceAnimation()
+            show_table.add_animation(FadeIn(self.set_alpha, time=1500))
+            show_table.add_animation(Delay( time=3000 ))
+            show_table.add_animation(FadeOut(self.set_alpha, time=1500))
+            show_table.add_animation(DelayCallBack(self.next_window, time=0))
+            self.animations.add_animation(show_table)
+
+        self.music_manager = MusicManager()
+        self.music_manager.restore_music_volume()
+        self.music_manager.play_song("league", loops=-1)
+
+        self.alpha = 0
+        self.table = 0
+
+        self.parent.parent.event_handler.register_key_listener(self.handle_event)
+
+    def set_alpha(self, alpha):
+        self.alpha = alpha
+
+    def next_window(self):
+        self.table = min(self.table + 1, len(self.tables) - 1)
+
+    def render(self):
+        surface = pygame.Surface(self.parent.resolution)
+        if len(self.tables) > 0:
+            table = self.tables[self.table].render()
+            surface.blit(table, ((surface.get_width()-table.get_width())//2, StateBracketView.head_height))
+
+        mask = pygame.Surface(self.parent.resolution, pygame.SRCALPHA)
+        mask.fill((0,0,0, 255-self.alpha))
+        surface.blit(mask, (0,0))
+
+        return surface
+
+    def update(self, delta_t):
+        if not self.animations.finished():
+            self.animations.animate(delta_t)
+        else:
+            self.parent.trigger_exit_to_announce_winners()
+
+    def handle_event(self, event):
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_SPACE or event.key == pygame.K_RETURN:
+                self.animations.skip_current()
+            elif event.key == pygame.K_ESCAPE:
+                self.parent.trigger_exit_to_main()
+
+    def exit_state(self):
+        self.parent.parent.event_handler.unregister_key_listener(self.handle_event)
+
 class StateLeagueView:
     def __init__(self, parent):
         self.parent = parent
@@ -824,6 +969,10 @@ class StateLeagueView:
             MatchTable(self.league)
         ]
 
+        # Get the next battle's sprites ready while the tables are showing
+        if not self.league.finished():
+            prefetch_battle_assets(*self.league.get_matches_list()[self.league.get_current_match()])
+
         self.animations = SequenceAnimation()
         self.animations.add_animation(FadeIn(self.set_alpha, time=3000))
 
@@ -1029,6 +1178,21 @@ class StateInBattle:
         self.battle_window.sync()
         self.mage_status.sync()
 
+    # Seeking only makes sense when playing back a recorded battle
+    def can_seek(self):
+        return isinstance(self.parent.battle, BattleReplay)
+
+    def seek(self, seek, *args):
+        if not self.can_seek():
+            return
+
+        seek(*args)
+        self.animations = SequenceAnimation()
+        self.message_bar.set_pos(self.message_bar.hide_pos)
+        self.battle_window.restore_positions()
+        self.battle_window.sync()
+        self.mage_status.sync()
+
     def play_whole_game(self):
         result = self.parent.battle.play_next_move()
         while not result['finished']:
@@ -1079,6 +1243,16 @@ class StateInBattle:
                 elif event.key in [pygame.K_RIGHT, pygame.K_2]:
                     self.parent.battle.award_victory(2)
                     self.skip_game = True
+                elif event.key == pygame.K_PAGEDOWN:
+                    self.seek(self.parent.battle.jump_to_round, self.parent.battle.get_round_number() + 1)
+                elif event.key == pygame.K_PAGEUP:
+                    self.seek(self.parent.battle.jump_to_round, self.parent.battle.get_round_number() - 1)
+                elif event.key == pygame.K_HOME:
+                    self.seek(self.parent.battle.seek, 0)
+                elif event.key == pygame.K_f:
+                    self.seek(self.parent.battle.fast_forward, 10)
+                elif event.key == pygame.K_b:
+                    self.seek(self.parent.battle.rewind, 10)
 
     def exit_state(self):
         self.root.parent.event_handler.unregister_key_listener(self.handle_event)
@@ -1484,21 +1658,65 @@ class Game:
     def __init__(self, parent, state_seed='league_view'):
         self.parent = parent
         self.resolution = self.parent.resolution
-        self.league = League(self.parent.teams, 2)
+        self.league = League(
+            self.parent.teams, 2,
+            scheduler=self.parent.settings.get('scheduler', 'static'),
+            pairing=self.parent.settings.get('pairing', 'ring')
+        )
+
+        # Battles recorded by a headless run are played back instead of live
+        replay_dir = self.parent.settings.get('replay_dir')
+        if replay_dir:
+            self.league.set_replays(load_replays(replay_dir))
+
+        # Brackets are played out headless before anything is shown, and
+        # the view only goes through their results
+        self.bracket = None
+        if self.parent.settings.get('bracket'):
+            self.bracket = self.run_bracket(self.parent.settings['bracket'])
+            if state_seed == 'league_view':
+                state_seed = 'bracket_view'
 
         self.states = {
-            'league_view' : StateLeagueView,
-            'battle_view' : StateBattleView
+            'league_view'  : StateLeagueView,
+            'battle_view'  : StateBattleView,
+            'bracket_view' : StateBracketView
         }
 
         self.cur_state = state_seed
         self.state     = self.states[self.cur_state](self)
 
+    # Sandboxed teams have to stay in this process, everyone else is
+    # spread over a pool of worker processes
+    def run_bracket(self, elimination):
+        settings = self.parent.settings
+        bracket = Bracket(
+            self.parent.teams, elimination,
+            best_of=settings.get('best_of', 1),
+            scheduler=settings.get('scheduler', 'static'),
+            n_winners=2
+        )
+        workers = 0 if settings.get('sandbox', False) else settings.get('bracket_workers')
+
+        sink = events.get_sink()
+        events.set_sink(events.NullSink())
+        try:
+            with BracketRunner(bracket, directories.MAGIC_PATH, workers) as runner:
+                runner.run()
+        finally:
+            events.set_sink(sink)
+        return bracket
+
     def set_state(self, state):
         self.state.exit_state()
         self.state_code = state
         self.state = self.states[state](self)
 
+    # Views set up from now on are laid out for the new resolution. Images
+    # are fetched as they are drawn, so nothing holds on to old copies
+    def update_display(self):
+        self.resolution = self.parent.resolution
+
     def render(self):
         return self.state.render()
 
@@ -1509,7 +1727,10 @@ class Game:
         self.state.handle_event(event)
 
     def trigger_exit_to_announce_winners(self):
-        self.parent.winners = self.league.get_winners()
+        if self.bracket != None:
+            self.parent.winners = self.bracket.get_winners()
+        else:
+            self.parent.winners = self.league.get_winners()
         self.state.exit_state()
         event = pygame.event.Event(SET_GAME_STATE, state="announce_winners", seed='default')
         pygame.event.post(event)
@@ -127,6 +127,11 @@ class AnnounceWinners:
         self.state_code = state
         self.state = self.states[state](self)
 
+    # Views set up from now on are laid out for the new resolution. Images
+    # are fetched as they are drawn, so nothing holds on to old copies
+    def update_display(self):
+        self.resolution = self.parent.resolution
+
     def render(self):
         return self.state.render()
 
@@ -2,6 +2,7 @@ import pygame
 import json
 import sys
 from app.resources import directories
+from app.resources import text_renderer, colours
 from app.view import main_menu, in_game, winners
 from app.models.magic import SpellBook
 from app.models.battle import Battle
@@ -10,6 +11,9 @@ from app.resources.sounds import SoundManager
 from app.resources.images import ImageManager
 from app.resources.event_handler import EventHandler, STATE_CHANGED, MUSIC_STOPPED
 from app.models import team
+from app.models import supervisor
+from app.models import sandbox
+from app.models import ratings
 
 class Walton:
     def __init__(self):
@@ -31,6 +35,11 @@ class Walton:
         self.sound_manager = SoundManager(self.settings)
         self.image_manager = ImageManager()
 
+        # Nothing is loaded up front. The menus need their sounds and the
+        # mage icons first, the rest is loaded as it is used
+        self.sound_manager.prefetch(['menu_move', 'menu_click', 'menu_scroll'])
+        self.image_manager.prefetch([name for name in self.image_manager.images.get_names() if name.endswith("_mage")])
+
         self.music_manager.set_music_stopped_event(MUSIC_STOPPED)
 
         self.event_handler.register_quit_listener(self.quit)
@@ -39,7 +48,7 @@ class Walton:
         self.event_handler.register_state_change_listener(self.music_manager.handle_state_change)
         self.event_handler.register_sound_effect_listener(self.sound_manager.handle_sound_effect)
 
-        # self.event_handler.register_settings_update_listener(self.update_settings)
+        self.event_handler.register_settings_update_listener(self.update_settings)
         self.event_handler.register_settings_update_listener(self.music_manager.handle_settings_update)
         self.event_handler.register_settings_update_listener(self.sound_manager.handle_settings_update)
 
@@ -51,7 +60,22 @@ class Walton:
         }
         self.state_code = None
         SpellBook.load_spell_book(directories.MAGIC_PATH)
-        self.teams = team.load_teams(directories.TEAM_PATH)
+        # Team scripts can be kept out of the game process altogether
+        self.teams = team.load_teams(directories.TEAM_PATH, sandboxed=self.settings.get('sandbox', False))
+
+        # Optional limits on how long a team script may think about a move
+        if 'move_budget' in self.settings or 'move_cpu_budget' in self.settings:
+            supervisor.set_supervisor(supervisor.DecisionSupervisor(
+                self.settings.get('move_budget'),
+                self.settings.get('move_cpu_budget')
+            ))
+
+        # Frame rate and image cache counters in the corner of the screen
+        self.show_frame_stats = self.settings.get('show_frame_stats', False)
+
+        # Rate every match played in the game as well
+        if 'ratings_path' in self.settings:
+            ratings.set_ratings(ratings.Ratings(self.settings['ratings_path']))
 
     def __game_loop(self):
         clock = pygame.time.Clock()
@@ -74,10 +98,20 @@ class Walton:
             self.state.update(delta_t)
             render = self.state.render()
             self.screen.blit(render, (0,0))
+            if self.show_frame_stats:
+                self.screen.blit(self.render_frame_stats(clock), (5, 5))
             pygame.display.flip()
+            self.image_manager.end_frame()
+
+    def render_frame_stats(self, clock):
+        return text_renderer.render_small_text(
+            "{:.0f} fps, {} tile allocations avoided".format(clock.get_fps(), self.image_manager.get_allocations_avoided()),
+            colours.COLOUR_WHITE
+        )
 
     def __initialize_display(self):
         self.resolution_key = self.settings['screen']['resolution']
+        self.fullscreen = self.settings['screen']['fullscreen']
         resolution = self.settings['valid_resolutions'][self.resolution_key]
         self.resolution = (resolution['width'], resolution['height'])
 
@@ -87,6 +121,9 @@ class Walton:
             self.screen = pygame.display.set_mode(self.resolution, pygame.DOUBLEBUF)
         pygame.display.set_caption(self.settings['title'])
 
+        # Images converted for the old display mode are no good any more
+        self.image_manager.invalidate()
+
     def set_state(self, state_code, state_seed=None):
         self.state_code = state_code
         if state_seed != None:
@@ -101,7 +138,8 @@ class Walton:
         self.__game_loop()
 
     def update_settings(self, event):
-        if self.settings['screen']['resolution'] != self.resolution_key:
+        screen = self.settings['screen']
+        if screen['resolution'] != self.resolution_key or screen['fullscreen'] != self.fullscreen:
             self.__initialize_display()
             self.state.update_display()
 
@@ -125,4 +163,10 @@ class Walton:
             while self.sound_manager.still_playing():
                 continue
 
+        supervisor.set_supervisor(None)
+        ratings.set_ratings(None)
+        sandbox.shutdown_workers()
+        # Stop the threads still prefetching images and sounds
+        self.image_manager.images.shutdown()
+        self.sound_manager.loader.shutdown()
         self.quit = True
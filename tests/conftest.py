@@ -0,0 +1,38 @@
+import pytest
+from app.resources import directories
+from app.models import events
+from app.models import team
+from app.models.magic import SpellBook
+
+# Fixtures shared by the model tests. Battles are played on the teams in
+# data/teams.json with the real spell book, with combat events thrown away
+
+@pytest.fixture(scope="session", autouse=True)
+def spell_book():
+    SpellBook.load_spell_book(directories.MAGIC_PATH)
+    return SpellBook
+
+@pytest.fixture(autouse=True)
+def silent_events():
+    sink = events.get_sink()
+    events.set_sink(events.NullSink())
+    yield
+    events.set_sink(sink)
+
+@pytest.fixture
+def team_specs():
+    return team.load_team_specs(directories.TEAM_PATH)
+
+@pytest.fixture
+def teams(team_specs):
+    return [team.build_team(name, modules) for name, modules in team_specs]
+
+# Plays a battle to the end and hands it back
+@pytest.fixture
+def play_out():
+    def play(battle):
+        result = battle.play_next_move()
+        while not result['finished']:
+            result = battle.play_next_move()
+        return battle
+    return play
@@ -0,0 +1,36 @@
+from app.models import team
+from app.models import events
+from app.models.league import League
+from app.models.magic import SpellBook
+
+# Plays a seeded round robin league and returns every event it emitted
+def play_league(teams, play_out, seed=5, scheduler="static"):
+    sink = events.ListSink()
+    events.set_sink(sink)
+    league = League(teams, seed=seed, scheduler=scheduler, pairing="round_robin")
+    while not league.finished():
+        league.record_result(play_out(league.get_next_battle()))
+    return sink.events
+
+def test_same_seed_same_battles(teams, play_out):
+    first = play_league(teams, play_out)
+    assert len(first) > 0
+    assert play_league(teams, play_out) == first
+    assert play_league(teams, play_out, seed=6) != first
+
+def test_compact_teams_play_the_same(team_specs, teams, play_out):
+    compact = [team.build_team(name, modules, compact=True) for name, modules in team_specs]
+    assert play_league(compact, play_out) == play_league(teams, play_out)
+
+def test_compiled_spells_play_the_same(teams, play_out):
+    expected = play_league(teams, play_out)
+    SpellBook.set_compiled(True)
+    try:
+        assert play_league(teams, play_out) == expected
+    finally:
+        SpellBook.set_compiled(False)
+
+def test_dynamic_scheduler_plays_the_same(teams, play_out):
+    # None of the shipped teams cast spells that change speed, so both
+    # schedulers order their rounds the same way
+    assert play_league(teams, play_out, scheduler="dynamic") == play_league(teams, play_out)
@@ -0,0 +1,83 @@
+from app.models.battle import BattleRound, DynamicBattleRound
+
+# Stand-in for a MageManager. Every move it makes is written to the shared
+# list of moves, and can knock other mages out or change their speed
+class FakeMage:
+    def __init__(self, name, speed, moves, knocks_out=(), slows=()):
+        self.name = name
+        self.speed = speed
+        self.hp = 1
+        self.moves = moves
+        self.knocks_out = knocks_out
+        self.slows = slows
+        self.speed_listener = None
+
+    def get_stat(self, stat):
+        return self.speed
+
+    def is_conscious(self):
+        return self.hp > 0
+
+    def make_move(self, allies, enemies, rng):
+        self.moves.append(self.name)
+        for mage in self.knocks_out:
+            mage.hp = 0
+        for mage in self.slows:
+            mage.speed = 0
+            if mage.speed_listener != None:
+                mage.speed_listener.speed_changed(mage)
+        return {"caster" : self}
+
+def play_round(round):
+    while not round.round_over():
+        round.next_move()
+
+def test_fastest_mage_moves_first():
+    moves = []
+    team1 = [FakeMage("a1", 5, moves), FakeMage("a2", 20, moves), FakeMage("a3", 10, moves)]
+    team2 = [FakeMage("b1", 10, moves), FakeMage("b2", 1, moves)]
+    play_round(BattleRound(team1, team2))
+    # Ties go to the mage listed first when the teams are interleaved
+    assert moves == ["a2", "b1", "a3", "a1", "b2"]
+
+def test_fainted_mages_are_skipped():
+    moves = []
+    slow = FakeMage("slow", 1, moves)
+    middle = FakeMage("middle", 5, moves)
+    fast = FakeMage("fast", 10, moves, knocks_out=[slow, middle])
+    round = BattleRound([fast, slow], [middle])
+    play_round(round)
+    assert moves == ["fast"]
+    assert round.cur_move == 1
+
+def test_fainted_mages_stay_queued_until_they_come_up():
+    moves = []
+    slow = FakeMage("slow", 1, moves)
+    fast = FakeMage("fast", 10, moves, knocks_out=[slow])
+    middle = FakeMage("middle", 5, moves)
+    round = BattleRound([fast, slow], [middle])
+    round.next_move()
+    # The fainted mage is only dropped once it reaches the top of the heap
+    assert len(round.queue) == 2
+    play_round(round)
+    assert moves == ["fast", "middle"]
+
+def test_mages_start_out_fainted():
+    moves = []
+    knocked_out = FakeMage("out", 10, moves)
+    knocked_out.hp = 0
+    play_round(BattleRound([knocked_out], [FakeMage("b1", 1, moves)]))
+    assert moves == ["b1"]
+
+def test_dynamic_round_follows_speed_changes():
+    moves = []
+    middle = FakeMage("middle", 5, moves)
+    slow = FakeMage("slow", 1, moves)
+    fast = FakeMage("fast", 10, moves, slows=[middle])
+    play_round(BattleRound([fast, middle], [slow]))
+    assert moves == ["fast", "middle", "slow"]
+
+    moves[:] = []
+    middle.speed = 5
+    play_round(DynamicBattleRound([fast, middle], [slow]))
+    assert moves == ["fast", "slow", "middle"]
@@ -0,0 +1,124 @@
+import random
+from app.resources import directories
+from app.models import team
+from app.models.bracket import Bracket, BracketRunner, get_bracket_order, run_series
+
+class FakeTeam:
+    def __init__(self, name):
+        self.name = name
+
+    def get_short_name(self):
+        return self.name
+
+    def get_name(self):
+        return self.name
+
+def make_teams(n):
+    return [FakeTeam("team{}".format(i)) for i in range(n)]
+
+# Plays a bracket without battles, pick_winner choosing every series winner.
+# Returns how many series every team lost
+def play(bracket, pick_winner):
+    losses = dict((team.get_short_name(), 0) for team in bracket.teams)
+    while not bracket.finished():
+        results = []
+        for team1, team2 in bracket.get_pending_matches():
+            winner = pick_winner(team1, team2)
+            loser = team2 if winner is team1 else team1
+            losses[loser.get_short_name()] += 1
+            results.append({
+                "teams"  : (team1.get_short_name(), team2.get_short_name()),
+                "wins"   : (1, 0) if winner is team1 else (0, 1),
+                "winner" : 1 if winner is team1 else 2,
+                "games"  : []
+            })
+        bracket.record_round(results)
+    return losses
+
+def favourite(teams):
+    seeds = dict((team.get_short_name(), i) for i, team in enumerate(teams))
+    return lambda team1, team2: min(team1, team2, key=lambda team: seeds[team.get_short_name()])
+
+def test_bracket_order_keeps_top_seeds_apart():
+    assert get_bracket_order(8) == [0, 7, 3, 4, 1, 6, 2, 5]
+
+def test_double_elimination_advancement():
+    teams = make_teams(4)
+    bracket = Bracket(teams, "double")
+    assert bracket.get_pending_matches() == [(teams[0], teams[3]), (teams[1], teams[2])]
+
+    losses = play(bracket, favourite(teams))
+    rounds = bracket.get_rounds()
+    assert [[series["bracket"] for series in results] for results in rounds] == [
+        ["upper", "upper"],
+        ["upper", "lower"],
+        ["lower"],
+        ["final"]
+    ]
+    # The losers' bracket final is between the team that came through it
+    # and the team that just lost the winners' bracket final
+    assert rounds[2][0]["teams"] == ("team2", "team1")
+    assert bracket.get_ranking() == teams
+    assert losses == {"team0" : 0, "team1" : 2, "team2" : 2, "team3" : 2}
+
+def test_losers_bracket_champion_forces_second_final():
+    teams = make_teams(4)
+    bracket = Bracket(teams, "double")
+    finals = []
+    def pick_winner(team1, team2):
+        if bracket.pending[0][2] == "final":
+            finals.append((team1, team2))
+            return team1 if team1 is teams[1] else team2
+        return favourite(teams)(team1, team2)
+
+    losses = play(bracket, pick_winner)
+    assert finals == [(teams[0], teams[1]), (teams[1], teams[0])]
+    assert bracket.get_winners() == [teams[1]]
+    assert losses["team0"] == 2 and losses["team1"] == 1
+
+def test_every_team_but_the_champion_loses_twice():
+    rng = random.Random(4)
+    for n in range(2, 14):
+        teams = make_teams(n)
+        bracket = Bracket(teams, "double")
+        losses = play(bracket, lambda team1, team2: rng.choice([team1, team2]))
+        champion = bracket.get_winners()[0].get_short_name()
+        assert losses[champion] <= 1
+        assert all(count == 2 for name, count in losses.items() if name != champion)
+        assert sorted(team.get_short_name() for team in bracket.get_ranking()) == sorted(losses)
+
+def test_single_elimination_gives_top_seeds_the_byes():
+    teams = make_teams(5)
+    bracket = Bracket(teams, "single")
+    # Only the fourth and fifth seeds play in the first round
+    assert bracket.get_pending_matches() == [(teams[3], teams[4])]
+    losses = play(bracket, favourite(teams))
+    assert bracket.get_winners() == [teams[0]]
+    assert sorted(losses.values()) == [0, 1, 1, 1, 1]
+
+def test_runner_plays_the_same_in_and_out_of_process(teams):
+    results = []
+    for workers in [0, 2]:
+        bracket = Bracket(teams, "double", best_of=3, seed=8)
+        with BracketRunner(bracket, directories.MAGIC_PATH, workers) as runner:
+            results.append(runner.run())
+        results[-1] = (results[-1], [team.get_short_name() for team in bracket.get_ranking()])
+    assert results[0] == results[1]
+
+# Both names shorten to "Qualifier Division North Gro..."
+def test_series_counts_wins_by_side(team_specs):
+    specs = dict(team_specs)
+    team1 = team.build_team("Qualifier Division North Group A - Mystic", specs["The Mystic Marvels"])
+    team2 = team.build_team("Qualifier Division North Group A - Nerds", specs["C Science nerds "])
+    assert team1.get_short_name() == team2.get_short_name()
+
+    for seed in range(5):
+        series = run_series(0, team1, team2, seed, best_of=3)
+        assert sorted(series["wins"]) in ([0, 2], [1, 2])
+        assert len(series["games"]) == sum(series["wins"])
+        assert series["wins"][series["winner"] - 1] == 2
+
+        bracket = Bracket([team1, team2], "single")
+        series["index"] = 0
+        bracket.record_round([series])
+        assert bracket.get_winners() == [team1 if series["winner"] == 1 else team2]
@@ -0,0 +1,94 @@
+from app.models.league import League, Standings, swiss_pairings, round_robin_pairings
+
+# Teams are only ever asked for their names here
+class FakeTeam:
+    def __init__(self, name):
+        self.name = name
+
+    def get_short_name(self):
+        return self.name
+
+    def get_name(self):
+        return self.name
+
+def make_teams(n):
+    return [FakeTeam("team{}".format(i)) for i in range(n)]
+
+def names(match):
+    return frozenset([match[0].get_short_name(), match[1].get_short_name()])
+
+# Plays out every pending match, the team listed first in make_teams winning
+def play_swiss(league, teams):
+    order = dict((team.get_short_name(), i) for i, team in enumerate(teams))
+    rounds = []
+    while not league.finished():
+        matches = list(league.get_pending_matches())
+        rounds.append(matches)
+        for team1, team2 in matches:
+            winner = min(team1, team2, key=lambda team: order[team.get_short_name()])
+            league.current_match += 1
+            league.record_match(team1, team2, 1 if winner is team1 else 2)
+    return rounds
+
+def test_swiss_has_no_rematches():
+    teams = make_teams(8)
+    league = League(teams, pairing="swiss")
+    rounds = play_swiss(league, teams)
+    assert len(rounds) == 3
+
+    played = [names(match) for matches in rounds for match in matches]
+    assert len(played) == len(set(played))
+    for matches in rounds:
+        paired = [team for match in matches for team in match]
+        assert len(paired) == len(set(paired)) == len(teams)
+
+def test_swiss_byes_go_to_different_teams():
+    teams = make_teams(7)
+    league = League(teams, pairing="swiss", swiss_rounds=5)
+    rounds = play_swiss(league, teams)
+
+    sat_out = []
+    for matches in rounds:
+        paired = set(team.get_short_name() for match in matches for team in match)
+        unpaired = [team.get_short_name() for team in teams if team.get_short_name() not in paired]
+        assert len(unpaired) == 1
+        sat_out += unpaired
+    assert len(sat_out) == len(set(sat_out)) == 5
+    assert league.byes == set(sat_out)
+
+def test_swiss_bye_goes_to_lowest_ranked():
+    teams = make_teams(5)
+    ranking = list(reversed(teams))
+    matches = swiss_pairings(ranking, byes=set([teams[0].get_short_name()]))
+    paired = set(team for match in matches for team in match)
+    # The last team has had its bye already, so the one above it sits out
+    assert [team for team in ranking if team not in paired] == [teams[1]]
+
+def test_swiss_bye_scores_like_a_win():
+    teams = make_teams(3)
+    league = League(teams, pairing="swiss", swiss_rounds=1)
+    league.set_games_per_match(4)
+    bye = [team for team in teams if team not in league.get_pending_matches()[0]][0]
+    team1, team2 = league.get_pending_matches()[0]
+    league.current_match += 1
+    for game in range(4):
+        league.record_winner(team1.get_short_name())
+    league.match_over()
+
+    assert league.finished()
+    assert league.get_scores()[bye.get_short_name()] == league.get_scores()[team1.get_short_name()] == 4
+
+def test_round_robin_meets_everyone_once():
+    teams = make_teams(5)
+    matches = round_robin_pairings(teams)
+    assert len(matches) == 10
+    assert len(set(names(match) for match in matches)) == 10
+
+def test_standings_stay_sorted():
+    teams = make_teams(4)
+    standings = Standings(teams)
+    standings.add_points("team2", 2)
+    standings.add_points("team3")
+    standings.add_points("team1")
+    assert [team.get_short_name() for team in standings.get_ranking()] == ["team2", "team1", "team3", "team0"]
+    assert [len(group) for group in standings.get_groups()] == [1, 2, 1]
@@ -0,0 +1,35 @@
+import pytest
+from app.models import team
+from app.models.battle import Battle
+from app.models.monte_carlo import MatchupEstimator
+
+def mirror_match(team_specs):
+    modules = dict(team_specs)["Alpha Squad"]
+    return team.build_team("Alpha Squad", modules), team.build_team("Alpha Squad", modules)
+
+def test_winning_side_in_a_mirror_match(team_specs, play_out):
+    team1, team2 = mirror_match(team_specs)
+    sides = set()
+    for seed in range(20):
+        battle = play_out(Battle(team1, team2, seed))
+        side = battle.get_winning_side()
+        winners = team1 if side == 1 else team2
+        assert not winners.is_defeated() or battle.round_counter > battle.max_round
+        sides.add(side)
+    assert sides == set([1, 2])
+
+def test_scalar_mirror_match_is_even(team_specs):
+    estimator = MatchupEstimator(*mirror_match(team_specs))
+    wins = estimator.play(400, seed=1)
+    assert 0.4 < wins/400.0 < 0.6
+
+def test_vectorized_agrees_with_scalar(team_specs):
+    pytest.importorskip("numpy")
+    estimator = MatchupEstimator(*mirror_match(team_specs))
+    assert estimator.is_vectorized()
+
+    # The two engines roll different random numbers, so they only agree
+    # statistically
+    vectorized = estimator.simulate(20000, seed=1)/20000.0
+    scalar = estimator.play(600, seed=1)/600.0
+    assert abs(vectorized - scalar) < 0.1
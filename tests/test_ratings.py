@@ -0,0 +1,32 @@
+import json
+from app.models.ratings import Ratings
+
+class FakeTeam:
+    def __init__(self, name, modules):
+        self.name = name
+        self.modules = modules
+
+    def get_short_name(self):
+        if len(self.name) > 32:
+            return self.name[:28] + "..."
+        return self.name
+
+    def get_name(self):
+        return self.name
+
+def test_teams_with_the_same_short_name_are_rated_apart(tmp_path):
+    team1 = FakeTeam("Qualifier Division North Group A - Mystic", ["teams.a"])
+    team2 = FakeTeam("Qualifier Division North Group A - Nerds", ["teams.b"])
+    assert team1.get_short_name() == team2.get_short_name()
+
+    path = str(tmp_path / "ratings.jsonl")
+    ratings = Ratings(path)
+    ratings.record_match(team1, team2, 2)
+    assert ratings.get_team_rating(team2) > ratings.initial_rating > ratings.get_team_rating(team1)
+    assert ratings.get_rating("module", "teams.b") > ratings.get_rating("module", "teams.a")
+    ratings.close()
+
+    with open(path) as f:
+        entry = json.loads(f.readline())
+    assert entry["winner"] == team2.get_name()
+    assert Ratings(path).get_team_rating(team2) == ratings.get_team_rating(team2)
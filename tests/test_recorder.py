@@ -0,0 +1,75 @@
+import pytest
+from app.models.battle import Battle
+from app.models.recorder import BattleLog, BattleRecorder
+from app.models.replay import BattleReplay
+from app.models.league import League
+from app.models import ratings
+
+def record_battle(team1, team2, seed):
+    recorder = BattleRecorder(Battle(team1, team2, seed=seed))
+    while not recorder.play_next_move()['finished']:
+        pass
+    return recorder
+
+def test_log_survives_save_and_load(teams, tmp_path):
+    log = record_battle(teams[0], teams[1], 7).get_log()
+    path = str(tmp_path / "battle.aigl")
+    log.save(path)
+    loaded = BattleLog.load(path)
+
+    assert len(loaded) == len(log) > 0
+    assert loaded.n_moves == log.n_moves
+    assert loaded.teams == log.teams
+    assert loaded.tables == log.tables
+    assert loaded.info == log.info
+    for name, typecode in BattleLog.columns:
+        assert loaded.get_column(name) == log.get_column(name)
+
+def test_loaded_log_replays_the_battle(teams, tmp_path, play_out):
+    recorder = record_battle(teams[1], teams[2], 11)
+    battle = recorder.battle
+    health = [mage.cur_hp for mage in list(battle.team1) + list(battle.team2)]
+
+    path = str(tmp_path / "battle.aigl")
+    recorder.get_log().save(path)
+    replay = play_out(BattleReplay(teams[1], teams[2], BattleLog.load(path)))
+
+    assert [mage.cur_hp for mage in replay.mages] == health
+    assert replay.get_winner() == recorder.get_log().info["winner"]
+    assert replay.get_rounds_played() == battle.get_rounds_played()
+
+def test_log_counts_rounds_like_the_battle(teams, play_out):
+    for seed in range(50):
+        team1, team2 = teams[seed % 3], teams[(seed + 1) % 3]
+        recorder = record_battle(team1, team2, seed)
+        log = recorder.get_log()
+        assert log.info["rounds"] == recorder.battle.get_rounds_played()
+
+        replay = play_out(BattleReplay(team1, team2, log))
+        assert replay.get_winner() == log.info["winner"]
+        assert replay.get_rounds_played() == log.info["rounds"]
+
+def test_replayed_matches_are_scored_but_not_rated(teams, play_out):
+    log = record_battle(teams[0], teams[1], 5).get_log()
+    rated = ratings.Ratings()
+    ratings.set_ratings(rated)
+    try:
+        league = League([teams[0], teams[1]], seed=5)
+        league.set_replays({(teams[0].get_name(), teams[1].get_name()) : [log]})
+        battle = play_out(league.get_next_battle())
+        assert isinstance(battle, BattleReplay)
+        league.record_result(battle)
+        assert league.get_scores()[log.info["winner"]] == 1
+        assert rated.n_matches == 0
+
+        league = League([teams[0], teams[1]], seed=5)
+        league.record_result(play_out(league.get_next_battle()))
+        assert rated.n_matches == 1
+    finally:
+        ratings.set_ratings(None)
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / "not_a_log"
+    path.write_bytes(bytes(64))
+    with pytest.raises(ValueError):
+        BattleLog.load(str(path))
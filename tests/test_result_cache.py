@@ -0,0 +1,119 @@
+import os
+import pytest
+from app import sim
+from app.resources import directories
+from app.models import result_cache
+from app.models import ratings
+from app.models.league import League
+from app.models.result_cache import ResultCache
+from app.models.tournament import TournamentRunner
+
+summary = {"winner" : "The Mystic Marvels", "rounds" : 4}
+
+def test_hit_after_put(teams):
+    cache = ResultCache(magic_path=directories.MAGIC_PATH)
+    assert cache.get(teams[0], teams[1], 5) == None
+    cache.put(teams[0], teams[1], 5, "static", summary)
+    assert cache.get(teams[0], teams[1], 5) == summary
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_miss_on_anything_else(teams):
+    cache = ResultCache(magic_path=directories.MAGIC_PATH)
+    cache.put(teams[0], teams[1], 5, "static", summary)
+    assert cache.get(teams[0], teams[1], 6) == None
+    assert cache.get(teams[1], teams[0], 5) == None
+    assert cache.get(teams[0], teams[2], 5) == None
+    assert cache.get(teams[0], teams[1], 5, "dynamic") == None
+    # Unseeded battles are never cached
+    cache.put(teams[0], teams[1], None, "static", summary)
+    assert cache.get(teams[0], teams[1], None) == None
+
+def test_miss_with_other_settings(teams):
+    cache = ResultCache(magic_path=directories.MAGIC_PATH, settings={"budget" : 1.0})
+    cache.put(teams[0], teams[1], 5, "static", summary)
+    other = ResultCache(magic_path=directories.MAGIC_PATH, settings={"budget" : 2.0})
+    other.results = cache.results
+    assert other.get(teams[0], teams[1], 5) == None
+    same = ResultCache(magic_path=directories.MAGIC_PATH, settings={"budget" : 1.0})
+    same.results = cache.results
+    assert same.get(teams[0], teams[1], 5) == summary
+
+def test_least_recently_used_go_first(teams):
+    cache = ResultCache(magic_path=directories.MAGIC_PATH, max_entries=2)
+    cache.put(teams[0], teams[1], 1, "static", summary)
+    cache.put(teams[0], teams[1], 2, "static", summary)
+    cache.get(teams[0], teams[1], 1)
+    cache.put(teams[0], teams[1], 3, "static", summary)
+    assert cache.get(teams[0], teams[1], 2) == None
+    assert cache.get(teams[0], teams[1], 1) == summary
+    assert cache.get(teams[0], teams[1], 3) == summary
+
+def test_results_persist(teams, tmp_path):
+    path = str(tmp_path / "results.json")
+    cache = ResultCache(path, directories.MAGIC_PATH)
+    cache.put(teams[0], teams[1], 5, "static", summary)
+    cache.close()
+    assert ResultCache(path, directories.MAGIC_PATH).get(teams[0], teams[1], 5) == summary
+
+def test_loading_keeps_max_entries(teams, tmp_path):
+    path = str(tmp_path / "results.json")
+    cache = ResultCache(path, directories.MAGIC_PATH)
+    for seed in range(5):
+        cache.put(teams[0], teams[1], seed, "static", summary)
+    cache.close()
+    loaded = ResultCache(path, directories.MAGIC_PATH, max_entries=2)
+    assert len(loaded.results) == 2
+    assert loaded.get(teams[0], teams[1], 4) == summary
+    assert loaded.get(teams[0], teams[1], 2) == None
+
+def test_failed_save_keeps_the_old_file(teams, tmp_path):
+    path = str(tmp_path / "results.json")
+    cache = ResultCache(path, directories.MAGIC_PATH)
+    cache.put(teams[0], teams[1], 5, "static", summary)
+    cache.close()
+    # Not something JSON can hold, so the save fails half way through
+    cache.put(teams[0], teams[1], 6, "static", {"winner" : object()})
+    with pytest.raises(TypeError):
+        cache.close()
+    assert os.listdir(str(tmp_path)) == ["results.json"]
+    assert ResultCache(path, directories.MAGIC_PATH).get(teams[0], teams[1], 5) == summary
+
+def test_second_league_comes_from_the_cache(teams):
+    result_cache.set_cache(ResultCache(magic_path=directories.MAGIC_PATH))
+    try:
+        first = list(sim.run_league(League(teams, seed=3)))
+        cache = result_cache.get_cache()
+        assert cache.hits == 0
+        second = list(sim.run_league(League(teams, seed=3)))
+        assert cache.hits == len(second) > 0
+        assert [summary["winner"] for summary in second] == [summary["winner"] for summary in first]
+    finally:
+        result_cache.set_cache(None)
+
+def test_cached_matches_are_scored_but_not_rated(teams):
+    rated = ratings.Ratings()
+    ratings.set_ratings(rated)
+    result_cache.set_cache(ResultCache(magic_path=directories.MAGIC_PATH))
+    try:
+        league = League(teams, seed=3)
+        first = list(sim.run_league(league))
+        assert rated.n_matches == len(first)
+        league = League(teams, seed=3)
+        list(sim.run_league(league))
+        assert rated.n_matches == len(first)
+        assert sum(league.get_scores().values()) == len(first)
+
+        league = League(teams)
+        with TournamentRunner(league, directories.MAGIC_PATH, 1, seed=4) as runner:
+            results = runner.run()
+        n_played = rated.n_matches
+        assert n_played == len(first) + len(results)
+        league = League(teams)
+        with TournamentRunner(league, directories.MAGIC_PATH, 1, seed=4) as runner:
+            cached = runner.run()
+        assert all(result["cached"] for result in cached)
+        assert rated.n_matches == n_played
+        assert sum(league.get_scores().values()) == len(results)
+    finally:
+        result_cache.set_cache(None)
+        ratings.set_ratings(None)
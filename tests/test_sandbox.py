@@ -0,0 +1,31 @@
+from app.models import team
+from app.models import sandbox
+from app.models import supervisor
+from app.models.battle import Battle
+
+def test_team_survives_worker_crash_mid_battle(team_specs, play_out):
+    specs = dict(team_specs)
+    # The nerds ask their allies what they plan to do and how healthy
+    # they are, which only works on the allies' own Mage objects
+    nerds = team.build_team("C Science nerds ", specs["C Science nerds "], sandboxed=True)
+    alphas = team.build_team("Alpha Squad", specs["Alpha Squad"], sandboxed=True)
+
+    # Without a budget the supervisor only counts what the scripts do
+    supervisor.set_supervisor(supervisor.DecisionSupervisor())
+    try:
+        battle = Battle(nerds, alphas, seed=3)
+        for i in range(4):
+            battle.play_next_move()
+
+        worker = nerds[0].mage.worker
+        worker.process.kill()
+        worker.process.join()
+
+        play_out(battle)
+        assert worker.is_running()
+        for key, stats in supervisor.get_supervisor().get_stats().items():
+            if key.startswith("teams.C_Science_nerds."):
+                assert stats.errors == 0, str(stats)
+    finally:
+        supervisor.set_supervisor(None)
+        sandbox.shutdown_workers()
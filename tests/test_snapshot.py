@@ -0,0 +1,86 @@
+import gc
+from app.models.team import Team
+from app.models.battle import Battle
+from app.models.mage_manager import MageManager
+from app.models.snapshot import MageSnapshot, AllySnapshot
+
+class Mage:
+    def __init__(self):
+        self.name = "mage"
+        self.health, self.attack, self.defense, self.speed = 10, 10, 10, 10
+        self.max_health = self.health
+        self.element = "Fire"
+        self.spells = ["Fireball"]
+        self.strengths = ["Ice"]
+
+    def find_weak_foes(self, enemies):
+        return [enemy for enemy in enemies if enemy.element in self.strengths]
+
+    def make_move(self, allies, enemies):
+        return ("Fireball", enemies)
+
+# Tries everything it can think of to knock out the other team before
+# attacking, and remembers what it was handed
+class Cheater(Mage):
+    seen = []
+
+    def make_move(self, allies, enemies):
+        for enemy in enemies:
+            Cheater.seen.append(enemy)
+            for attempt in [lambda: setattr(enemy, "health", 0), lambda: object.__setattr__(enemy, "health", 0)]:
+                try:
+                    attempt()
+                except Exception:
+                    pass
+        return ("Fireball", enemies[0])
+
+def test_enemies_only_see_plain_values(play_out):
+    Cheater.seen = []
+    cheaters = Team("Cheaters", [Cheater, Cheater])
+    honest = Team("Honest", [Mage, Mage])
+    battle = Battle(cheaters, honest, seed=1)
+    battle.play_next_move()
+    battle.play_next_move()
+    assert len(Cheater.seen) > 0
+
+    for snapshot in Cheater.seen:
+        assert type(snapshot) is MageSnapshot
+        # Nothing but the snapshot values, so no way to the Mage or its
+        # MageManager
+        for referent in gc.get_referents(snapshot):
+            assert not isinstance(referent, (Mage, MageManager, Team))
+            assert type(referent) in (type, int, str, tuple, type(None))
+
+    # Changing a snapshot changes nothing in the battle
+    assert all(manager.cur_hp > 0 for manager in honest)
+
+def test_allies_read_through_to_their_mage():
+    members = Team("Members", [Mage, Mage])
+    ally = members[1].get_snapshot(True)
+    assert isinstance(ally, AllySnapshot)
+    assert ally.max_health == 10
+    assert ally.strengths == ["Ice"]
+    assert ally.find_weak_foes([members[0].get_snapshot()]) == []
+    assert ally == members[1].mage
+
+    enemy = members[1].get_snapshot()
+    assert enemy.max_health == 10
+    assert not hasattr(enemy, "strengths")
+
+class Other(Mage):
+    def __init__(self):
+        Mage.__init__(self)
+        self.name = "other"
+
+def test_snapshots_from_another_battle_miss():
+    team1, team2, team3 = Team("One", [Mage]), Team("Two", [Mage]), Team("Three", [Other])
+    Battle(team1, team2, seed=1)
+    caster, enemy = team1[0], team2[0]
+    snapshot = enemy.get_snapshot()
+    assert caster.find_target(snapshot, [caster], [enemy]) is enemy
+    assert caster.find_target(snapshot.id, [caster], [enemy]) is enemy
+    # Same id, but the team on that side now has a different mage there
+    Battle(team1, team3, seed=1)
+    assert caster.find_target(snapshot, [caster], [team3[0]]) == None
+    # Snapshots taken in this battle still resolve
+    assert caster.find_target(team1[0].get_snapshot(True), [caster], [team3[0]]) is caster
@@ -0,0 +1,29 @@
+import pytest
+from app.resources import directories
+from app.models.magic import SpellBook
+
+def test_shared_spell_book_is_read_only(spell_book):
+    shared = SpellBook.get_shared()
+    with pytest.raises(AttributeError):
+        shared.magic = None
+
+    name = next(iter(SpellBook.spells))
+    with pytest.raises(TypeError):
+        SpellBook.spells[name] = None
+    with pytest.raises(TypeError):
+        SpellBook.elements["Void"] = None
+    with pytest.raises(TypeError):
+        SpellBook.effectiveness[0][0] = 0
+    with pytest.raises(TypeError):
+        SpellBook.compatibility[0][0] = False
+    with pytest.raises(AttributeError):
+        SpellBook.element_list.append(None)
+
+def test_reloading_keeps_element_ids(spell_book):
+    ids = dict((name, element.id) for name, element in SpellBook.elements.items())
+    spells = set(SpellBook.spells)
+    SpellBook.load_spell_book(directories.MAGIC_PATH)
+    assert dict((name, element.id) for name, element in SpellBook.elements.items()) == ids
+    assert set(SpellBook.spells) == spells
+    for element in SpellBook.element_list:
+        assert element.effectiveness is SpellBook.effectiveness[element.id]
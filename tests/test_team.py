@@ -0,0 +1,70 @@
+import copy
+import timeit
+from app.models import team
+from app.models.team import Team
+from app.models.battle import Battle
+
+def snapshot_team(members):
+    return [(copy.deepcopy(manager.mage.__dict__), manager.cur_hp, dict(manager.stat_modifiers), list(manager.spells)) for manager in members]
+
+def test_reinitialize_restores_starting_state(teams, play_out):
+    team1, team2 = teams[1], teams[2]
+    start = (snapshot_team(team1), snapshot_team(team2))
+    mages = [manager.mage for manager in list(team1) + list(team2)]
+
+    play_out(Battle(team1, team2, seed=2))
+    assert (snapshot_team(team1), snapshot_team(team2)) != start
+
+    team1.reinitialize()
+    team2.reinitialize()
+    assert (snapshot_team(team1), snapshot_team(team2)) == start
+    # The same Mage objects, put back rather than constructed again
+    assert [manager.mage for manager in list(team1) + list(team2)] == mages
+
+def test_restored_teams_play_like_new_ones(team_specs, teams, play_out):
+    def result(battle):
+        return [manager.cur_hp for manager in list(battle.team1) + list(battle.team2)], battle.get_rounds_played()
+
+    play_out(Battle(teams[0], teams[2], seed=9))
+    replayed = result(play_out(Battle(teams[0], teams[2], seed=9)))
+    fresh = [team.build_team(name, modules) for name, modules in team_specs]
+    assert result(play_out(Battle(fresh[0], fresh[2], seed=9))) == replayed
+
+class Remembers:
+    def __init__(self):
+        self.name = "remembers"
+        self.health, self.attack, self.defense, self.speed = 10, 10, 10, 10
+        self.element = "Fire"
+        self.spells = ["Fireball"]
+        self.seen = []
+        self.memory = {"enemies" : []}
+
+class FreshEveryBattle(Remembers):
+    fresh_instance = True
+
+def test_mutable_state_is_copied_back():
+    members = Team("Memory", [Remembers])
+    members[0].mage.seen.append("enemy")
+    members[0].mage.memory["enemies"].append("enemy")
+    members.reinitialize()
+    assert members[0].mage.seen == []
+    assert members[0].mage.memory == {"enemies" : []}
+
+def test_fresh_instance_constructs_again():
+    members = Team("Fresh", [FreshEveryBattle])
+    mage = members[0].mage
+    members.reinitialize()
+    assert members[0].mage is not mage
+    assert members.initial_states == [None]
+
+# Restoring the starting state has to stay cheaper than what reinitialize
+# used to do, constructing every mage again
+def test_restore_is_cheaper_than_rebuilding(teams):
+    def rebuild(members):
+        members[:] = []
+        members.initialize_team_members()
+
+    for members in teams:
+        restore_time = min(timeit.repeat(members.reinitialize, number=200, repeat=5))
+        rebuild_time = min(timeit.repeat(lambda: rebuild(members), number=200, repeat=5))
+        assert restore_time < rebuild_time
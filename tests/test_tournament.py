@@ -0,0 +1,20 @@
+import gc
+import pytest
+from app.resources import directories
+from app.models.league import League
+from app.models.tournament import TournamentRunner
+
+def test_results_do_not_depend_on_worker_count(teams):
+    results = []
+    for workers in [1, 2]:
+        league = League(teams, seed=1)
+        with TournamentRunner(league, directories.MAGIC_PATH, workers, replays=3, seed=1) as runner:
+            runner.run_league()
+        results.append(league.get_standings())
+    assert results[0] == results[1]
+
+@pytest.mark.skipif(not hasattr(gc, "freeze"), reason="gc.freeze needs Python 3.7")
+def test_pool_leaves_nothing_frozen(teams):
+    with TournamentRunner(League(teams, seed=1), directories.MAGIC_PATH, 2) as runner:
+        runner.run_league()
+        assert gc.get_freeze_count() == 0